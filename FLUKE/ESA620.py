@@ -1,8 +1,8 @@
-import serial
-from time import sleep
 import re
+from .transport import SerialTransport
+from .errors import CommandError, CommunicationError, RangeError, RetryPolicy, check_status, parse_float
 
-__version__ = "1.4.2"
+__version__ = "1.7.1"
 __autor__ = "Juan Cruz Noya & Julian Font"
 __propietario__ = "Feas Electronica"
 
@@ -15,17 +15,117 @@ Version 1.4     Se comienza a trabajar en el manejo de errores de comunicación.
 Version 1.4.1   Se agrega el loop while para aceptar la lectura solo cuando la respuesta del ESA620 sea distinta de "*"
 Version 1.4.2   Se agrega la funcion LOCAL(). Se implementará antes de cerrar el puerto en drivers.py esa620(). Se programa inicialmente los parametros en mainAppliedParts().
 Version 1.4.3   Se agrega el error -103. Este error indica que no se pudo abrir y configurar el puerto serie.
+Version 1.5     La comunicacion pasa por SerialTransport (transport.py). Se elimina el sleep de 0.5 s entre lecturas de MREAD:
+                la lectura ya espera la siguiente linea del ESA620. Los tiempos de asentamiento quedan contabilizados en el transporte.
+Version 1.6     Los errores pasan a ser excepciones tipadas (errors.py): -103 -> CommunicationError, -102 -> ProtocolError,
+                "!xx" -> CommandError/RangeError y sin respuesta -> InstrumentTimeout. Cada comando se verifica y los
+                errores transitorios se reintentan segun la RetryPolicy del driver.
+Version 1.7     Las tablas de alias de setTest(), setPolarity(), setNeutral() y setEarth() pasan a ser atributos de clase
+                (TESTS, POLARITIES, SWITCH_STATES) para poder resolver alias sin abrir el puerto (plan.py).
+Version 1.7.1   Los comandos de configuracion esperan el acknowledge a lo sumo ACK_TIMEOUT (1 s); el timeout de
+                20 s queda solo para READ y MREAD.
 """
 
+#Tecla ESC + CRLF: libera la medicion en curso
+ESC = bytes([0x1B, 0x0D, 0x0A])
+
 class ESA620:
-    def __init__(self,port,baudrate=115200):
+    #Una medicion (MREAD) no se repite: el reintento lo decide el procedimiento
+    RETRY = RetryPolicy(attempts=2, commands={"MREAD": 1})
+
+    #Solo las mediciones esperan el timeout de 20 s del puerto; el acknowledge ("*") de los
+    #comandos de configuracion llega en milisegundos y un ack perdido se reintenta enseguida
+    SLOW_COMMANDS = ("READ", "MREAD")
+    ACK_TIMEOUT = 1.0
+
+    #Alias aceptados por setTest(), setPolarity(), setNeutral() y setEarth() -> valor del ESA620
+    TESTS = {
+        # Live to Neutral
+        "LIVE_TO_NEUTRAL": "L1-L2",
+        "live_to_neutral": "L1-L2",
+        "VIVO_A_NEUTRO": "L1-L2",
+        "L_N": "L1-L2",
+
+        # Live to Earth
+        "LIVE_TO_EARTH": "L1-GND",
+        "VIVO_A_TIERRA": "L1-GND",
+        "L_GND": "L1-GND",
+
+        # Neutral to Earth
+        "NEUTRO_TO_EARTH": "L2-GND",
+        "NEUTRAL_TO_EARTH": "L2-GND",
+        "NEUTRO_A_TIERRA": "L2-GND",
+        "N_GND": "L2-GND",
+        "NEUTRO_TO_GND": "L2-GND",
+
+        # Mains to Protective Earth
+        "MAINS-PE": "INSB",
+        "MAINS_TO_PROTECTIVE_EARTH": "INSB",
+        "PRINCIPAL_A_TIERRA": "INSB",
+        "MAIN_PROTECTIVE_EARTH": "INSB",
+        "MAIN-PE": "INSB",
+
+        # Applied Parts to Protective Earth
+        "A.P-PE": "INSD",
+        "AP-PE":"INSD",
+        "APPLIED_PARTS_PROTECTIVE_EARTH": "INSD",
+        "ACTIVO_A_TIERRA": "INSD",
+
+        # Main to Applied Parts
+        "MAIN-A.P": "INSE",
+        "PRINCIAPAL_A_ACTIVO": "INSE",
+    }
+
+    POLARITIES = {
+        "N":"N",
+        "NORM":"N",
+        "NORMAL":"N",
+        "normal":"N",
+        "1":"N",
+        "DIRECTA":"N",
+        "DIR":"N",
+        "APAGADO":"OFF",
+        "0":"OFF",
+        "OFF":"OFF",
+        "R":"R",
+        "r":"R",
+        "REVERSE":"R",
+        "reverse":"R",
+        "INVERTIDA":"R",
+        "-1":"R"
+    }
+
+    #Neutro y tierra aceptan los mismos valores: abierto o cerrado
+    SWITCH_STATES = {
+        "O":"O",
+        "OPEN":"O",
+        "o":"O",
+        "A":"O",
+        "ABIERTO":"O",
+        "C":"C",
+        "CERRADO":"C",
+        "CERRADA":"C",
+        "Cerrada":"C",
+        "CLOSED":"C",
+        "CLOSE":"C",
+        "c":"C"
+    }
+
+    def __init__(self,port,baudrate=115200,transport=None,retry=None):
         self.port = port
         self.baudrate = baudrate
+        self.retry = retry or self.RETRY
 
         try:   
-            self.serial = serial.Serial(port=self.port,baudrate=self.baudrate,parity="N",stopbits=1,bytesize=8, timeout=20, write_timeout=20)
-        except:
-            return "-103"
+            self.transport = transport or SerialTransport(port=self.port,baudrate=self.baudrate,terminator=b"\n",eol="\r",timeout=20,
+                                             parity="N",stopbits=1,bytesize=8,write_timeout=20)
+            self.transport.instrument = type(self).__name__  #etiqueta de las métricas
+        except CommunicationError:
+            raise
+        except Exception as e:
+            raise CommunicationError(f"No se pudo abrir y configurar {port}: {e}", instrument=port) from e
+        #mientras mide, el "*" de MREAD no es la respuesta: la latencia se mide hasta el valor
+        self.transport.interim["MREAD"] = "*"
 
         self._ident = None
 
@@ -40,89 +140,50 @@ class ESA620:
 
 
 
+    def _query(self, cmd):
+        """
+        Envia un comando y devuelve la respuesta verificada ("!xx" o sin respuesta lanzan excepcion).
+        Los comandos que no son mediciones esperan a lo sumo ACK_TIMEOUT.
+        """
+        slow = isinstance(cmd, str) and re.split(r"[=\s]", cmd.strip(), maxsplit=1)[0] in self.SLOW_COMMANDS
+        return self.transport.request(cmd, timeout=None if slow else self.ACK_TIMEOUT, policy=self.retry)
+
     #Seteo del ESA620 en modo remoto
     def REMOTE(self):
         """
         CONECTA EL EQUIPO EN MODO REMOTO
         """
 
-        self.serial.write("REMOTE\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("RPTIME=2\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("STD=NONE\r".encode())
-        self.serial.readline().decode()
-        sleep(1)
+        self._query("REMOTE")
+        self._query("RPTIME=2")
+        self._query("STD=NONE")
+        self.transport.sleep(1)
 
     def LOCAL(self):
         """
         Equipo en modo local
         """
-        self.serial.write("LOCAL\r".encode())
-        self.serial.readline().decode()
+        self._query("LOCAL")
 
 
     #Encendido y apagado de equipo bajo ensayo desde ESA620
     def powerON(self):
-        self.serial.write("REMOTE\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("PAT\r".encode())
-        self.serial.readline().decode()
-        sleep(1)
-        self.serial.write("POL=N\r".encode())
-        self.serial.readline().decode()
+        self._query("REMOTE")
+        self._query("PAT")
+        self.transport.sleep(1)
+        self._query("POL=N")
     def powerOFF(self):
-        self.serial.write("REMOTE\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("PAT\r".encode())
-        self.serial.readline().decode()
-        sleep(1)
-        self.serial.write("POL=OFF\r".encode())
-        self.serial.readline().decode()     
+        self._query("REMOTE")
+        self._query("PAT")
+        self.transport.sleep(1)
+        self._query("POL=OFF")
     
     def setTest(self,value):
         """
         SETEA UN AUXILIAR DE ENSAYO
-        :param value: va a setear el tipo de ensayo que se va a realizar 
-        """
-
-        TEST = {
-            # Live to Neutral
-            "LIVE_TO_NEUTRAL": "L1-L2",
-            "live_to_neutral": "L1-L2",
-            "VIVO_A_NEUTRO": "L1-L2",
-            "L_N": "L1-L2",
-
-            # Live to Earth
-            "LIVE_TO_EARTH": "L1-GND",
-            "VIVO_A_TIERRA": "L1-GND",
-            "L_GND": "L1-GND",
-
-            # Neutral to Earth
-            "NEUTRO_TO_EARTH": "L2-GND",
-            "NEUTRAL_TO_EARTH": "L2-GND",
-            "NEUTRO_A_TIERRA": "L2-GND",
-            "N_GND": "L2-GND",
-            "NEUTRO_TO_GND": "L2-GND",
-
-            # Mains to Protective Earth
-            "MAINS-PE": "INSB",
-            "MAINS_TO_PROTECTIVE_EARTH": "INSB",
-            "PRINCIPAL_A_TIERRA": "INSB",
-            "MAIN_PROTECTIVE_EARTH": "INSB",
-            "MAIN-PE": "INSB",
-
-            # Applied Parts to Protective Earth
-            "A.P-PE": "INSD",
-            "AP-PE":"INSD",
-            "APPLIED_PARTS_PROTECTIVE_EARTH": "INSD",
-            "ACTIVO_A_TIERRA": "INSD",
-
-            # Main to Applied Parts
-            "MAIN-A.P": "INSE",
-            "PRINCIAPAL_A_ACTIVO": "INSE",
-        }
-        self.test = TEST[value]
+        :param value: va a setear el tipo de ensayo que se va a realizar (clave de TESTS)
+        """
+        self.test = self.TESTS[value]
     
     #Llamado por el comando --SET_ATRIBUTO leads. 3,5 o 10
     def setLeads(self,value):
@@ -141,75 +202,23 @@ class ESA620:
             case 10:
                 self.electrodes = ["RA","LL","LA","RL","V1", "V2", "V3", "V4", "V5", "V6"]
             case _:
-                raise Exception(f"Error: Cantidad de electrodos ingresada incorrecta, ingrese 3, 5 o 10")
+                raise RangeError("Error: Cantidad de electrodos ingresada incorrecta, ingrese 3, 5 o 10")
         
     #Llamado por el comando --SET_ATRIBUTO polarity. Normal
     def setPolarity(self,value):
-        POL = {
-            "N":"N",
-            "NORM":"N",
-            "NORMAL":"N",
-            "normal":"N",
-            "1":"N",
-            "DIRECTA":"N",
-            "DIR":"N",
-            "APAGADO":"OFF",
-            "0":"OFF",
-            "OFF":"OFF",
-            "R":"R",
-            "r":"R",
-            "REVERSE":"R",
-            "reverse":"R",
-            "INVERTIDA":"R",
-            "-1":"R"
-
-        }
-        self.polarity = POL[value]
+        self.polarity = self.POLARITIES[value]
     def setNeutral(self,value):
         """
         
         se debe poder setear si queremos que el nuetro cierre o abra su circuito hacia el toma corrientes
         """
-        NEUT ={
-            "O":"O",
-            "OPEN":"O",
-            "o":"O",
-            "A":"O",
-            "ABIERTO":"O",
-            "C":"C",
-            "CERRADO":"C",
-            "CERRADA":"C",
-            "Cerrada":"C",
-            "CLOSED":"C",
-            "CLOSE":"C",
-            "c":"C"
-
-        }
-
-        self.neutral = NEUT[value]
+        self.neutral = self.SWITCH_STATES[value]
     def setEarth(self,value):
         """
         Setea la confuracion de la tierra respecto al toma corriente
         
         """
-        EARTH ={
-            "O":"O",
-            "OPEN":"O",
-            "o":"O",
-            "A":"O",
-            "ABIERTO":"O",
-            "C":"C",
-            "CERRADO":"C",
-            "CERRADA":"C",
-            "Cerrada":"C",
-            "CLOSED":"C",
-            "CLOSE":"C",
-            "c":"C"
-
-        }
-
-
-        self.earth = EARTH[value]
+        self.earth = self.SWITCH_STATES[value]
     def setElectrodes(self):
 
         """
@@ -224,26 +233,31 @@ class ESA620:
             case 10:
                 self.electrodes = ["RA","LL","LA","RL","V1", "V2", "V3", "V4", "V5", "V6"]
             case _:
-                raise Exception(f"Error: Cantidad de electrodos ingresada incorrecta, ingrese 3, 5 o 10")
+                raise RangeError("Error: Cantidad de electrodos ingresada incorrecta, ingrese 3, 5 o 10")
  
     def setESAMeasure(self):
         
-        self.serial.write(f"{self.test}\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"POL=OFF\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"POL=N\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"EARTH=C\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"NEUT=C\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"MODE=ACDC\r".encode())
-        self.serial.readline().decode()
+        self._query(f"{self.test}")
+        self._query(f"POL=OFF")
+        self._query(f"POL=N")
+        self._query(f"EARTH=C")
+        self._query(f"NEUT=C")
+        self._query(f"MODE=ACDC")
     def ensureResponse(self):
-            respuesta = self.serial.readline().decode().strip()
+            respuesta = self.transport.read_until()
             if respuesta != "*":
-                raise Exception(f"Error: {respuesta}")
+                raise CommandError(f"Error: {respuesta}", code=respuesta[:3], reply=respuesta, instrument=self.port)
+
+    def _mread(self):
+        """
+        Dispara una medicion y devuelve el valor. Mientras mide, el ESA620 responde "*"
+        y luego envia el valor en otra linea, por lo que solo se espera la siguiente linea.
+        """
+        m = self._query("MREAD")
+        while "*" in m:
+            m = check_status(self.transport.read_until(), "MREAD", self.port)
+        self._query(ESC)
+        return m
 
     def ident(self):
 
@@ -251,13 +265,9 @@ class ESA620:
         Identifica el equipo
         """
 
-        self.serial.write("REMOTE\r".encode())
+        self._query("REMOTE")
 
-        self.serial.readline().decode()
-
-        self.serial.write("IDENT\r".encode())
-
-        self._ident=self.serial.readline().decode()
+        self._ident=self._query("IDENT")
 
     #Llamados por el comando --run del Driver
     def protectiveEarthResistance(self):
@@ -267,31 +277,19 @@ class ESA620:
         Funcion para el ensayo de la resistencia de tierra
         """
 
-        self.serial.write("REMOTE\r".encode())
-
-        self.serial.readline().decode()
-        self.serial.write("ERES = LOW\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("RWIRE=2\r".encode())
-
-        self.serial.readline().decode()
-        self.serial.write("READ\r".encode())
-
-        resistencia = self.serial.readline().decode()
+        self._query("REMOTE")
+        self._query("ERES = LOW")
+        self._query("RWIRE=2")
+        resistencia = self._query("READ")
 
         return resistencia.split(" ")[0]
     def voltMeasure(self):
         """
         Devuelve el valor medido en el ensayo de voltaje
         """
-        self.serial.write("REMOTE\r".encode())
-
-        self.serial.readline().decode()
-        self.serial.write(f"MAINS={self.test}\r".encode())
-
-        self.serial.readline().decode()
-        self.serial.write("READ\r".encode())
-        value = self.serial.readline().decode()
+        self._query("REMOTE")
+        self._query(f"MAINS={self.test}")
+        value = self._query("READ")
         return value.split(" ")[0]
     def insulationResistance(self,ensayo = 1):
         """
@@ -304,20 +302,14 @@ class ESA620:
             2:"INSD",
             3:"INSE"
         }
-        self.serial.write(f"MINS\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"INS=HIGH\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"{self.test}\r".encode())
+        self._query(f"MINS")
+        self._query(f"INS=HIGH")
+        self._query(f"{self.test}")
 
-        self.serial.readline().decode()
-
-        self.serial.write("READ\r".encode())
-        r = self.serial.readline().decode()
-        if "!21" in r:
-            r="99999 MOHMS"
-        else:
-            pass
+        try:
+            r = self._query("READ")
+        except RangeError:
+            r="99999 MOHMS" #fuera de rango: aislacion mayor al maximo medible
 
         return r.split(" ")[0]
     def equipmentCurrent(self):
@@ -330,10 +322,8 @@ class ESA620:
 
 
         
-        self.serial.write(f"EQCURR\r".encode())
-        self.serial.readline().decode()
-        self.serial.write("READ\r".encode())
-        r = self.serial.readline().decode().split(" ")[0]
+        self._query(f"EQCURR")
+        r = self._query("READ").split(" ")[0]
         return r
     def leakageEarth(self):
         """
@@ -342,17 +332,12 @@ class ESA620:
         """
  
         self.REMOTE() #SET MODO REMOTO
-        self.serial.write(f"EARTHL\r".encode()) #CONFIGURA EN MODO TIERRA O CARCASA
-        self.serial.readline().decode()
-        self.serial.write(f"POL={self.polarity}\r".encode()) #CONFIGURA LA POLARIDAD
-        self.serial.readline().decode()
-        self.serial.write(f"NEUT={self.neutral}\r".encode()) #CONFIGURA EL NEUTRO
-        self.serial.readline().decode()
-        self.serial.write(f"MODE=ACDC\r".encode()) #CONFIGURA EN MEDICION DE CORRIENTE DE FUGA DE PACIENTE
-        self.serial.readline().decode()
-        sleep(0.5)
-        self.serial.write("READ\r".encode())#TOMA LA MEDICION
-        r = self.serial.readline().decode().split(" ")[0]
+        self._query(f"EARTHL") #CONFIGURA EN MODO TIERRA O CARCASA
+        self._query(f"POL={self.polarity}") #CONFIGURA LA POLARIDAD
+        self._query(f"NEUT={self.neutral}") #CONFIGURA EL NEUTRO
+        self._query(f"MODE=ACDC") #CONFIGURA EN MEDICION DE CORRIENTE DE FUGA DE PACIENTE
+        self.transport.sleep(0.5)
+        r = self._query("READ").split(" ")[0] #TOMA LA MEDICION
         return r
     def enclosureLeakageCurrent(self):
         """
@@ -361,31 +346,16 @@ class ESA620:
         """
         self.REMOTE()
 
-        self.serial.write(f"ENCL\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"AP=//OPEN\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"MDUAL=OFF\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"POL={self.polarity}\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"EARTH={self.earth}\r".encode())
-        self.serial.readline().decode()
-        self.serial.write(f"NEUT={self.neutral}\r".encode())
-        self.serial.readline().decode()
-        sleep(0.5)
-        self.serial.write(f"MREAD\r".encode())
-        m = self.serial.readline().decode()
-        while "*" in str(m):
-            sleep(0.5)
-            m = self.serial.readline().decode()
-        self.serial.write(bytes([0x1B, 0x0D, 0x0A]))
-        self.serial.readline().decode()
-        try:
-            value = float(m.replace(" uA", ""))
-            return str(value)
-        except ValueError:
-            return "-102"
+        self._query(f"ENCL")
+        self._query(f"AP=//OPEN")
+        self._query(f"MDUAL=OFF")
+        self._query(f"POL={self.polarity}")
+        self._query(f"EARTH={self.earth}")
+        self._query(f"NEUT={self.neutral}")
+        self.transport.sleep(0.5)
+        m = self._mread()
+        value = parse_float(m, "MREAD", self.port, suffix=" uA")
+        return str(value)
         
     def patientLeakageCurrent(self):
 
@@ -398,40 +368,22 @@ class ESA620:
         max_current = 0
         for electrode in self.electrodes:
             gndElectrodes = ",".join([g for g in self.electrodes if g != electrode])
-            self.serial.write("STD=NONE\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"PAT\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"POL={self.polarity}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"EARTH={self.earth}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"NEUT={self.neutral}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MODE=ACDC\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"AP={electrode}//\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"GRP={gndElectrodes}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MDUAL=OFF\r".encode())
-            self.serial.readline().decode()
-            sleep(0.5)
-            self.serial.write(f"MREAD\r".encode())
-            m = self.serial.readline().decode()
-            while "*" in str(m):
-                sleep(0.5)
-                m = self.serial.readline().decode()
-            self.serial.write(bytes([0x1B, 0x0D, 0x0A]))
-            self.serial.readline().decode()
-        try:
-            current_value = float(m.replace(" uA", ""))
+            self._query("STD=NONE")
+            self._query(f"PAT")
+            self._query(f"POL={self.polarity}")
+            self._query(f"EARTH={self.earth}")
+            self._query(f"NEUT={self.neutral}")
+            self._query(f"MODE=ACDC")
+            self._query(f"AP={electrode}//")
+            self._query(f"GRP={gndElectrodes}")
+            self._query(f"MDUAL=OFF")
+            self.transport.sleep(0.5)
+            m = self._mread()
+            current_value = parse_float(m, "MREAD", self.port, suffix=" uA")
             if current_value > max_current:
                 max_current = current_value
-        except ValueError:
-            return "-102"
 
-        return str(max_current) 
+        return str(max_current)
     def mainAppliedParts(self):
 
         """
@@ -443,44 +395,23 @@ class ESA620:
         max_current = 0
         for electrode in self.electrodes:
             gndElectrodes = ",".join([g for g in self.electrodes if g != electrode])
-            self.serial.write(bytes([0x1B, 0x0D, 0x0A]))
-            self.serial.readline().decode()
-            self.serial.write("STD=NONE\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MAP\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MAP=LOW\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"EARTH=C\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"NEUT=C\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MAP=NORM\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"POL={self.polarity}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"AP={electrode}//\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"GRP={gndElectrodes}\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MODE=ACDC\r".encode())
-            self.serial.readline().decode()
-            self.serial.write(f"MDUAL=OFF\r".encode())
-            self.serial.readline().decode()
-            sleep(0.5)
-            self.serial.write(f"MREAD\r".encode())
-            m = self.serial.readline().decode()
-            while "*" in str(m):
-                sleep(0.5)
-                m = self.serial.readline().decode()
-            self.serial.write(bytes([0x1B, 0x0D, 0x0A]))
-            self.serial.readline().decode()
-            try:
-                current_value = float(m.replace(" uA", ""))
-                if current_value > max_current:
-                    max_current = current_value
-            except ValueError:
-                return "-102"
+            self._query(ESC)
+            self._query("STD=NONE")
+            self._query(f"MAP")
+            self._query(f"MAP=LOW")
+            self._query(f"EARTH=C")
+            self._query(f"NEUT=C")
+            self._query(f"MAP=NORM")
+            self._query(f"POL={self.polarity}")
+            self._query(f"AP={electrode}//")
+            self._query(f"GRP={gndElectrodes}")
+            self._query(f"MODE=ACDC")
+            self._query(f"MDUAL=OFF")
+            self.transport.sleep(0.5)
+            m = self._mread()
+            current_value = parse_float(m, "MREAD", self.port, suffix=" uA")
+            if current_value > max_current:
+                max_current = current_value
             
         return str(max_current)  
     def patientAuxiliaryCurrent(self):
@@ -494,42 +425,24 @@ class ESA620:
         for electrode in self.electrodes:
                 gndElectrodes = ",".join([g for g in self.electrodes if g != electrode])
 
-                self.serial.write(f"STD=NONE\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"AUX\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"POL={self.polarity}\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"EARTH={self.earth}\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"NEUT={self.neutral}\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"MODE=ACDC\r".encode())
-                self.serial.readline().decode()
-                self.serial.write(f"AP={electrode}/{gndElectrodes}/\r".encode()) #CONFIGURA EN MEDICION DE CORRIENTE DE FUGA DE PACIENTE
-                self.serial.readline().decode()
-                self.serial.write(f"MDUAL=OFF\r".encode())
-                self.serial.readline().decode()
-                sleep(0.5)
-                self.serial.write("MREAD\r".encode())#TOMA LA MEDICION
-                m = self.serial.readline().decode()
-                while "*" in str(m):
-                    sleep(0.5)
-                    m = self.serial.readline().decode()
-                self.serial.write(bytes([0x1B, 0x0D, 0x0A]))
-                self.serial.readline().decode()
-
-                try:
-                    current_value = float(m.replace(" uA", ""))
-                    if current_value > max_current:
-                        max_current = current_value  # Convertir el valor numérico a flotante
-                except ValueError:
-                    return "-102"
+                self._query(f"STD=NONE")
+                self._query(f"AUX")
+                self._query(f"POL={self.polarity}")
+                self._query(f"EARTH={self.earth}")
+                self._query(f"NEUT={self.neutral}")
+                self._query(f"MODE=ACDC")
+                self._query(f"AP={electrode}/{gndElectrodes}/") #CONFIGURA EN MEDICION DE CORRIENTE DE FUGA DE PACIENTE
+                self._query(f"MDUAL=OFF")
+                self.transport.sleep(0.5)
+                m = self._mread() #TOMA LA MEDICION
+                current_value = parse_float(m, "MREAD", self.port, suffix=" uA")
+                if current_value > max_current:
+                    max_current = current_value
 
         return str(max_current)
 
     def close(self):
-        self.serial.close()
+        self.transport.close()
 
 
 class ESA620HELP:
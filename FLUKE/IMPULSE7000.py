@@ -1,66 +1,460 @@
-import serial
 import time
+import re
+import queue
+import threading
+from collections import namedtuple
+from enum import Enum
+from .transport import SerialTransport
+from .errors import (STATUS_CODES, RANGE_CODES, CommandError, InstrumentError, InstrumentTimeout, RangeError,
+                    RetryPolicy)
 
 
+DischargeRecord = namedtuple("DischargeRecord",
+                             ["timestamp", "monotonic", "energy", "voltage", "current", "raw", "waveform", "analysis"],
+                             defaults=(None, None))
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+class Status(Enum):
+    """
+    Outcome of a single command
+    """
+    ACK = "ack"            # accepted, no value
+    VALUE = "value"        # reply carries numeric values
+    ERROR = "error"        # "!xx" status code
+    TIMEOUT = "timeout"    # no complete reply before the deadline
+
+
+Reply = namedtuple("Reply", ["status", "code", "text", "values", "elapsed"])
+
+
+class ImpulseError(InstrumentError):
+    """
+    The analyzer answered with a "!xx" status code, or did not answer in time.
+    Built by impulse_error(), which picks the typed subclass.
+
+    :param code: "!xx" status code, or None
+    """
+
+    def __init__(self, message, code=None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.code = code
+
+
+class ImpulseTimeout(ImpulseError, InstrumentTimeout):
+    pass
+
+
+class ImpulseCommandError(ImpulseError, CommandError):
+    pass
+
+
+class ImpulseRangeError(ImpulseError, RangeError):
+    pass
+
+
+def impulse_error(cmd, reply):
+    """
+    Build the typed error of a failed Reply: ImpulseTimeout, ImpulseRangeError (!03, !21)
+    or ImpulseCommandError.
+    """
+    if reply.status is Status.TIMEOUT:
+        cls = ImpulseTimeout
+    elif reply.code in RANGE_CODES:
+        cls = ImpulseRangeError
+    else:
+        cls = ImpulseCommandError
+    detail = STATUS_CODES.get(reply.code, reply.text) if reply.status is Status.ERROR else reply.text or "no reply"
+    message = f"{cmd.strip()}: {reply.status.value} {reply.code or ''} {detail}".strip()
+    return cls(message, code=reply.code, command=cmd, reply=reply, instrument="IMPULSE7000")
+
+
+def parse_reply(line, elapsed=0.0):
+    """
+    Parse one reply line into a Reply
+    """
+    text = line.strip()
+    if text.startswith("!"):
+        return Reply(Status.ERROR, text[:3], text, [], elapsed)
+    values = [float(v) for v in _NUMBER.findall(text)]
+    if values:
+        return Reply(Status.VALUE, None, text, values, elapsed)
+    return Reply(Status.ACK, None, text, [], elapsed)
+
+
+class ImpulseProtocol:
+    """
+    Command/response layer for the Impulse 7000.
+    Every command has a deadline; replies are parsed into typed Reply
+    tuples and the remote-mode recovery after "!01" is an explicit
+    transition, with no fixed sleeps between commands.
+    """
+
+    #A lost reply to a setup command is retried; waits for a discharge are not
+    RETRY = RetryPolicy(attempts=2, backoff=0.01, commands={"Dready": 1, "DWAVE": 1})
+
+    def __init__(self, transport, deadline=1.0, retry=None):
+        """
+        :param transport: open SerialTransport
+        :param deadline: default seconds allowed for each reply
+        :param retry: RetryPolicy used by check(); default ImpulseProtocol.RETRY
+        """
+        self.transport = transport
+        self.deadline = deadline
+        self.retry = retry or self.RETRY
+        self.remote = False
+        self.mode = None
+
+    def write(self, cmd):
+        self.transport.write(cmd)
+
+    def read_line(self, deadline):
+        """
+        Read one non-empty line before the monotonic deadline, or return None
+        """
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            line = self.transport.read_until(timeout=remaining)
+            if line:
+                return line
+
+    def read_bytes(self, count, deadline):
+        """
+        Read exactly count bytes before the monotonic deadline, or return None
+        """
+        return self.transport.read_exact(count, timeout=max(deadline - time.monotonic(), 0))
+
+    def read_reply(self, deadline):
+        start = time.monotonic()
+        line = self.read_line(deadline)
+        if line is None:
+            return Reply(Status.TIMEOUT, None, "", [], time.monotonic() - start)
+        return parse_reply(line, time.monotonic() - start)
+
+    def command(self, cmd, deadline=None):
+        """
+        Send a command and wait for its reply
+
+        :param deadline: seconds allowed for the reply (default: self.deadline)
+        :return: Reply
+        """
+        start = time.monotonic()
+        self.write(cmd)
+        reply = self.read_reply(start + (self.deadline if deadline is None else deadline))
+        return reply._replace(elapsed=time.monotonic() - start)
+
+    def check(self, cmd, deadline=None):
+        """
+        Like command(), but raise an ImpulseError on error or timeout.
+        Timeouts are retried according to self.retry.
+        """
+        def attempt():
+            reply = self.command(cmd, deadline)
+            if reply.status in (Status.ERROR, Status.TIMEOUT):
+                raise impulse_error(cmd, reply)
+            return reply
+
+        return self.transport.retrying(self.retry, attempt, cmd)
+
+    def ensure_remote(self):
+        """
+        Enter remote mode once. A "!01" reply means the analyzer is stuck in a
+        previous session: go LOCAL and request REMOTE again.
+        """
+        if self.remote:
+            return
+        reply = self.command("REMOTE")
+        if reply.status is Status.ERROR and reply.code == "!01":
+            self.check("LOCAL")
+            self.mode = None
+            reply = self.command("REMOTE")
+        if reply.status in (Status.ERROR, Status.TIMEOUT):
+            raise impulse_error("REMOTE", reply)
+        self.remote = True
+
+    def select_mode(self, mode):
+        """
+        Select the analyzer mode (DEFIB, CHARGE, SYNC, ...) if it is not active yet
+        """
+        self.ensure_remote()
+        if self.mode != mode:
+            self.check(f"MODE={mode}")
+            self.mode = mode
+
+    def local(self):
+        self.write("LOCAL")
+        self.remote = False
+        self.mode = None
+
+
+def parse_discharge(line):
+    """
+    Parse a discharge-ready reply into a DischargeRecord.
+    Fields are taken in order: energy (J), peak voltage (V), peak current (A).
+
+    :param line: decoded reply line
+    :return: DischargeRecord, or None if the line carries no measurement
+    """
+    values = [float(v) for v in _NUMBER.findall(line)]
+    if not values:
+        return None
+    values += [None] * (3 - len(values))
+    return DischargeRecord(time.time(), time.monotonic(), values[0], values[1], values[2], line.strip())
+
 
 class IMPULSE7000:
-    def __init__(self,port:str):
+    #Waveform upload: command and transfer format of the sample buffer
+    WAVEFORM_CMD = "DWAVE"
+    WAVEFORM_BINARY = False
+
+    def __init__(self,port:str,deadline=1.0,transport=None):
         """
         :param port: set COM port
-        :param baudrate: set baudrate for serial connection
+        :param deadline: default seconds allowed for each command reply
+        :param transport: optional SerialTransport to use instead of opening the port
         :return: Nothing
         """
 
-        self.serial = serial.Serial(port=port,baudrate=115200,parity="N",bytesize=8,
-                                    stopbits=1,rtscts=True, dsrdtr=True)
+        self.transport = transport or SerialTransport(port=port,baudrate=115200,terminator=b"\n",eol="\r",
+                                                      timeout=deadline,poll=0.1,parity="N",bytesize=8,
+                                                      stopbits=1,rtscts=True,dsrdtr=True,write_timeout=1)
+        self.transport.instrument = type(self).__name__  #metrics label
+        self.protocol = ImpulseProtocol(self.transport, deadline=deadline)
         self.energy = 0
+        self.session = None  #CaptureSession that owns the port while it runs
 
-    def read_energy(self):
+    @property
+    def capturing(self):
+        """
+        True while a CaptureSession reader thread is reading the port
+        """
+        return self.session is not None and self.session.running
 
-        CMD = (
-            'REMOTE\r', 
-            'MODE=DEFIB\r',
-            'Dready\r'
-            )
-        
-        for comando in CMD:
-            try:
-                self.serial.write(comando.encode())
-                time.sleep(0.1)
-                respuesta = self.serial.readline().decode("utf-8")
-                print(respuesta)
-                
-                if comando == 'REMOTE\r' and "!01" in respuesta:
-                    self.serial.write("LOCAL\r".encode())
-                    self.serial.readline().decode("utf-8")
-                    time.sleep(0.1)
-                    self.serial.write(comando.encode())
-                    self.serial.readline().decode("utf-8")
-                    time.sleep(0.1)
-            except Exception as e:
-                print(f"Error: {e}")
-                return "Error"
-
-
-        self.serial.write('Dready\r'.encode())
-        try:
-            self.energy = self.serial.readline().decode("utf-8")[2:7]
-        except:
-            return "Error en medicion"
-        
+    def read_energy(self, timeout=60.0):
+        """
+        Wait for a discharge and return its energy
+
+        :param timeout: max seconds to wait for the discharge, whatever the analyzer sends meanwhile
+        :return: energy in joules (float)
+        :raises ImpulseError: on an error code or when no discharge arrives in time
+        """
+        self.protocol.select_mode("DEFIB")
+        deadline = time.monotonic() + timeout  #one deadline: chatter (ACKs, status lines) does not extend it
+        reply = self.protocol.check("Dready", deadline=timeout)
+        while reply.status is not Status.VALUE:
+            reply = self.protocol.read_reply(deadline)
+            if reply.status in (Status.ERROR, Status.TIMEOUT):
+                raise impulse_error("Dready", reply)
+        self.energy = reply.values[0]
         return self.energy
-        
+
+    def read_waveform(self, store=None, timeout=5.0):
+        """
+        Download the waveform of the last discharge.
+        The reply is a header line "count,sample rate[,volts per count]"
+        followed by the samples.
+
+        :param store: optional defib_waveform.WaveformStore to append to
+        :param timeout: max seconds for the transfer
+        :return: defib_waveform.Waveform (samples in volts and sample rate)
+        """
+        from .defib_waveform import decode_waveform
+
+        deadline = time.monotonic() + timeout
+        self.protocol.write(self.WAVEFORM_CMD)
+        header = self.protocol.read_line(deadline)
+        if header is None:
+            raise impulse_error(self.WAVEFORM_CMD, Reply(Status.TIMEOUT, None, "", [], timeout))
+        if header.startswith("!"):
+            raise impulse_error(self.WAVEFORM_CMD, parse_reply(header))
+        try:
+            fields = header.strip().split(",")
+            count, fs = int(fields[0]), float(fields[1])
+            scale = float(fields[2]) if len(fields) > 2 else 1.0
+        except (IndexError, ValueError):
+            raise impulse_error(self.WAVEFORM_CMD,
+                               Reply(Status.ERROR, None, f"invalid header {header.strip()!r}", [], 0.0)) from None
+        if self.WAVEFORM_BINARY:
+            data = self.protocol.read_bytes(2 * count, deadline) or b""
+            received = len(data) // 2
+        else:
+            lines = []
+            received = 0
+            while received < count:
+                line = self.protocol.read_line(deadline)
+                if line is None:
+                    break
+                lines.append(line)
+                received += line.count(",") + 1
+            data = ",".join(lines)
+        if received < count:
+            raise impulse_error(self.WAVEFORM_CMD,
+                               Reply(Status.TIMEOUT, None, f"{received} of {count} samples", [], timeout))
+
+        try:
+            waveform = decode_waveform(data, count, fs, scale=scale, binary=self.WAVEFORM_BINARY)
+        except ValueError as e:
+            raise impulse_error(self.WAVEFORM_CMD, Reply(Status.ERROR, None, f"invalid samples: {e}", [], 0.0)) from None
+        if len(waveform.samples) < count:
+            raise impulse_error(self.WAVEFORM_CMD,
+                               Reply(Status.TIMEOUT, None, f"{len(waveform.samples)} of {count} samples", [],
+                                     timeout))
+        if store is not None:
+            store.append(waveform)
+        return waveform
+
+    def capture(self, poll=0.2, waveforms=False, store=None):
+        """
+        Create a CaptureSession for back to back discharges
+
+        :param poll: read timeout used by the reader thread
+        :param waveforms: download and analyze the waveform after every discharge
+        :param store: optional WaveformStore for the downloaded waveforms
+        :return: CaptureSession (not started)
+        """
+        return CaptureSession(self, poll=poll, waveforms=waveforms, store=store)
+
     def local_mode(self):
         """
         Return to local mode
         """
-        cmd = "Local\r"
-        self.serial.write(cmd.encode())
+        self.protocol.local()
+
+    def remote_mode(self):
+        """
+        Request REMOTE again even if the protocol believes it is already active
+        (checks that the analyzer still answers after a restart)
+        """
+        self.protocol.remote = False
+        self.protocol.mode = None
+        self.protocol.ensure_remote()
     
     def close(self):
 
         """
         Close serial COM
         """
-        self.serial.close()
+        self.transport.close()
+
+
+class CaptureSession:
+    """
+    Multi-discharge capture. The analyzer is configured once (REMOTE,
+    MODE=DEFIB) and a reader thread waits for every discharge-ready event,
+    parses it and re-arms with Dready, so shocks can be fired back to back.
+
+    Usage:
+        with analyzer.capture() as session:
+            for record in session.records(10, timeout=120):
+                print(record.energy)
+    """
+
+    def __init__(self, analyzer, poll=0.2, waveforms=False, store=None):
+        """
+        :param analyzer: IMPULSE7000 instance
+        :param poll: read timeout used by the reader thread, so it can be stopped
+        :param waveforms: attach the downloaded waveform and its analysis to each record
+        :param store: optional WaveformStore for the downloaded waveforms
+        """
+        self.analyzer = analyzer
+        self.poll = poll
+        self.waveforms = waveforms
+        self.store = store
+        self.queue = queue.Queue()
+        self.errors = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Configure the analyzer once and start the reader thread
+        """
+        self.analyzer.transport.reset_input_buffer()
+        self.analyzer.protocol.select_mode("DEFIB")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._reader, name="IMPULSE7000-capture", daemon=True)
+        self._thread.start()
+        self.analyzer.session = self
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _reader(self):
+        protocol = self.analyzer.protocol
+        try:
+            protocol.write("Dready")
+            while not self._stop.is_set():
+                line = protocol.read_line(time.monotonic() + self.poll)
+                if line is None:
+                    continue
+                if line.startswith("!"):
+                    raise impulse_error("Dready", parse_reply(line))
+                record = parse_discharge(line)
+                if record is None:
+                    continue
+                self.analyzer.energy = record.energy
+                if self.waveforms:
+                    from .defib_waveform import analyze_waveform
+                    waveform = self.analyzer.read_waveform(store=self.store)
+                    record = record._replace(waveform=waveform, analysis=analyze_waveform(waveform))
+                self.queue.put(record)
+                protocol.write("Dready")
+        except Exception as e:
+            #port, protocol or waveform decoding failure: the reader stops and get() raises it
+            self.errors.append(e)
+        finally:
+            self.queue.put(None)
+
+    def get(self, timeout=None):
+        """
+        Wait for the next DischargeRecord
+
+        :param timeout: seconds to wait, None waits forever
+        :return: DischargeRecord
+        :raises: the reader thread error, or InstrumentError if the session was stopped
+        """
+        record = self.queue.get(timeout=timeout)
+        if record is None:
+            self.queue.put(None)  #the reader is gone: later calls must not block either
+            if self.errors:
+                raise self.errors[-1]
+            raise InstrumentError("Dready: capture session stopped", command="Dready", instrument="IMPULSE7000")
+        return record
+
+    def records(self, count, timeout=None):
+        """
+        Iterate over the next count discharges
+
+        :param timeout: max seconds to wait for each discharge
+        """
+        for _ in range(count):
+            yield self.get(timeout=timeout)
+
+    def __iter__(self):
+        while not self._stop.is_set():
+            try:
+                yield self.get(timeout=self.poll)
+            except queue.Empty:
+                continue
+
+    def stop(self):
+        """
+        Stop the reader thread
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll * 5)
+        if self.analyzer.session is self:
+            self.analyzer.session = None
+
+    def __enter__(self):
+        return self.start()
 
+    def __exit__(self, *exc):
+        self.stop()
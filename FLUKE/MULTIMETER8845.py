@@ -1,13 +1,30 @@
-import serial
-import time
-import sympy as sp
+from .transport import SerialTransport
+from .errors import CommandError, InstrumentTimeout, ProtocolError, RetryPolicy
 
 
 __author__ ="Juan Cruz Noya"
 __mail__ = "juancruznoya@mi.unc.edu.ar"
 __status__ = "in building"
+#Prompts del Fluke 45 al terminar cada comando: ok, error de comando, error de ejecucion
+FLUKE45_PROMPTS = ("=>", "?>", "!>")
+
+
+def _to_float(text):
+    """
+    Convierte una lectura a float. Las lecturas normales ("+1.00000000E+03") no necesitan
+    sympy; se importa recien cuando llega una expresion que float() no entiende.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        import sympy as sp
+        return float(sp.sympify(text))
+
 class Fluke8845:
-    def __init__(self,port,baudrate,fetch_trouble = False):
+    #*OPC? ya espera hasta 30 s: no se repite
+    RETRY = RetryPolicy(attempts=2, commands={"*OPC?": 1})
+
+    def __init__(self,port,baudrate,fetch_trouble = False,transport=None,retry=None):
         self.COM = port
         self.baudrate = baudrate
         self.timeout = 0.1
@@ -22,7 +39,11 @@ class Fluke8845:
         self.delay = 100
         self.mA = True
         self.four_wire = False
-        self.ser = serial.Serial(self.COM, self.baudrate, timeout=self.timeout, parity = "N", stopbits = 1, bytesize = 8)
+        self.opc_timeout = 30
+        self.retry = retry or self.RETRY
+        self.transport = transport or SerialTransport(self.COM, self.baudrate, terminator=b"\n", eol="", timeout=5,
+                                                      poll=self.timeout, parity = "N", stopbits = 1, bytesize = 8)
+        self.transport.instrument = type(self).__name__  #etiqueta de las métricas
         self.error = None
         self.measurementUnit = {"standard":1,"kilo":1000,"mega":1000000,"mili":0.001,"micro":0.000001}
         self.fetch_trouble =fetch_trouble
@@ -31,28 +52,38 @@ class Fluke8845:
         self.diode = 0
 
 
+    def _parse_fetch(self,r,comando,port):
+        if r == "":
+            raise InstrumentTimeout(f"{comando.strip()}: sin respuesta", command=comando, reply=r, instrument=port)
+        try:
+            if self.fetch_trouble:
+                r = r.split(",")[-1]
+            return _to_float(r)
+        except (TypeError, ValueError):
+            raise ProtocolError(f"{comando.strip()}: respuesta invalida {r!r}", command=comando, reply=r,
+                                instrument=port) from None
+
+    def _check_opc(self,r,comando,port):
+        if r == "":
+            raise InstrumentTimeout(f"{comando.strip()}: la medicion no termino", command=comando, reply=r, instrument=port)
+        return 0
+
     def send_scpi_command(self,comando,delay=100):
-        time.sleep(delay/1000) if "FETCh" in comando else time.sleep(0.2)
-        self.ser.write(comando.encode())
-        time.sleep(0.1)
         if comando == "*OPC?\r\n": #wait until *OPC? complete
-            while self.ser.read(1024).decode() == "":
-                pass
-            return 0
+            return self.transport.request(comando, check=self._check_opc, timeout=self.opc_timeout, policy=self.retry)
         elif "FETCh" in comando:
-            try:
-                if self.fetch_trouble:
-                    r =self.ser.readline().decode()
-                    r = r.split(",")
-                    r = float(r[-1])
-                else:
-                    r = self.ser.read(1024).decode()
-                return float(sp.sympify(r))
-            except:
-                return -101 #for a future error list
+            self.transport.sleep(delay/1000) #asentamiento de la medicion
+            return self.transport.request(comando, check=self._parse_fetch, policy=self.retry)
         else:
+            self.transport.write(comando)
             return 0
 
+    def identify(self):
+        """
+        *IDN? del multimetro (verifica que responde sin cambiar la configuracion)
+        """
+        return self.transport.request("*IDN?\r\n", policy=self.retry)
+
     def Measurementscale(self,value,unit="standard"):
         return value/self.measurementUnit[unit.lower()]
 
@@ -199,8 +230,10 @@ class Fluke8845:
         self.temperature = self.Measurementscale(value=self.temperature,unit = "standard")
         
     
+    def close(self):
+        self.transport.close()
     def stop(self):
-        self.ser.close()
+        self.close()
     def enable_four_wire(self):
         self.four_wire =True
 
@@ -216,10 +249,15 @@ class Fluke8845:
         return 0
 
 class Fluke45:
-    def __init__(self,port,baudrate):
+    RETRY = RetryPolicy(attempts=2)
+
+    def __init__(self,port,baudrate,transport=None,retry=None):
         self.port = port
+        self.retry = retry or self.RETRY
         self.baudrate = baudrate
-        self.ser = serial.Serial(self.port, baudrate=baudrate,parity = "N", stopbits = 1, bytesize = 8,timeout=0.5)
+        self.transport = transport or SerialTransport(self.port, baudrate=baudrate, terminator=b"\n", eol="", timeout=2,
+                                                      poll=0.05, parity = "N", stopbits = 1, bytesize = 8)
+        self.transport.instrument = type(self).__name__  #etiqueta de las métricas
         self.voltage = 0
         self.resistance = 0
         self.current = 0
@@ -232,52 +270,52 @@ class Fluke45:
         self.measurementUnit = {"standard":1,"kilo":1000,"mega":1000000,"mili":0.001,"micro":0.000001}
         self.mA = True
 
+    def _read_response(self,command=""):
+        """
+        Lee las lineas de respuesta hasta el prompt del Fluke 45 (=>, ?>, !>).\n
+        Lanza CommandError si el prompt indica error e InstrumentTimeout si no llega.
+        """
+        lines = []
+        while True:
+            line = self.transport.read_until()
+            if line == "":
+                raise InstrumentTimeout(f"{command.strip()}: sin prompt", command=command, reply=lines,
+                                        instrument=self.port)
+            if line in FLUKE45_PROMPTS:
+                if line != "=>":
+                    detail = "comando desconocido" if line == "?>" else "error de ejecucion"
+                    raise CommandError(f"{command.strip()}: {detail}", code=line, command=command, reply=lines,
+                                       instrument=self.port)
+                return lines, line
+            lines.append(line)
+
+    def _transact(self,command):
+        self.transport.write(command)
+        lines, prompt = self._read_response(command)
+        if "?" in command and "*OPC" not in command:
+            try:
+                return _to_float(lines[0])
+            except (IndexError, TypeError, ValueError):
+                raise ProtocolError(f"{command.strip()}: respuesta invalida {lines!r}", command=command,
+                                    reply=lines, instrument=self.port) from None
+        return 0
+
     def send_queries_command(self,command,delay=100):
-        time.sleep(delay/1000.0) if "VAL" in command else time.sleep(0.1)
-        self.ser.write(command.encode())
+        if "VAL" in command:
+            self.transport.sleep(delay/1000.0) #asentamiento de la medicion
 
-        if command == "*OPC?\r\n": #wait until *OPC? complete
-            while self.ser.read(1024).decode() == False:
-                pass
-            return 0
-        if "VAL" in command :
-            #print(command)
-            r =self.ser.readline().decode()
-            #print(r)
-            try:
-                return float(sp.sympify(r))
-            except:
-                return 0.0
-        elif "AUTO" in command:
-            time.sleep(0.1)
-            r = self.ser.readline().decode()
-
-            #print(f"-{r}")
-            try:
-                return 0
-            except:
-                return 0.1
-        elif "*CLS in commnad":
-            time.sleep(1)
-            r = self.ser.readline().decode()
-
-            #print(f"-{r}")
-            try:
+        return self.transport.retrying(self.retry, lambda: self._transact(command), command)
+    def identify(self):
+        """
+        *IDN? del multimetro (verifica que responde sin cambiar la configuracion)
+        """
+        def attempt():
+            self.transport.write("*IDN?\r\n")
+            lines, _ = self._read_response("*IDN?\r\n")
+            return lines[0] if lines else ""
 
-                return 0
-            except:
-                return 0.2
-        
-        else:
-            time.sleep(0.1)
-            r = self.ser.readline().decode()
+        return self.transport.retrying(self.retry, attempt, "*IDN?\r\n")
 
-            #print(f"-{r}")
-            try:
-                return 0
-        
-            except:
-                return 0.3
     def Measurementscale(self,value,unit="standard"):
         return value/self.measurementUnit[unit.lower()]
     def resistance_measure(self):
@@ -289,7 +327,7 @@ class Fluke45:
 
         for command in queries_command:
             if "AUTO" in command:
-                time.sleep(0.5)
+                self.transport.sleep(0.5)
             else:
                 pass
 
@@ -305,7 +343,7 @@ class Fluke45:
                            "VAL1?\r\n"]
         for command in queries_command:
             if "AUTO" in command:
-                time.sleep(0.5)
+                self.transport.sleep(0.5)
             else:
                 pass
             self.voltage = self.send_queries_command(command=command, delay=self.delay)
@@ -325,7 +363,7 @@ class Fluke45:
 ]
         for command in queries_command:
             if "AUTO" in command:
-                time.sleep(0.5)
+                self.transport.sleep(0.5)
             else:
                 pass
             self.current = self.send_queries_command(command=command,delay=self.delay)
@@ -341,14 +379,16 @@ class Fluke45:
 
         for command in queries_command:
             if "AUTO" in command:
-                time.sleep(0.5)
+                self.transport.sleep(0.5)
             else:
                 pass
             self.frequency = self.send_queries_command(command=command, delay=self.delay)
 
         self.frequency = self.Measurementscale(value=self.frequency, unit=self.scale)
+    def close(self):
+        self.transport.close()
     def stop(self):
-        self.ser.close()
+        self.close()
     def enable_four_wire(self):
         self.four_wire =True
 
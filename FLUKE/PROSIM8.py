@@ -16,15 +16,20 @@ Permite poner el equipo en modo remoto, configurar parámetros fisiológicos
 manejar la conexión de forma robusta con timeouts y reintentos básicos.
 """
 import serial
+import logging
 from typing import Optional
-import numpy
-from time import sleep
+from collections import OrderedDict
+from time import sleep, perf_counter, time
+from .transport import SerialTransport
+from .errors import CommunicationError, InstrumentError, RangeError, RetryPolicy, check_status
 
 __company__ = "Feas Electronica"
 __author__ = "Juan Cruz Noya & Julian Font"
 __version__ = "1.2.0"
 __country__ = "Argentina"
 
+logger = logging.getLogger(__name__)
+
 class PROSIM8:
     """
     Clase para controlar el simulador ProSim 8 vía puerto serie.
@@ -46,11 +51,30 @@ class PROSIM8:
         ...
         ps8.disconnect()
     """
-    def __init__(self,port,debug=False,baudrate=115200):
-        
+    #Comandos que seleccionan la forma de onda del ECG; son excluyentes entre si
+    WAVE_COMMANDS = ("NSRA", "AFIB", "VFIB", "PREWAVE", "SPVWAVE", "VNTWAVE", "CNDWAVE",
+                     "TVPWAVE", "MONOVTACH", "SINE", "TRI")
+
+    #Los setpoints son idempotentes: un timeout o una respuesta corrupta se reintenta enseguida
+    RETRY = RetryPolicy(attempts=3, backoff=0.005, max_backoff=0.05)
+
+    def __init__(self,port,debug=False,baudrate=115200,tracer=None,resilient=False,reconnect_timeout=2.0,transport=None,
+                 retry=None):
+        """
+        :param retry: RetryPolicy de sendCommand(); por defecto PROSIM8.RETRY
+        :param transport: SerialTransport ya creado (p.ej. sobre un puerto simulado); por defecto se abre uno en connect()
+        :param tracer: CommandTracer opcional (tracing.py) para registrar latencia por comando
+        :param resilient: si es True, ante un error del puerto se reconecta y se reenvia el estado
+        :param reconnect_timeout: tiempo maximo en segundos para recuperar la sesion
+        """
         self.port = port
         self.baudrate = baudrate
         self.debug = debug
+        self.tracer = tracer
+        self.resilient = resilient
+        self.reconnect_timeout = reconnect_timeout
+        self.retry = retry or self.RETRY
+        self.state = OrderedDict()  #espejo del ultimo estado enviado: clave -> comando formateado
         self.HEARTRATE = 60
         self.MODE = "ADULTO"
         self.LEAD_ARTIFACT = "ALL"
@@ -61,8 +85,34 @@ class PROSIM8:
         self.PACER_WIDTH = "1.0"
         self.PACER_CHAMBER = "A"
         self.FIB_GRANULARITY = "COARSE"
-        self.con: Optional[serial.Serial] = None
+        self.ECG_AMPL = "1.00"
+        self.DEVIATION = "0.00"
+        self.PACER_WAVE = None
+        self._transport = transport
+        self.con: Optional[SerialTransport] = None
         
+    def _open(self):
+        if self.con is not None:
+            self.con.open()
+            return
+        if self._transport is not None:
+            self.con = self._transport
+            self.con.instrument = type(self).__name__  #etiqueta de las métricas
+            self.con.open()
+            return
+        self.con = SerialTransport(
+            port=self.port,
+            baudrate=self.baudrate,
+            terminator=b"\n",
+            eol="\r",
+            timeout=1,
+            stopbits=serial.STOPBITS_ONE,
+            parity=serial.PARITY_NONE,
+            bytesize=8,
+            xonxoff=False
+        )
+        self.con.instrument = type(self).__name__
+
     def connect(self):
         """
         CONECTA PROSIM8 CON PUERTO SERIE\n
@@ -73,33 +123,83 @@ class PROSIM8:
         if self.con is not None and self.con.is_open:
             return
         try:
-            self.con = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                stopbits=serial.STOPBITS_ONE,
-                parity=serial.PARITY_NONE,
-                bytesize=8,
-                xonxoff=False,
-                timeout=1
-            )
+            self._open()
             self.remote()
-        except serial.SerialException as e:
+        except (serial.SerialException, CommunicationError) as e:
             self.con = None
-            raise ConnectionError(f"Error de conexión: {e}")
+            raise CommunicationError(f"Error de conexión: {e}", instrument=self.port) from e
         
     def remote(self):
         self.sendCommand(cmd="REMOTE")
 
+    def ping(self):
+        """
+        Consulta vacia: el ProSim 8 responde "*" si el enlace esta vivo (no cambia el estado)
+        """
+        return self.sendCommand(cmd="")
+
 
     def disconnect(self):
         """
         DESCONECTA PROSIM8 CON PUERTO SERIE\n
+        El espejo de estado se conserva para poder usar resume().
         """
         if self.con is not None:
             if self.con.is_open:
                 self.con.close()
             self.con = None
 
+    def close(self):
+        """
+        Igual que disconnect(): todos los drivers FLUKE se cierran con close().
+        """
+        self.disconnect()
+
+    def reconnect(self):
+        """
+        Reabre el puerto con backoff acotado, vuelve a modo remoto y reenvia
+        el ultimo estado conocido del simulador (self.state).\n
+        Lanza CommunicationError si no se recupera dentro de reconnect_timeout
+        o si algun comando del estado no se pudo restaurar.
+        """
+        deadline = perf_counter() + self.reconnect_timeout
+        delay = 0.05
+        while True:
+            try:
+                if self.con is not None:
+                    self.con.close()
+            except (serial.SerialException, OSError):
+                pass
+            try:
+                self._open()
+                check_status(self._transact("REMOTE"), "REMOTE", self.port)  #sin acknowledge sigue caído
+                break
+            except (serial.SerialException, OSError) as e:
+                if perf_counter() + delay > deadline:
+                    raise CommunicationError(f"Error de reconexión: {e}", instrument=self.port) from e
+                sleep(delay)
+                delay = min(delay * 2, 0.4)
+
+        if self.state:
+            cmds = list(self.state.values())
+            _, errors = self._acknowledged(cmds, self._transact_batch(cmds))
+            if errors:
+                raise CommunicationError(f"Sesion recuperada en forma incompleta, {len(errors)} de {len(cmds)} "
+                                         f"comandos sin restaurar: {errors[0]}", instrument=self.port) from errors[0]
+        logger.info("Sesion recuperada en %s, %d comandos reenviados", self.port, len(self.state))
+
+    def resume(self):
+        """
+        Reconecta tras un disconnect() y restaura el estado del escenario.
+        """
+        self.reconnect()
+
+    def clearState(self):
+        """
+        Olvida el estado espejado (p.ej. al iniciar un escenario nuevo).
+        """
+        self.state.clear()
+
     def _format_int(self, value, width= 3):
         try:
             iv = int(value)
@@ -117,12 +217,8 @@ class PROSIM8:
             return fmt.format(fv)
         except (ValueError, TypeError):
             return str(value)
-        
-    
-    def sendCommand(self, cmd):
-        if self.con is None or not self.con.is_open:
-            raise serial.SerialException("Puerto serie no está conectado")
-        
+
+    def _format_command(self, cmd):
         # Formatear número a 3 dígitos si el comando contiene un "="
         if '=' in cmd:
             key, value = cmd.split('=', 1)
@@ -131,23 +227,140 @@ class PROSIM8:
             elif value.isdigit():
                 value = self._format_int(value, width=3)
             cmd = f"{key}={value}"
-        
-        cmd = cmd + "\r"
-        self.con.write(cmd.encode('utf-8'))  # type: ignore
+        return cmd
+
+    def _state_key(self, cmd):
+        """
+        Clave del espejo de estado para un comando formateado, o None si no es un setpoint.
+        """
+        if '=' not in cmd:
+            return None
+        key, value = cmd.split('=', 1)
+        if key in self.WAVE_COMMANDS:
+            return "WAVE"
+        if key.startswith("TVP"):
+            return f"{key}:{value.split(',')[0]}"  #un valor por camara de marcapasos
+        return key
+
+    def _transact(self, cmd):
+        """
+        Escribe un comando ya formateado y lee su status.
+        """
         if self.debug:
             print(f"Comando enviado: {cmd}")
+        received = self.con.bytes_read
+        sent = time()  #el registro queda con el instante del envío, no el de la respuesta
+        status = self.con.query(cmd)
+        if self.tracer is not None:
+            self.tracer.record(cmd, self.con.last_latency, status, len(cmd) + 1, self.con.bytes_read - received,
+                               timestamp=sent)
+        if self.debug:
+            print(f"Status recibido: {status}")
+        return status
 
+    def sendCommand(self, cmd):
+        """
+        Envia un comando al ProSim 8 y devuelve el status recibido (str).\n
+        Un status "!xx" lanza CommandError/RangeError y la falta de respuesta InstrumentTimeout;
+        los errores transitorios se reintentan segun self.retry.
+        Con resilient=True un error del puerto, o un timeout que sigue después de los reintentos
+        (puerto abierto que ya no contesta), dispara reconnect() y el comando se reintenta una vez.
+        """
         if self.con is None or not self.con.is_open:
-            raise serial.SerialException("Puerto serie no está conectado")
-        raw = self.con.readline()  # type: ignore
+            raise CommunicationError("Puerto serie no está conectado", instrument=self.port)
+
+        cmd = self._format_command(cmd)
         try:
-            if self.debug:
-                print(f"Status recibido: {raw.decode('utf-8').strip()}")
-            return
-        except UnicodeDecodeError:
-            if self.debug:
-                print(f"Status recibido: {raw.decode('latin1').strip()}")
-            return
+            status = self._checked(cmd)
+        except (serial.SerialException, OSError) as e:  #InstrumentTimeout también es OSError
+            if not self.resilient:
+                raise
+            logger.warning("Puerto %s caido (%s), reconectando", self.port, e)
+            self.reconnect()
+            status = self._checked(cmd)
+
+        self._remember(cmd)
+        return status
+
+    def _checked(self, cmd):
+        def attempt():
+            return check_status(self._transact(cmd), cmd, self.port)
+
+        def on_retry(error, n):
+            logger.debug("Reintento %d de %s: %s", n, cmd, error)
+
+        return self.con.retrying(self.retry, attempt, cmd, on_retry)
+
+    def sendBatch(self, cmds):
+        """
+        Envia varios comandos en una sola escritura y luego lee un status por comando.\n
+        Lanza InstrumentTimeout si alguno no recibe acknowledge y CommandError/RangeError si responde "!xx";
+        el espejo de estado ya registra los comandos que el equipo acepto.
+        Con resilient=True un error del puerto o un timeout dispara reconnect() y el lote se reenvia una vez.
+        """
+        if self.con is None or not self.con.is_open:
+            raise CommunicationError("Puerto serie no está conectado", instrument=self.port)
+
+        cmds = [self._format_command(cmd) for cmd in cmds]
+        try:
+            return self._checked_batch(cmds)
+        except (serial.SerialException, OSError) as e:  #InstrumentTimeout también es OSError
+            if not self.resilient:
+                raise
+            logger.warning("Puerto %s caido (%s), reconectando", self.port, e)
+            self.reconnect()
+            return self._checked_batch(cmds)
+
+    def _checked_batch(self, cmds):
+        statuses = self._transact_batch(cmds)
+        accepted, errors = self._acknowledged(cmds, statuses)
+        for cmd in accepted:
+            self._remember(cmd)
+        if errors:
+            raise errors[0]
+        return statuses
+
+    def _acknowledged(self, cmds, statuses):
+        """
+        Verifica un status por comando con check_status.\n
+        :return: (comandos aceptados por el equipo, errores de los rechazados o sin respuesta)
+        """
+        accepted, errors = [], []
+        for cmd, status in zip(cmds, statuses):
+            try:
+                check_status(status, cmd, self.port)
+            except InstrumentError as e:
+                errors.append(e)
+            else:
+                accepted.append(cmd)
+        return accepted, errors
+
+    def _transact_batch(self, cmds):
+        #el ProSim atiende el lote en orden: cada comando empieza cuando se escribió o cuando llegó el
+        #acknowledge del anterior, y su latencia se mide desde ahí hasta su propio acknowledge
+        sent = time()
+        t0 = perf_counter()
+        self.con.write_batch(cmds)
+        statuses = []
+        for cmd in cmds:
+            received = self.con.bytes_read
+            status = self.con.read_until()
+            t1 = perf_counter()
+            if self.tracer is not None:
+                self.tracer.record(cmd, t1 - t0, status, len(cmd) + 1, self.con.bytes_read - received,
+                                   timestamp=sent)
+            sent += t1 - t0
+            t0 = t1
+            statuses.append(status)
+        if self.debug:
+            print(f"Lote enviado: {cmds} -> {statuses}")
+        return statuses
+
+    def _remember(self, cmd):
+        key = self._state_key(cmd)
+        if key is not None:
+            self.state[key] = cmd
+            self.state.move_to_end(key)
 
 
 
@@ -169,13 +382,13 @@ class PROSIM8:
         :rate: 10 - 360\n
         """
         if int(rate)<10:
-            print("Valor por debajo del limite")
+            logger.warning("Valor por debajo del limite")
             self.HEARTRATE=10
         elif int(rate)>360:
-            print("Valor por encima del limite")
+            logger.warning("Valor por encima del limite")
             self.HEARTRATE = 360
         else:
-            print(f"Se setea el valor frecuencia cardiaca en: {int(rate)}")
+            logger.debug("Se setea el valor frecuencia cardiaca en: %d", int(rate))
             self.HEARTRATE = int(rate)
 
     def setMode(self,mode):
@@ -192,6 +405,7 @@ class PROSIM8:
         """
         cmd = f"NSRA={self.HEARTRATE}"
         self.sendCommand(cmd)
+        self.PACER_WAVE = None
 
 
     def truncar_dos_decimales(self,valor):
@@ -207,26 +421,23 @@ class PROSIM8:
         """ 
         #En este caso particular como es un valor "numerico" puedo determinar si el valor ingresado tiene forma de valor flotante
         
-        _float_param = float(param)
         try:
-            if -0.05<=_float_param<= 0.05:
-                _float_param = self.truncar_dos_decimales(valor=_float_param)
+            _float_param = float(param)
+        except (ValueError, TypeError):
+            raise RangeError(f"ERR-151: El formato ingresado es incorrecto: {param}") from None
+        if -0.05<=_float_param<= 0.05:
+            _float_param = self.truncar_dos_decimales(valor=_float_param)
+            param = str(_float_param)
+        elif (0.10 <= _float_param <= 0.80 or -0.80 <= _float_param <= -0.10):
+            # Solo aceptar si es múltiplo de 0.10 exacto
+            if round(_float_param % 0.10, 8) == 0:
                 param = str(_float_param)
-            elif (0.10 <= _float_param <= 0.80 or -0.80 <= _float_param <= -0.10):
-                # Solo aceptar si es múltiplo de 0.10 exacto
-                if round(_float_param % 0.10, 8) == 0:
-                    param = str(_float_param)
-            else:
-                print("ERR-150")
-                print("El formato ingresado es incorrecto")
-                param = "0.00"
-        except:
-            print("ERR-151")
-            print("El formato ingresado es incorrecto")
-            param = "0.00"
+        else:
+            raise RangeError(f"ERR-150: El formato ingresado es incorrecto: {param}")
 
         cmd=f"STDEV={param}"
         self.sendCommand(cmd)
+        self.DEVIATION = param
     
     def setECGAmplitude(self,param="1.00"):
         """
@@ -238,45 +449,45 @@ class PROSIM8:
         #Saltos de 0.50 a 5.00 saltos de 0.25mV
         cmd=f"ECGAMPL={param}"
         self.sendCommand(cmd)
+        self.ECG_AMPL = param
     
+    ECG_ARTIFACTS = {
+        "50":"50",
+        "60": "60",
+        "50HZ":"50",
+        "50Hz":"50",
+        "60HZ": "60",
+        "60Hz": "60",
+        "60hz": "60",
+        "50hz": "50",
+        "Musc": "MSC",
+        "MUSC": "MSC",
+        "musc": "MSC",
+        "MUSCULAR": "MSC",
+        "muscular": "MSC",
+        "MSC": "MSC",
+        "WANDERING": "WAND",
+        "BASELINE": "WAND",
+        "wandering": "WAND",
+        "wand": "WAND",
+        "base": "WAND",
+        "wanderingBaseline":"WAND",
+        "WanderingBaseline":"WAND",
+        "RESP":"RESP",
+        "resp":"RESP",
+        "Resp":"RESP",
+        "RESPIRATORIA":"RESP",
+        "respiratoria":"RESP"
+    }
+
     def setArtifact(self,param="OFF"):
         """
         Funcion que setea el tipo de artefacto\n
         :param:
         DIC: El diccionario va a tener una cantidad de posibles valores para que la funcion tenga un accionar correcto\n
         """
-
-        dic_artifact={
-            "50":"50",
-            "60": "60",
-            "50HZ":"50",
-            "50Hz":"50",
-            "60HZ": "60",
-            "60Hz": "60",
-            "60hz": "60",
-            "50hz": "50",
-            "Musc": "MSC",
-            "MUSC": "MSC",
-            "musc": "MSC",
-            "MUSCULAR": "MSC",
-            "muscular": "MSC",
-            "MSC": "MSC",
-            "WANDERING": "WAND",
-            "BASELINE": "WAND",
-            "wandering": "WAND",
-            "wand": "WAND",
-            "base": "WAND",
-            "wanderingBaseline":"WAND",
-            "WanderingBaseline":"WAND",
-            "RESP":"RESP",
-            "resp":"RESP",
-            "Resp":"RESP",
-            "RESPIRATORIA":"RESP",
-            "respiratoria":"RESP"
-        }
-
         try:
-            param = dic_artifact[param]
+            param = self.ECG_ARTIFACTS[param]
         except:
             param = param
         
@@ -305,59 +516,59 @@ class PROSIM8:
         cmd = f"EARTSZ={self.LEAD_SIZE}"
         self.sendCommand(cmd)
 
-    def setSide(self,param):
-
-        _side_dic = {
+    SIDES = {
+        "Izquierda":"Left",
+        "IZQ": "Left",
+        "I":"Left",
+        "L":"Left",
+        "Left":"Left",
+        "izq":"Left",
+        "izquierda":"Left",
+        "DER":"Right",
+        "der":"Right",
+        "D":"Right",
+        "R":"Right",
+        "Right":"Right",
+        "Derecha":"Right",
+        "derecha":"Right"
+    }
 
-            "Izquierda":"Left",
-            "IZQ": "Left",
-            "I":"Left",
-            "L":"Left",
-            "Left":"Left",
-            "izq":"Left",
-            "izquierda":"Left",
-            "DER":"Right",
-            "der":"Right",
-            "D":"Right",
-            "R":"Right",
-            "Right":"Right",
-            "Derecha":"Right",
-            "derecha":"Right"
-        }
-
-        self.SIDE = _side_dic[param] #Selecciona el lado donde se va a realizar la arrimia
+    def setSide(self,param):
 
+        self.SIDE = self.SIDES[param] #Selecciona el lado donde se va a realizar la arrimia
+
+
+    PRE_VENTRICULAR_ARRHYTHMIAS = {
+        "prematureatrialcontraction":"PAC",
+        "PrematureAtrialContraction":"PAC",
+        "PAC":"PAC",
+        "AtrialContraction":"PAC",
+        "ACONTRACTION":"PAC",
+        "prematurenodalcontraction":"PNC",
+        "PrematureNodalContraction":"PNC",
+        "PNC":"PNC",
+        "NodalContraction":"PNC",
+        "NCONTRACTION":"PNC",
+        "ContraccionVentricular": "PVC1",
+        "PVC":"PVC1",
+        "VentricularContraction":"PVC1",
+        "Early":"PVC1E",
+        "early":"PVC1E",
+        "Temprana":"PVC1E",
+        "temprana":"PVC1E",
+        "ContraccionTemprana":"PVC1E",
+        "RenT":"PVC1R",
+        "RonT":"PVC1R",
+        "ContraccionRenT":"PVC1R",
+        "ContraccionRT":"PVC1R",
+        "RTContraction":"PVC1R",
+        "RT":"PVC1R",
+    }
 
     def setPreVentricularArrhythmia(self,param):
 
-        _pre_ventricular_arrhythmia_dic = {
-            "prematureatrialcontraction":"PAC",
-            "PrematureAtrialContraction":"PAC",
-            "PAC":"PAC",
-            "AtrialContraction":"PAC",
-            "ACONTRACTION":"PAC",
-            "prematurenodalcontraction":"PNC",
-            "PrematureNodalContraction":"PNC",
-            "PNC":"PNC",
-            "NodalContraction":"PNC",
-            "NCONTRACTION":"PNC",
-            "ContraccionVentricular": "PVC1",
-            "PVC":"PVC1",
-            "VentricularContraction":"PVC1",
-            "Early":"PVC1E",
-            "early":"PVC1E",
-            "Temprana":"PVC1E",
-            "temprana":"PVC1E",
-            "ContraccionTemprana":"PVC1E",
-            "RenT":"PVC1R",
-            "RonT":"PVC1R",
-            "ContraccionRenT":"PVC1R",
-            "ContraccionRT":"PVC1R",
-            "RTContraction":"PVC1R",
-            "RT":"PVC1R",
-        }
         try:
-            arrh = _pre_ventricular_arrhythmia_dic[param]
+            arrh = self.PRE_VENTRICULAR_ARRHYTHMIAS[param]
         except:
             arrh = "PAC" #Para que no se detenga la ejecucion.....
         if not self.SIDE=="Left":
@@ -367,6 +578,44 @@ class PROSIM8:
         cmd = f"PREWAVE={arrh}"
         self.sendCommand(cmd)
 
+    SUPRA_VENTRICULAR_ARRHYTHMIAS = {
+        "Flutter": "AFL",
+        "AtrialFlutter": "AFL",
+        "flutter": "AFL",
+        "AFL":"AFL",
+        "Sinus":"SNA",
+        "sinus":"SNA",
+        "SNA":"SNA",
+        "Sinusal":"SNA",
+        "ArritmiaSinusal":"SNA",
+        "SinusArrhythmia":"SNA",
+        "80BPM" :"MB80",
+        "80":"MB80",
+        "80LPM":"MB80",
+        "120BPM":"MB120",
+        "120":"MB120",
+        "120LPM":"MB120",
+        "SupraventricularTachycardia":"SVT",
+        "TaquicardiaSupraventricular":"SVT",
+        "SupTaquicardia":"SVT",
+        "SVT":"SVT",
+        "SupTachycardia":"SVT",
+        "Nodal":"NOD",
+        "NOD":"NOD",
+        "Paraox": "PAT",
+        "PAT":"PAT",
+        "Paroxismal":"PAT",
+        "Paroxysmal":"PAT",
+        "TaquicardiaAtrialParoxismal":"PAT",
+        "ParoxysmalAtrialTachycardia":"PAT",
+        "TaquicardiaAtrial":"ATC",
+        "ATC":"ATC",
+        "Taquicardia":"ATC",
+        "Tachycardia":"ATC",
+        "TaquicardiaAtrial":"ATC",
+        "AtrialTachycardia":"ATC"
+    }
+
     def setSupArrhythmia(self,param):
         """
         ***GLOSARIO***:\n
@@ -380,81 +629,45 @@ class PROSIM8:
         **SVT**: Supraventricual Tachycardia 
         
         """
-        supra_ventricular_arrhythmia_dic = {
-            "Flutter": "AFL",
-            "AtrialFlutter": "AFL",
-            "flutter": "AFL",
-            "AFL":"AFL",
-            "Sinus":"SNA",
-            "sinus":"SNA",
-            "SNA":"SNA",
-            "Sinusal":"SNA",
-            "ArritmiaSinusal":"SNA",
-            "SinusArrhythmia":"SNA",
-            "80BPM" :"MB80",
-            "80":"MB80",
-            "80LPM":"MB80",
-            "120BPM":"MB120",
-            "120":"MB120",
-            "120LPM":"MB120",
-            "SupraventricularTachycardia":"SVT",
-            "TaquicardiaSupraventricular":"SVT",
-            "SupTaquicardia":"SVT",
-            "SVT":"SVT",
-            "SupTachycardia":"SVT",
-            "Nodal":"NOD",
-            "NOD":"NOD",
-            "Paraox": "PAT",
-            "PAT":"PAT",
-            "Paroxismal":"PAT",
-            "Paroxysmal":"PAT",
-            "TaquicardiaAtrialParoxismal":"PAT",
-            "ParoxysmalAtrialTachycardia":"PAT",
-            "TaquicardiaAtrial":"ATC",
-            "ATC":"ATC",
-            "Taquicardia":"ATC",
-            "Tachycardia":"ATC",
-            "TaquicardiaAtrial":"ATC",
-            "AtrialTachycardia":"ATC"
-        }
 
         try:
-            arrh = supra_ventricular_arrhythmia_dic[param]
+            arrh = self.SUPRA_VENTRICULAR_ARRHYTHMIAS[param]
         except:
             arrh = "AFL" #Para que no se detenga la ejecucion.....
         cmd=f"SPVWAVE={arrh}"
         self.sendCommand(cmd)
+    VENTRICULAR_ARRHYTHMIAS = {
+        "6":"PVC6M",
+        "6min":"PVC6M",
+        "PVC6M":"PVC6M",
+        "12":"PVC12M",
+        "12min":"PVC12M",
+        "PVC12M":"PVC12M",
+        "24":"PVC24M",
+        "24min":"PVC24M",
+        "PVC24M":"PVC24M",
+        "MultiFocal":"FMF",
+        "Multi":"FMF",
+        "FrequentMultiFocal":"FMF",
+        "Trigeminismo":"TRIG",
+        "Trigeminy":"TRIG",
+        "TRIG":"TRIG",
+        "Trig":"TRIG",
+        "Bigeminismo":"BIG",
+        "Bigeminy":"BIG",
+        "BIG":"BIG",
+        "Big":"BIG",
+        "PAIR":"PAIR",
+        "PAR":"PAIR",
+        "5": "RUN5",
+        "11":"RUN11"
+    }
+
     def VentricularArrhythmia(self,param):
 
-        _ventricular_arrhythmia_dic = {
-            "6":"PVC6M",
-            "6min":"PVC6M",
-            "PVC6M":"PVC6M",
-            "12":"PVC12M",
-            "12min":"PVC12M",
-            "PVC12M":"PVC12M",
-            "24":"PVC24M",
-            "24min":"PVC24M",
-            "PVC24M":"PVC24M",
-            "MultiFocal":"FMF",
-            "Multi":"FMF",
-            "FrequentMultiFocal":"FMF",
-            "Trigeminismo":"TRIG",
-            "Trigeminy":"TRIG",
-            "TRIG":"TRIG",
-            "Trig":"TRIG",
-            "Bigeminismo":"BIG",
-            "Bigeminy":"BIG",
-            "BIG":"BIG",
-            "Big":"BIG",
-            "PAIR":"PAIR",
-            "PAR":"PAIR",
-            "5": "RUN5",
-            "11":"RUN11"
-        }
     
         try:
-            arrh = _ventricular_arrhythmia_dic[param]
+            arrh = self.VENTRICULAR_ARRHYTHMIAS[param]
         except:
             arrh = "FMF" #Para que no se detenga la ejecucion.....
         cmd = f"VNTWAVE={arrh}"
@@ -465,32 +678,33 @@ class PROSIM8:
         cmd=f"VNTWAVE=ASYS"
         self.sendCommand(cmd)
 
+    CONDUCTION_ARRHYTHMIAS = {
+        "PrimerBloqueo":"1DB",
+        "PrimerGrado":"1DB",
+        "FirstDegeeBlock":"1DB",
+        "BloqueoAV":"1DB",
+        "Wenck":"2DB1",
+        "Wenckebach":"2DB1",
+        "SegundoGrade":"2DB2",
+        "SecondDegree":"2DB2",
+        "Tipo2":"2DB2",
+        "2DG":"2DB2",
+        "TercerGrado":"3DB",
+        "ThirdDegree":"3DB",
+        "BloqueoTercerGrado":"3DB",
+        "RamaDerecha":"RBBB",
+        "RightBundleBranchBlock":"RBBB",
+        "RightBranch":"RBBB",
+        "RamaIzquierda":"LBBB",
+        "LeftBranch":"LBBB",
+        "LeftBundleBranchBlock":"LBBB"
+    }
+
     def ConductionArrythmia(self,param): #El alias puede ser bloqueo
 
         
-        _conduction_arrythmia_dic = {
-            "PrimerBloqueo":"1DB",
-            "PrimerGrado":"1DB",
-            "FirstDegeeBlock":"1DB",
-            "BloqueoAV":"1DB",
-            "Wenck":"2DB1",
-            "Wenckebach":"2DB1",
-            "SegundoGrade":"2DB2",
-            "SecondDegree":"2DB2",
-            "Tipo2":"2DB2",
-            "2DG":"2DB2",
-            "TercerGrado":"3DB",
-            "ThirdDegree":"3DB",
-            "BloqueoTercerGrado":"3DB",
-            "RamaDerecha":"RBBB",
-            "RightBundleBranchBlock":"RBBB",
-            "RightBranch":"RBBB",
-            "RamaIzquierda":"LBBB",
-            "LeftBranch":"LBBB",
-            "LeftBundleBranchBlock":"LBBB"
-        }
         try:
-            arrh = _conduction_arrythmia_dic[param]
+            arrh = self.CONDUCTION_ARRHYTHMIAS[param]
         except:
             arrh = "1DB"
 
@@ -501,42 +715,42 @@ class PROSIM8:
 
         self.PACER_CHAMBER = chamber
 
+    PACER_WAVES = {
+        "Atrial":"ATR",
+        "atrial":"ATR",
+        "ATR":"ATR",
+        "Asincronica":"ASY",
+        "asincronica":"ASY",
+        "Asincronico":"ASY",
+        "asincronico":"ASY",
+        "ASIN":"ASY",
+        "ASI":"ASY",
+        "Asynchronous":"ASY",
+        "ASY":"ASY",
+        "Frecuente":"DFS",
+        "Frequent":"DFS",
+        "DFS":"DFS",
+        "Ocasional":"DOS",
+        "Occasional":"DOS",
+        "DOS":"DOS",
+        "AtrioVentricular":"AVS",
+        "Atrio-Ventricular":"AVS",
+        "SinCaputra":"NCP",
+        "Sin-Captura":"NPC",
+        "NonCapture":"NPC",
+        "Non-Capture":"NPC",
+        "NPC":"NPC",
+        "Sin-Funcion":"NFN",
+        "Non-Function":"NFN"
+    }
+
     def setPacerPulse(self,wave):
 
-        tvp_wave_dic = {
-            "Atrial":"ATR",
-            "atrial":"ATR",
-            "ATR":"ATR",
-            "Asincronica":"ASY",
-            "asincronica":"ASY",
-            "Asincronico":"ASY",
-            "asincronico":"ASY",
-            "ASIN":"ASY",
-            "ASI":"ASY",
-            "Asynchronous":"ASY",
-            "ASY":"ASY",
-            "Frecuente":"DFS",
-            "Frequent":"DFS",
-            "DFS":"DFS",
-            "Ocasional":"DOS",
-            "Occasional":"DOS",
-            "DOS":"DOS",
-            "AtrioVentricular":"AVS",
-            "Atrio-Ventricular":"AVS",
-            "SinCaputra":"NCP",
-            "Sin-Captura":"NPC",
-            "NonCapture":"NPC",
-            "Non-Capture":"NPC",
-            "NPC":"NPC",
-            "Sin-Funcion":"NFN",
-            "Non-Function":"NFN"
-        }
 
         try:
-            wave_selected = tvp_wave_dic[wave]
-        except:
-            wave_selected = "ATR"
-            print("ERROR-502")
+            wave_selected = self.PACER_WAVES[wave]
+        except KeyError:
+            raise RangeError(f"ERROR-502: Onda de marcapasos desconocida: {wave}") from None
 
 
         #Setea polaridad
@@ -553,48 +767,49 @@ class PROSIM8:
         #Setea el tipo de onda
         cmd = f"TVPWAVE={wave_selected}"
         self.sendCommand(cmd)
+        self.PACER_WAVE = wave_selected
+
+    FIB_GRANULARITIES = {
+        "fino":"FINE",
+        "Fino":"FINE",
+        "Fine":"FINE",
+        "FINE":"FINE",
+        "fine":"FINE",
+        "Grueso":"COARSE",
+        "grueso":"COARSE",
+        "COARSE":"COARSE",
+        "Coarse":"COARSE",
+        "coarse":"COARSE"
+    }
 
     def setGranularity(self,param):
-        _granularity_dic = {
-            "fino":"FINE",
-            "Fino":"FINE",
-            "Fine":"FINE",
-            "FINE":"FINE",
-            "fine":"FINE",
-            "Grueso":"COARSE",
-            "grueso":"COARSE",
-            "COARSE":"COARSE",
-            "Coarse":"COARSE",
-            "coarse":"COARSE"
-        }
         try:
-            self.FIB_GRANULARITY = _granularity_dic[param]
-        except:
-            self.FIB_GRANULARITY = "COARSE"
-            print("ERROR-503")
+            self.FIB_GRANULARITY = self.FIB_GRANULARITIES[param]
+        except KeyError:
+            raise RangeError(f"ERROR-503: Granularidad desconocida: {param}") from None
+
+    FIBRILLATIONS = {
+        "Atrio":"ATRIAL",
+        "Atrial":"ATRIAL",
+        "ATRIO":"ATRIAL",
+        "atrio":"ATRIAL",
+        "atrial":"ATRIAL",
+        "A":"ATRIAL",
+        "V":"VENTRICULAR",
+        "Ventricular":"VENTRICULAR",
+        "VENTRICULAR":"VENTRICULAR",
+        "ventricular":"VENTRICULAR",
+        "VENTRICULO":"VENTRICULAR",
+        "ventriculo":"VENTRICULAR",
+        "Ventriculo":"VENTRICULAR"
+    }
 
     def setFibrilation(self,param):
         """
         Setea la fibrilacion, puede ser de atrio, o ventricular
         """
-        _fibrilation_dic = {
-            "Atrio":"ATRIAL",
-            "Atrial":"ATRIAL",
-            "ATRIO":"ATRIAL",
-            "atrio":"ATRIAL",
-            "atrial":"ATRIAL",
-            "A":"ATRIAL",
-            "V":"VENTRICULAR",
-            "Ventricular":"VENTRICULAR",
-            "VENTRICULAR":"VENTRICULAR",
-            "ventricular":"VENTRICULAR",
-            "VENTRICULO":"VENTRICULAR",
-            "ventriculo":"VENTRICULAR",
-            "Ventriculo":"VENTRICULAR"
-
-        }
         try:
-            switcher = _fibrilation_dic[param]
+            switcher = self.FIBRILLATIONS[param]
         except:
             switcher = "VENTRICULAR"
         
@@ -624,6 +839,38 @@ class PROSIM8:
         self.sendCommand(cmd)
 
     #*****************************************************************SpO2**********************************************************************
+    SPO2_SENSORS = {
+        "NELCOR":"NELCR",
+        "NELCR":"NELCR",
+        "MASIMO":"MASIM",
+        "MASIM":"MASIM",
+        "MASIMORAD":"MASIMR",
+        "MASIMOR":"MASIMR",
+        "MASIMR":"MASIMR",
+        "NONIN":"NONIN",
+        "OHMED":"OHMED",
+        "PHIL":"PHIL",
+        "NIHON":"NIHON",
+        "MINDRAY":"MINDR",
+        "MINDR":"MINDR",
+        "BCI":"BCI"
+    }
+
+    SPO2_ARTIFACTS = {
+        "OFF":"NONE",
+        "NONE":"NONE",
+        "RESP":"RESP",
+        "RESPIRATORIA":"RESP",
+        "50":"50",
+        "50HZ":"50",
+        "60":"60",
+        "60HZ":"60",
+    }
+
+    #Tablas predefinidas de (saturacion, perfusion) para ensayos de exactitud
+    SPO2_SATURATION_TABLE = [(100, 2.0), (97, 2.0), (94, 2.0), (90, 2.0), (85, 2.0), (80, 2.0), (75, 2.0), (70, 2.0)]
+    SPO2_PERFUSION_TABLE = [(97, 20.0), (97, 10.0), (97, 5.0), (97, 2.0), (97, 1.0), (97, 0.5), (97, 0.2), (97, 0.1), (97, 0.05)]
+
     def set_SpO2_saturacion(self, SATURATION):
         cmd = f"SAT={SATURATION}"
         self.sendCommand(cmd)
@@ -632,9 +879,15 @@ class PROSIM8:
         cmd = f"PERF={PERFUSION}"
         self.sendCommand(cmd)
 
-    def set_SpO2_ppm(self, PERFUSION):
-        cmd = f"PERF={PERFUSION}"
-        self.sendCommand(cmd)
+    def set_SpO2_ppm(self, rate):
+        """
+        Setea la frecuencia de pulso de la curva pletismografica.\n
+        El pulso de SpO2 del ProSim 8 sigue al ritmo del ECG, por lo que se envia como ritmo sinusal;
+        lanza RangeError si hay una arritmia o marcapasos activo, que ese comando reemplazaria.
+        """
+        self.validateSpO2Profile(rate=rate)
+        self.setHeartRate(rate)
+        self.NormalRate()
  
     def set_SpO2_Sensor(self,sensor):
         """
@@ -646,30 +899,84 @@ class PROSIM8:
         Returns:
             str: "OK" si la configuración fue exitosa.
         """
-        sensor_type_dic = {
-            "NELCOR":"NELCR",
-            "NELCR":"NELCR",
-            "MASIMO":"MASIM",
-            "MASIM":"MASIM",
-            "MASIMORAD":"MASIMR",
-            "MASIMOR":"MASIMR",
-            "MASIMR":"MASIMR",
-            "NONIN":"NONIN",
-            "OHMED":"OHMED",
-            "PHIL":"PHIL",
-            "NIHON":"NIHON",
-            "MINDRAY":"MINDR",
-            "MINDR":"MINDR",
-            "BCI":"BCI"
-        }
-
         try:
-            selected_sensor = sensor_type_dic[sensor]
+            selected_sensor = self.SPO2_SENSORS[sensor]
         except:
             selected_sensor="BCI"
         
         self.sendCommand(cmd=f"SPO2TYPE={selected_sensor}")
 
+    def validateSpO2Profile(self, sensor=None, saturation=None, perfusion=None, rate=None, artifact=None):
+        """
+        Valida un perfil de SpO2 sin tocar el puerto y devuelve la lista de comandos,
+        ordenados para que el monitor nunca vea un estado intermedio inconsistente
+        (sensor, perfusion, saturacion, pulso, artefacto).\n
+        Lanza RangeError (un ValueError) si algun parametro esta fuera de rango, o si se pide rate con
+        una forma de onda distinta del ritmo sinusal activa: el pulso se envia como NSRA y la reemplazaria.
+        """
+        cmds = []
+        if sensor is not None:
+            if sensor not in self.SPO2_SENSORS:
+                raise RangeError(f"ERROR-510: Sensor de SpO2 desconocido: {sensor}")
+            cmds.append(f"SPO2TYPE={self.SPO2_SENSORS[sensor]}")
+        if perfusion is not None:
+            if not 0.01 <= float(perfusion) <= 20.0:
+                raise RangeError(f"ERROR-511: Perfusion fuera de rango (0.01 - 20): {perfusion}")
+            cmds.append(f"PERF={float(perfusion)}")
+        if saturation is not None:
+            if not 0 <= int(saturation) <= 100:
+                raise RangeError(f"ERROR-512: Saturacion fuera de rango (0 - 100): {saturation}")
+            cmds.append(f"SAT={int(saturation)}")
+        if rate is not None:
+            if not 10 <= int(rate) <= 360:
+                raise RangeError(f"ERROR-513: Frecuencia de pulso fuera de rango (10 - 360): {rate}")
+            wave = self.state.get("WAVE")
+            if wave is not None and not wave.startswith("NSRA="):
+                raise RangeError(f"ERROR-515: El pulso de SpO2 reemplazaria la onda activa {wave}; "
+                                 f"configurar el ritmo por separado")
+            cmds.append(f"NSRA={int(rate)}")
+        if artifact is not None:
+            if artifact not in self.SPO2_ARTIFACTS:
+                raise RangeError(f"ERROR-514: Artefacto de SpO2 desconocido: {artifact}")
+            cmds.append(f"SPO2ART={self.SPO2_ARTIFACTS[artifact]}")
+        return cmds
+
+    def setSpO2Profile(self, sensor=None, saturation=None, perfusion=None, rate=None, artifact=None):
+        """
+        Aplica sensor, saturacion, perfusion, pulso y artefacto en un solo lote.\n
+        Los parametros en None no se modifican. Devuelve la lista de status recibidos.
+        """
+        cmds = self.validateSpO2Profile(sensor, saturation, perfusion, rate, artifact)
+        statuses = self.sendBatch(cmds)
+        if rate is not None:
+            self.HEARTRATE = int(rate)
+            self.PACER_WAVE = None
+        return statuses
+
+    def runSpO2Table(self, table=None, dwell=30.0, callback=None, sensor=None):
+        """
+        Recorre una tabla de (saturacion, perfusion) enviando solo lo que cambia entre pasos.\n
+        :param table: lista de tuplas; por defecto SPO2_SATURATION_TABLE
+        :param dwell: segundos de permanencia en cada paso
+        :param callback: funcion(paso, saturacion, perfusion) llamada al final de cada paso, p.ej. para leer el monitor
+        :param sensor: tipo de sensor a configurar antes del primer paso
+        """
+        table = self.SPO2_SATURATION_TABLE if table is None else table
+        for sat, perf in table:
+            self.validateSpO2Profile(saturation=sat, perfusion=perf)
+
+        last_sat = last_perf = None
+        for step, (sat, perf) in enumerate(table):
+            self.setSpO2Profile(
+                sensor=sensor if step == 0 else None,
+                saturation=sat if sat != last_sat else None,
+                perfusion=perf if perf != last_perf else None,
+            )
+            last_sat, last_perf = sat, perf
+            sleep(dwell)
+            if callback is not None:
+                callback(step, sat, perf)
+
     #*****************************************************************RESPIRATORIO**********************************************************************
 
     def RespCurveOn(self):
@@ -718,17 +1025,18 @@ class PROSIM8:
         """
         self.sendCommand(cmd=f"RESPBASE={baseline}")
         
+    RESP_LEADS = {
+        "TRANSABD":"LA",
+        "LA":"LA",
+        "ABDOMINAL":"LA",
+        "TORACICA":"LL",
+        "LL":"LL",
+    }
+
     def setRespLead(self,lead):
-        lead_dic = {
-            "TRANSABD":"LA",
-            "LA":"LA",
-            "ABDOMINAL":"LA",
-            "TORACICA":"LL",
-            "LL":"LL",
-        }
         
         try:
-            selected_lead = lead_dic[lead]
+            selected_lead = self.RESP_LEADS[lead]
         except :
             selected_lead = "LA"
         
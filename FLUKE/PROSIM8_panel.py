@@ -0,0 +1,254 @@
+"""
+PROSIM8_panel.py - Backend del panel frontal PROSIM8.ui
+
+Controlador Qt para la ventana definida en PROSIM8.ui. Toda la comunicación
+serie con el ProSim 8 se hace en un hilo de trabajo con una cola de comandos,
+de modo que el timeout de readline (1 s) nunca congela la interfaz.
+
+Las pulsaciones repetidas de flechas sobre un mismo parámetro se coalescen:
+la cola guarda un solo comando pendiente por mnemónico y solo se envía el
+último valor (setpoint final). Los acknowledges vuelven a la UI como señales.
+
+Uso:
+    python -m FLUKE.PROSIM8_panel COM11
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from PyQt5 import uic
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow
+
+from .PROSIM8 import PROSIM8
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+UI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PROSIM8.ui")
+
+#Parametros editables por menu: tecla F -> (etiqueta, mnemonico, minimo, maximo, paso, decimales)
+MENUS = {
+    "ECG": {
+        "F1": ("Frecuencia cardiaca", "NSRA", 10, 360, 1, 0),
+        "F2": ("Amplitud ECG", "ECGAMPL", 0.05, 5.00, 0.05, 2),
+        "F3": ("Desviacion ST", "STDEV", -0.80, 0.80, 0.01, 2),
+        "F4": ("Tamaño artefacto", "EARTSZ", 25, 100, 25, 0),
+    },
+    "SPO2": {
+        "F1": ("Saturacion", "SAT", 0, 100, 1, 0),
+        "F2": ("Perfusion", "PERF", 0.01, 20.00, 0.01, 2),
+    },
+    "SP_FUNC": {
+        "F1": ("Frecuencia respiratoria", "RESPRATE", 10, 150, 1, 0),
+        "F2": ("Amplitud respiratoria", "RESPAMPL", 0.00, 5.00, 0.05, 2),
+    },
+    "NIBP": {},
+    "IBP": {},
+    "SETUP": {},
+}
+
+
+class ProSimWorker(QThread):
+    """
+    Hilo dueño del puerto serie. Consume una cola coalescente de comandos:
+    un pedido nuevo para un mnemónico ya pendiente reemplaza al anterior.
+
+    :param ps8: instancia de PROSIM8 (sin conectar o conectada)
+    :param settle: segundos que un setpoint debe quedar quieto antes de enviarse
+    """
+    acknowledged = pyqtSignal(str, str)  #comando, status
+    failed = pyqtSignal(str, str)        #comando, error
+    connectionChanged = pyqtSignal(bool)
+
+    def __init__(self, ps8, settle=0.15, parent=None):
+        super().__init__(parent)
+        self.ps8 = ps8
+        self.settle = settle
+        self._pending = OrderedDict()  #mnemonico -> (comando, instante del ultimo cambio)
+        self._cond = threading.Condition()
+        self._running = False
+
+    def submit(self, cmd, immediate=False):
+        """
+        Encola un comando. Si ya hay uno pendiente con el mismo mnemónico se
+        reemplaza por este (conserva su lugar en la cola).
+        """
+        key = cmd.split("=", 1)[0]
+        stamp = 0.0 if immediate else time.monotonic()
+        with self._cond:
+            self._pending[key] = (cmd, stamp)
+            self._cond.notify()
+
+    def flush(self):
+        """
+        Marca todos los pendientes como listos para enviar (tecla ENTER).
+        """
+        with self._cond:
+            for key, (cmd, _) in self._pending.items():
+                self._pending[key] = (cmd, 0.0)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.wait()
+
+    def _next_ready(self):
+        """
+        Devuelve el primer comando cuyo setpoint ya se asentó, o None y el
+        tiempo a esperar hasta el próximo. Se llama con el lock tomado.
+        """
+        now = time.monotonic()
+        wait = None
+        for key, (cmd, stamp) in self._pending.items():
+            remaining = stamp + self.settle - now
+            if stamp == 0.0 or remaining <= 0:
+                del self._pending[key]
+                return cmd, None
+            wait = remaining if wait is None else min(wait, remaining)
+        return None, wait
+
+    def run(self):
+        self._running = True
+        try:
+            self.ps8.connect()
+            self.connectionChanged.emit(True)
+        except ConnectionError as e:
+            self.failed.emit("REMOTE", str(e))
+            self.connectionChanged.emit(False)
+            return
+
+        while True:
+            with self._cond:
+                cmd, wait = self._next_ready()
+                while cmd is None and self._running:
+                    self._cond.wait(timeout=wait)
+                    cmd, wait = self._next_ready()
+                if not self._running:
+                    break
+            try:
+                status = self.ps8.sendCommand(cmd)
+                self.acknowledged.emit(cmd, status)
+            except Exception as e:
+                self.failed.emit(cmd, str(e))
+
+        self.ps8.disconnect()
+        self.connectionChanged.emit(False)
+
+
+class PROSIM8Panel(QMainWindow):
+    """
+    Ventana del panel frontal. Las teclas de función (ECG, SPO2, ...) eligen
+    el menú, F1-F5 el parámetro, ARRIBA/ABAJO ajustan el valor y
+    IZQUIERDA/DERECHA cambian el paso (x1, x10). ENTER envía sin esperar.
+    El ajuste se hace en la UI; el worker solo recibe el valor final.
+    """
+
+    def __init__(self, ps8, parent=None):
+        super().__init__(parent)
+        uic.loadUi(UI_PATH, self)
+
+        self.menu = "ECG"
+        self.fkey = "F1"
+        self.multiplier = 1
+        self.values = {
+            "NSRA": ps8.HEARTRATE,
+            "ECGAMPL": 1.00,
+            "STDEV": 0.00,
+            "EARTSZ": int(ps8.LEAD_SIZE),
+            "SAT": 97,
+            "PERF": 2.00,
+            "RESPRATE": 20,
+            "RESPAMPL": 1.00,
+        }
+
+        self.worker = ProSimWorker(ps8)
+        self.worker.acknowledged.connect(self._on_ack)
+        self.worker.failed.connect(self._on_fail)
+        self.worker.connectionChanged.connect(self._on_connection)
+
+        for name in MENUS:
+            getattr(self, name).clicked.connect(lambda _, n=name: self.selectMenu(n))
+        for fkey in ("F1", "F2", "F3", "F4", "F5"):
+            getattr(self, fkey).clicked.connect(lambda _, k=fkey: self.selectParameter(k))
+        self.ARRIBA.clicked.connect(lambda: self.adjust(+1))
+        self.ABAJO.clicked.connect(lambda: self.adjust(-1))
+        self.IZQUIERDA.clicked.connect(lambda: self.setMultiplier(1))
+        self.DERECHA.clicked.connect(lambda: self.setMultiplier(10))
+        self.ENTER.clicked.connect(self.enter)
+
+        self.worker.start()
+        self._show()
+
+    def _parameter(self):
+        return MENUS[self.menu].get(self.fkey)
+
+    def _show(self, extra=""):
+        param = self._parameter()
+        if param is None:
+            text = f"{self.menu}: sin parámetro en {self.fkey}"
+        else:
+            label, key, _, _, _, dec = param
+            text = f"{self.menu} {self.fkey} {label}: {self.values[key]:.{dec}f} (x{self.multiplier})"
+        self.statusbar.showMessage(f"{text} {extra}".strip())
+
+    def selectMenu(self, name):
+        self.menu = name
+        self.fkey = "F1"
+        self._show()
+
+    def selectParameter(self, fkey):
+        self.fkey = fkey
+        self._show()
+
+    def setMultiplier(self, value):
+        self.multiplier = value
+        self._show()
+
+    def adjust(self, direction):
+        """
+        Ajusta el setpoint localmente y encola el comando; las pulsaciones
+        rápidas se coalescen en el worker.
+        """
+        param = self._parameter()
+        if param is None:
+            return
+        _, key, low, high, step, dec = param
+        value = self.values[key] + direction * step * self.multiplier
+        value = round(min(max(value, low), high), dec)
+        self.values[key] = int(value) if dec == 0 else value
+        self.worker.submit(f"{key}={self.values[key]:.{dec}f}")
+        self._show()
+
+    def enter(self):
+        param = self._parameter()
+        if param is not None:
+            _, key, _, _, _, dec = param
+            self.worker.submit(f"{key}={self.values[key]:.{dec}f}", immediate=True)
+        self.worker.flush()
+
+    def _on_ack(self, cmd, status):
+        self._show(f"| {cmd} -> {status}")
+
+    def _on_fail(self, cmd, error):
+        self._show(f"| ERROR {cmd}: {error}")
+
+    def _on_connection(self, connected):
+        self._show("| conectado" if connected else "| desconectado")
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    port = sys.argv[1] if len(sys.argv) > 1 else "COM11"
+    panel = PROSIM8Panel(PROSIM8(port=port))
+    panel.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,92 @@
+"""
+FLUKE - Drivers para instrumentos Fluke y Fluke Biomedical
+
+    from FLUKE import ESA620, PROSIM8
+    esa = ESA620("COM8")
+
+Los drivers y utilidades se cargan recién cuando se los pide por primera
+vez, así importar el paquete no arrastra pyserial, sympy ni numpy. Las
+dependencias pesadas se importan dentro de la función que las necesita
+(sympy solo para lecturas del multímetro que float() no entiende, numpy
+solo en los módulos de análisis).
+
+Los drivers ESA620, PROSIM8 e IMPULSE7000 se llaman igual que su módulo.
+Al importar el submódulo (import FLUKE.ESA620, from .ESA620 import ...)
+Python lo asigna como atributo del paquete; _Package intercepta esa
+asignación y deja la clase, así FLUKE.ESA620 es siempre el driver. El
+módulo sigue en sys.modules["FLUKE.ESA620"].
+"""
+import importlib
+import sys
+import types
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#nombre publico -> (modulo, atributo)
+_LAZY = {
+    "ESA620": ("ESA620", "ESA620"),
+    "PROSIM8": ("PROSIM8", "PROSIM8"),
+    "IMPULSE7000": ("IMPULSE7000", "IMPULSE7000"),
+    "Fluke8845": ("MULTIMETER8845", "Fluke8845"),
+    "Fluke45": ("MULTIMETER8845", "Fluke45"),
+    "SerialTransport": ("transport", "SerialTransport"),
+    "CommandTracer": ("tracing", "CommandTracer"),
+    "Orchestrator": ("orchestrator", "Orchestrator"),
+    "Step": ("orchestrator", "Step"),
+    "discover": ("discovery", "discover"),
+    "replay_transport": ("recording", "replay_transport"),
+    "MeasurementStore": ("measurements", "MeasurementStore"),
+    "IsolatedDriver": ("isolation", "IsolatedDriver"),
+    "HealthMonitor": ("health", "HealthMonitor"),
+    "Metrics": ("metrics", "Metrics"),
+    "InstrumentServer": ("server", "InstrumentServer"),
+    "InstrumentClient": ("server", "InstrumentClient"),
+    "InstrumentError": ("errors", "InstrumentError"),
+    "CommunicationError": ("errors", "CommunicationError"),
+    "InstrumentTimeout": ("errors", "InstrumentTimeout"),
+    "ProtocolError": ("errors", "ProtocolError"),
+    "CommandError": ("errors", "CommandError"),
+    "RangeError": ("errors", "RangeError"),
+    "RetryPolicy": ("errors", "RetryPolicy"),
+}
+
+__all__ = list(_LAZY)
+
+
+def _load(name):
+    """
+    Objeto público name de _LAZY (la clase ESA620, no el módulo). Lanza AttributeError si no existe.
+    """
+    try:
+        module, attr = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    return getattr(importlib.import_module(f".{module}", __name__), attr)
+
+
+def __getattr__(name):
+    value = _load(name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    """
+    Módulo del paquete: un submódulo que se llama igual que su nombre público
+    (ESA620, PROSIM8, IMPULSE7000) se guarda como la clase, no como el módulo.
+    """
+
+    def __setattr__(self, name, value):
+        if isinstance(value, types.ModuleType) and _LAZY.get(name, (None,))[0] == name:
+            value = getattr(value, _LAZY[name][1])
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
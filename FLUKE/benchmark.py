@@ -0,0 +1,347 @@
+"""
+benchmark.py - Latencia de punta a punta de los procedimientos de cada driver
+
+Corre cada procedimiento público de los drivers contra un puerto guionado
+(ScriptedPort) que responde con los simuladores de simulators.py, sin pty
+ni instrumentos. Por procedimiento informa tiempo de reloj, idas y vueltas,
+comandos, tiempo en esperas intencionales (sleep), espera de respuestas y
+bytes transferidos.
+
+Dos modos de tiempo:
+    virtual (por defecto)  las esperas y latencias del instrumento avanzan un reloj
+                           virtual sin dormir; wall_time mide solo el costo del código
+    real (--real)          se duerme de verdad y las respuestas llegan con su retardo
+
+Las líneas base se guardan en JSON y una corrida de comparación falla
+(código de salida 1) si alguna métrica empeora más que la tolerancia:
+
+    python -m FLUKE.benchmark --save baseline.json
+    python -m FLUKE.benchmark --compare baseline.json
+
+--imports mide cuánto tarda "from FLUKE import <driver>" en un proceso
+nuevo y falla si el import arrastra sympy, numpy o PyQt5.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from .transport import SerialTransport
+from .simulators import (ESA620Simulator, PROSIM8Simulator, IMPULSE7000Simulator, Fluke8845Simulator,
+                        Fluke45Simulator)
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Métricas deterministas (no dependen de la carga de la PC)
+STABLE_METRICS = ("round_trips", "commands", "sleep_time", "bytes_written", "bytes_read", "elapsed")
+
+#Módulos pesados que no deben cargarse al importar un driver
+HEAVY_MODULES = ("sympy", "numpy", "PyQt5")
+
+
+class VirtualClock:
+    """
+    Reloj que solo avanza cuando se duerme o se espera una respuesta.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleep_time = 0.0
+        self.io_wait = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.sleep_time += seconds
+
+    def wait_until(self, due):
+        if due > self.now:
+            self.io_wait += due - self.now
+            self.now = due
+
+
+class ScriptedPort:
+    """
+    Objeto tipo puerto para SerialTransport(ser=...) que contesta con un simulador.\n
+    :param simulator: instancia de simulators.Simulator (no hace falta start())
+    :param clock: VirtualClock, o None para tiempo real
+    :param poll: espera máxima por lectura en tiempo real, como el timeout del puerto
+    """
+
+    def __init__(self, simulator, clock=None, poll=0.05):
+        self.simulator = simulator
+        self.clock = clock
+        self.poll = poll
+        self.is_open = True
+        self._incoming = b""
+        self._pending = []  #(vencimiento, bytes) en orden de salida
+        self._last_due = 0.0
+
+    def _now(self):
+        return self.clock.now if self.clock is not None else time.monotonic()
+
+    def write(self, data):
+        self._incoming += data
+        *lines, self._incoming = self._incoming.split(b"\r")
+        for line in lines:
+            cmd = line.strip(b"\n").decode("latin-1").strip()
+            if not cmd:
+                continue
+            for delay, reply in self.simulator.respond(cmd):
+                due = max(self._now() + delay, self._last_due)
+                self._last_due = due
+                self._pending.append((due, reply.encode("latin-1") + self.simulator.EOL))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        now = self._now()
+        return sum(len(payload) for due, payload in self._pending if due <= now)
+
+    def read(self, size=1):
+        if self._pending and self._pending[0][0] > self._now():
+            #nada listo: esperar la próxima respuesta (o hasta poll en tiempo real)
+            if self.clock is not None:
+                self.clock.wait_until(self._pending[0][0])
+            else:
+                time.sleep(min(self._pending[0][0] - self._now(), self.poll))
+        elif not self._pending and self.clock is None:
+            time.sleep(self.poll)
+        data = b""
+        now = self._now()
+        while self._pending and self._pending[0][0] <= now and len(data) < size:
+            due, payload = self._pending[0]
+            take = payload[:size - len(data)]
+            data += take
+            if len(take) == len(payload):
+                self._pending.pop(0)
+            else:
+                self._pending[0] = (due, payload[len(take):])
+        return data
+
+    def reset_input_buffer(self):
+        now = self._now()
+        self._pending = [(due, payload) for due, payload in self._pending if due > now]
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+def _multimeter():
+    from . import MULTIMETER8845
+    return MULTIMETER8845
+
+
+def _prosim8(transport):
+    from .PROSIM8 import PROSIM8
+    driver = PROSIM8("SIM", transport=transport)
+    driver.connect()
+    return driver
+
+
+def _esa620(transport):
+    from .ESA620 import ESA620
+    return ESA620("SIM", transport=transport)
+
+
+def _impulse7000(transport):
+    from .IMPULSE7000 import IMPULSE7000
+    return IMPULSE7000("SIM", transport=transport)
+
+
+#instrumento -> (simulador, eol de los comandos, constructor del driver sobre un transporte)
+DRIVERS = {
+    "ESA620": (ESA620Simulator, "\r", _esa620),
+    "PROSIM8": (PROSIM8Simulator, "\r", _prosim8),
+    "IMPULSE7000": (IMPULSE7000Simulator, "\r", _impulse7000),
+    "Fluke8845": (Fluke8845Simulator, "", lambda t: _multimeter().Fluke8845("SIM", 9600, transport=t)),
+    "Fluke45": (Fluke45Simulator, "", lambda t: _multimeter().Fluke45("SIM", 9600, transport=t)),
+}
+
+Case = namedtuple("Case", ["name", "instrument", "call", "setup"], defaults=(None,))
+
+CASES = [
+    Case("ESA620.protectiveEarthResistance", "ESA620", lambda d: d.protectiveEarthResistance()),
+    Case("ESA620.voltMeasure", "ESA620", lambda d: d.voltMeasure()),
+    Case("ESA620.insulationResistance", "ESA620", lambda d: d.insulationResistance()),
+    Case("ESA620.equipmentCurrent", "ESA620", lambda d: d.equipmentCurrent()),
+    Case("ESA620.leakageEarth", "ESA620", lambda d: d.leakageEarth()),
+    Case("ESA620.enclosureLeakageCurrent", "ESA620", lambda d: d.enclosureLeakageCurrent()),
+    Case("ESA620.patientLeakageCurrent", "ESA620", lambda d: d.patientLeakageCurrent()),
+    Case("ESA620.mainAppliedParts", "ESA620", lambda d: d.mainAppliedParts()),
+    Case("ESA620.patientAuxiliaryCurrent", "ESA620", lambda d: d.patientAuxiliaryCurrent()),
+    Case("PROSIM8.NormalRate", "PROSIM8", lambda d: d.NormalRate()),
+    Case("PROSIM8.setPacerPulse", "PROSIM8", lambda d: d.setPacerPulse("ATR")),
+    Case("PROSIM8.setSpO2Profile", "PROSIM8", lambda d: d.setSpO2Profile(saturation=95, perfusion=2, rate=70)),
+    Case("IMPULSE7000.read_energy", "IMPULSE7000", lambda d: d.read_energy()),
+    Case("IMPULSE7000.read_waveform", "IMPULSE7000", lambda d: d.read_waveform(), lambda d: d.read_energy()),
+    Case("Fluke8845.voltage_measure", "Fluke8845", lambda d: d.voltage_measure()),
+    Case("Fluke8845.current_measure", "Fluke8845", lambda d: d.current_measure()),
+    Case("Fluke8845.resistance_measure", "Fluke8845", lambda d: d.resistance_measure()),
+    Case("Fluke8845.freq_measure", "Fluke8845", lambda d: d.freq_measure()),
+    Case("Fluke8845.temperature_measure", "Fluke8845", lambda d: d.temperature_measure()),
+    Case("Fluke8845.diode_measure", "Fluke8845", lambda d: d.diode_measure()),
+    Case("Fluke45.voltage_measure", "Fluke45", lambda d: d.voltage_measure()),
+    Case("Fluke45.current_measure", "Fluke45", lambda d: d.current_measure()),
+    Case("Fluke45.resistance_measure", "Fluke45", lambda d: d.resistance_measure()),
+    Case("Fluke45.freq_measure", "Fluke45", lambda d: d.freq_measure()),
+]
+
+
+def _virtualize(transport, clock):
+    """
+    Reemplaza transport.sleep para que avance el reloj virtual sin dormir.
+    """
+    def sleep(seconds):
+        clock.sleep(seconds)
+        transport.sleep_time += seconds
+    transport.sleep = sleep
+
+
+def run_case(case, real=False, time_scale=1.0):
+    """
+    Corre un caso una vez sobre un driver nuevo.\n
+    :return: dict de métricas del procedimiento (sin contar la preparación)
+    """
+    simulator_cls, eol, build = DRIVERS[case.instrument]
+    clock = None if real else VirtualClock()
+    simulator = simulator_cls(time_scale=time_scale)
+    transport = SerialTransport(ser=ScriptedPort(simulator, clock), terminator=b"\n", eol=eol, timeout=2.0)
+    if clock is not None:
+        _virtualize(transport, clock)
+    driver = build(transport)
+    if case.setup is not None:
+        case.setup(driver)
+
+    before = transport.stats()
+    virtual_start = clock.now if clock else 0.0
+    io_start = clock.io_wait if clock else 0.0
+    start = time.perf_counter()
+    case.call(driver)
+    wall = time.perf_counter() - start
+    after = transport.stats()
+
+    return {
+        "wall_time": wall,
+        "elapsed": clock.now - virtual_start if clock else wall,
+        "round_trips": after["reads"] - before["reads"],
+        "commands": after["writes"] - before["writes"],
+        "sleep_time": after["sleep_time"] - before["sleep_time"],
+        "io_wait": clock.io_wait - io_start if clock else after["io_time"] - before["io_time"],
+        "bytes_written": after["bytes_written"] - before["bytes_written"],
+        "bytes_read": after["bytes_read"] - before["bytes_read"],
+        "timeouts": after["timeouts"] - before["timeouts"],
+    }
+
+
+def run(cases=None, real=False, repeat=3, time_scale=1.0, match=None):
+    """
+    Corre los casos repeat veces y devuelve dict nombre -> métricas (mediana de cada métrica).
+    """
+    results = {}
+    for case in cases or CASES:
+        if match and match not in case.name:
+            continue
+        runs = [run_case(case, real=real, time_scale=time_scale) for _ in range(repeat)]
+        results[case.name] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    return results
+
+
+def save_baseline(results, path, real=False):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"mode": "real" if real else "virtual", "results": results}, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.10, metrics=STABLE_METRICS):
+    """
+    Compara contra una línea base.\n
+    :return: lista de textos, uno por métrica que empeoró más que tolerance
+    """
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get("results", baseline).get(name)
+        if reference is None:
+            continue
+        for key in metrics:
+            limit = reference[key] * (1 + tolerance) + 1e-6
+            if current[key] > limit:
+                regressions.append(f"{name}: {key} {reference[key]:.4g} -> {current[key]:.4g}")
+    return regressions
+
+
+def report(results):
+    """
+    Tabla de texto con las métricas de cada procedimiento.
+    """
+    header = f"{'procedimiento':<36} {'wall s':>8} {'total s':>8} {'sleep s':>8} {'io s':>8} {'rt':>4} {'cmd':>4} " \
+             f"{'B out':>6} {'B in':>6}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        lines.append(f"{name:<36} {r['wall_time']:8.4f} {r['elapsed']:8.3f} {r['sleep_time']:8.3f} "
+                     f"{r['io_wait']:8.3f} {r['round_trips']:4.0f} {r['commands']:4.0f} "
+                     f"{r['bytes_written']:6.0f} {r['bytes_read']:6.0f}")
+    return "\n".join(lines)
+
+
+def import_times(names=("ESA620", "PROSIM8", "IMPULSE7000", "Fluke8845", "Fluke45"), repeat=5):
+    """
+    Tiempo de "from FLUKE import <nombre>" en un proceso nuevo, como una herramienta de línea de comandos.\n
+    :return: dict nombre -> {"import_time": mediana en segundos, "heavy": módulos pesados cargados}
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for name in ("FLUKE",) + tuple(names):
+        stmt = "import FLUKE" if name == "FLUKE" else f"from FLUKE import {name}"
+        code = (f"import sys, time\nt = time.perf_counter()\n{stmt}\nprint(time.perf_counter() - t)\n"
+                f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+        samples, heavy = [], ""
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True,
+                                 check=True).stdout.splitlines()
+            samples.append(float(out[0]))
+            heavy = out[1] if len(out) > 1 else ""
+        results[name] = {"import_time": statistics.median(samples), "heavy": heavy.split(",") if heavy else []}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los procedimientos de los drivers FLUKE")
+    parser.add_argument("--real", action="store_true", help="tiempo real (duerme y espera las respuestas)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="escala de las latencias simuladas")
+    parser.add_argument("-k", dest="match", help="solo los casos cuyo nombre contenga este texto")
+    parser.add_argument("--save", help="guardar la línea base en este archivo")
+    parser.add_argument("--compare", help="comparar contra esta línea base")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--imports", action="store_true", help="medir el tiempo de import de cada driver")
+    args = parser.parse_args()
+
+    if args.imports:
+        times = import_times(repeat=args.repeat)
+        for name, r in times.items():
+            print(f"{name:<12} {r['import_time'] * 1000:8.1f} ms  {' '.join(r['heavy'])}")
+        sys.exit(1 if any(r["heavy"] for r in times.values()) else 0)
+
+    results = run(real=args.real, repeat=args.repeat, time_scale=args.time_scale, match=args.match)
+    print(report(results))
+    if args.save:
+        save_baseline(results, args.save, real=args.real)
+    if args.compare:
+        metrics = STABLE_METRICS + (("wall_time",) if args.real else ())
+        regressions = compare(results, load_baseline(args.compare), args.tolerance, metrics)
+        for line in regressions:
+            print("REGRESION", line)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,135 @@
+"""
+defib_timing.py - Charge-time and sync-delay timing tests with the Impulse 7000
+
+Timed test modes for IEC 60601-2-4 runs. The analyzer is armed once per
+trial, and the Dready write, its acknowledge and the discharge reply are
+stamped with the monotonic clock. The analyzer reports no charge-complete
+event over the serial link: the acknowledge only means it is waiting for
+the discharge, and the charge time itself is the value it measures in
+CHARGE mode. Repeated trials are collected into NumPy arrays with
+summary statistics. Sync-delay series can drive a ProSim 8 ECG output so
+the defibrillator has a rhythm to synchronize to.
+
+Usage:
+    series = sync_delay_series(analyzer, trials=20, simulator=ps8, heart_rate=60)
+    print(series["summary"])
+"""
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .IMPULSE7000 import Status
+
+
+#Analyzer mode mnemonic for every timed test
+MODES = {
+    "charge": "CHARGE",
+    "sync": "SYNC",
+}
+
+#armed: Dready written; acknowledged: its ACK (NaN if none came); discharge: discharge reply received
+TimingTrial = namedtuple("TimingTrial", ["armed", "acknowledged", "discharge", "measured", "energy", "raw"])
+
+
+def summary(values):
+    """
+    Summary statistics of a 1D array, ignoring NaN (failed trials)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = values[~np.isnan(values)]
+    if len(valid) == 0:
+        return {"n": 0, "failed": len(values)}
+    return {
+        "n": len(valid),
+        "failed": len(values) - len(valid),
+        "mean": float(valid.mean()),
+        "std": float(valid.std(ddof=1)) if len(valid) > 1 else 0.0,
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+    }
+
+
+def arm(analyzer, mode):
+    """
+    Put the analyzer in remote mode and select a timed test mode
+
+    :param mode: key of MODES ("charge" or "sync")
+    """
+    analyzer.protocol.select_mode(MODES[mode])
+
+
+def run_trial(analyzer, timeout=60.0):
+    """
+    Run one trial on an armed analyzer and wait for the discharge
+
+    :param timeout: max seconds to wait for the discharge
+    :return: TimingTrial with monotonic timestamps; measured is NaN on timeout
+    """
+    protocol = analyzer.protocol
+    analyzer.transport.reset_input_buffer()
+    armed = time.monotonic()
+    protocol.write("Dready")
+    acknowledged = float("nan")
+    deadline = armed + timeout
+    while True:
+        reply = protocol.read_reply(deadline)
+        if reply.status is Status.ACK:
+            if math.isnan(acknowledged):  #first ACK: waiting for the discharge, not charge complete
+                acknowledged = time.monotonic()
+        elif reply.status is Status.VALUE:
+            values = reply.values
+            energy = values[1] if len(values) > 1 else float("nan")
+            return TimingTrial(armed, acknowledged, time.monotonic(), values[0], energy, reply.text)
+        else:
+            return TimingTrial(armed, acknowledged, float("nan"), float("nan"), float("nan"), reply.text)
+
+
+def run_series(analyzer, mode, trials=10, timeout=60.0, before_trial=None):
+    """
+    Arm the analyzer once and collect repeated trials
+
+    :param mode: key of MODES
+    :param trials: number of trials
+    :param timeout: max seconds to wait for each discharge
+    :param before_trial: optional callback(n) run before each trial (e.g. start the charge)
+    :return: dict with the TimingTrial list, arrays of measured values, energies and
+             host-side arm-to-discharge times, and summary statistics of the measured values
+    """
+    arm(analyzer, mode)
+    results = []
+    for n in range(trials):
+        if before_trial is not None:
+            before_trial(n)
+        results.append(run_trial(analyzer, timeout=timeout))
+
+    measured = np.array([r.measured for r in results])
+    return {
+        "mode": mode,
+        "trials": results,
+        "measured": measured,
+        "energy": np.array([r.energy for r in results]),
+        "elapsed": np.array([r.discharge - r.armed for r in results]),
+        "summary": summary(measured),
+    }
+
+
+def charge_time_series(analyzer, trials=10, timeout=60.0, before_trial=None):
+    """
+    Charge-time series; measured values are the analyzer charge times in seconds
+    """
+    return run_series(analyzer, "charge", trials=trials, timeout=timeout, before_trial=before_trial)
+
+
+def sync_delay_series(analyzer, trials=20, simulator=None, heart_rate=60, timeout=60.0, before_trial=None):
+    """
+    Cardioversion sync-delay series; measured values are the analyzer delays in ms
+
+    :param simulator: optional PROSIM8 that provides the ECG the defibrillator syncs to
+    :param heart_rate: ECG rate set on the simulator before the series
+    """
+    if simulator is not None:
+        simulator.setHeartRate(heart_rate)
+        simulator.NormalRate()
+    return run_series(analyzer, "sync", trials=trials, timeout=timeout, before_trial=before_trial)
@@ -0,0 +1,124 @@
+"""
+defib_waveform.py - Defibrillator discharge waveforms from the Impulse 7000
+
+Decodes the sample buffer returned by IMPULSE7000.read_waveform() into a
+NumPy array with its time base, stores waveforms in a memory-mapped
+per-session file and provides vectorized checks of the biphasic shape:
+peak current, phase durations, tilt and delivered energy.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+Waveform = namedtuple("Waveform", ["samples", "fs", "timestamp"])
+
+
+def decode_waveform(data, count, fs, scale=1.0, binary=False):
+    """
+    Decode a raw sample buffer
+
+    :param data: bytes (binary int16 little endian) or str (comma/line separated values)
+    :param count: number of samples announced in the header
+    :param fs: sample rate in Hz
+    :param scale: volts per count
+    :return: Waveform with samples in volts
+    """
+    if binary:
+        samples = np.frombuffer(data, dtype="<i2", count=count).astype(np.float64) * scale
+    else:
+        tokens = [t for t in data.replace("\r", ",").replace("\n", ",").split(",") if t.strip()]
+        samples = np.asarray(tokens[:count], dtype=np.float64) * scale
+    return Waveform(samples, float(fs), time.time())
+
+
+def time_base(waveform):
+    """
+    Time in seconds of every sample of a Waveform
+    """
+    return np.arange(len(waveform.samples)) / waveform.fs
+
+
+def _longest_run(mask):
+    """
+    (start, stop) of the longest run of True in a boolean array, or (0, 0)
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return 0, 0
+    i = np.argmax(stops - starts)
+    return int(starts[i]), int(stops[i])
+
+
+def analyze_waveform(waveform, load=50.0, threshold=0.05):
+    """
+    Biphasic waveform checks
+
+    :param waveform: Waveform with voltage across the analyzer load
+    :param load: load resistance in ohms
+    :param threshold: fraction of the peak current that delimits each phase
+    :return: dict with peak_current, peak_voltage, phase1/phase2 duration (s),
+             phase1/phase2 tilt (fraction) and energy (J)
+    """
+    v = waveform.samples
+    i = v / load
+    dt = 1.0 / waveform.fs
+    peak = float(np.max(np.abs(i))) if len(i) else 0.0
+    level = threshold * peak
+
+    result = {
+        "peak_current": peak,
+        "peak_voltage": float(np.max(np.abs(v))) if len(v) else 0.0,
+        "energy": float(np.sum(v * v) * dt / load),
+    }
+    for name, mask in (("phase1", i > level), ("phase2", i < -level)):
+        a, b = _longest_run(mask)
+        duration = (b - a) * dt
+        tilt = float((abs(i[a]) - abs(i[b - 1])) / abs(i[a])) if b > a else 0.0
+        result[f"{name}_duration"] = duration
+        result[f"{name}_tilt"] = tilt
+    return result
+
+
+class WaveformStore:
+    """
+    Append-only memory-mapped store for the waveforms of one session.
+    Samples go to <path> as float32, the index to <path>.idx.json.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f"{path}.idx.json"
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.index = json.load(f)
+        else:
+            self.index = []
+
+    def append(self, waveform):
+        """
+        Append a Waveform and return its position in the store
+        """
+        samples = np.asarray(waveform.samples, dtype=np.float32)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(samples.tobytes())
+        self.index.append({"offset": offset, "count": len(samples), "fs": waveform.fs,
+                           "timestamp": waveform.timestamp})
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        return len(self.index) - 1
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, n):
+        entry = self.index[n]
+        samples = np.memmap(self.path, dtype=np.float32, mode="r",
+                            offset=entry["offset"], shape=(entry["count"],))
+        return Waveform(samples, entry["fs"], entry["timestamp"])
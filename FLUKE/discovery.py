@@ -0,0 +1,209 @@
+"""
+discovery.py - Descubrimiento de puertos e identificación automática de instrumentos
+
+Prueba en paralelo todos los puertos serie candidatos con el comando de
+identificación y la configuración de cada instrumento, y devuelve drivers
+listos para usar. El transporte de la prueba (timeout corto, respuestas
+sin leer) se cierra y cada driver abre el puerto con su propia
+configuración. La relación
+número de serie -> puerto se guarda en disco; en los arranques siguientes
+solo se verifican los puertos cacheados y se barre el resto únicamente si
+falta algún instrumento pedido (o, sin lista, si algún puerto cacheado ya
+no responde).
+
+La prueba solo envía consultas de identificación; los comandos que cambian
+el estado del equipo (REMOTE del ESA620) van después de reconocerlo, así
+un puerto desconocido no recibe nada más que la consulta.
+
+Si un instrumento se identifica pero su driver no se puede crear, se
+devuelve igual con driver None y el error en error; el resto sigue.
+
+Ejemplo:
+    found = discover(["ESA620", "PROSIM8", "Fluke8845"])
+    esa = first(found, "ESA620").driver
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+from serial.tools import list_ports
+
+from .errors import InstrumentError
+from .transport import SerialTransport
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".fluke_ports.json")
+
+#commands: consultas a enviar, sin efectos en el equipo (la respuesta de la ultima es la identificacion)
+#serial_field: posicion del numero de serie en la respuesta separada por comas
+#setup: comandos que se envian solo despues de reconocer el instrumento
+Probe = namedtuple("Probe", ["baudrate", "eol", "commands", "match", "serial_field", "settings", "setup"],
+                   defaults=((),))
+
+PROBES = {
+    "Fluke8845": Probe(9600, "\r\n", ("*IDN?",), r"884[56]", 2, {}),
+    "Fluke45": Probe(9600, "\r\n", ("*IDN?",), r"\b45\b", 2, {}),
+    "ESA620": Probe(115200, "\r", ("IDENT",), r"ESA\s*620", 1, {}, ("REMOTE",)),
+    "PROSIM8": Probe(115200, "\r", ("IDENT",), r"PROSIM\s*8", 1, {}),
+    "IMPULSE7000": Probe(115200, "\r", ("IDENT",), r"IMPULSE|7000", 1, {"rtscts": True, "dsrdtr": True}),
+}
+
+#driver es None y error la excepcion si el instrumento se identifico pero su driver no se pudo crear
+Instrument = namedtuple("Instrument", ["name", "serial_number", "port", "ident", "driver", "error"],
+                        defaults=(None,))
+
+
+def build_driver(name, port, transport=None):
+    """
+    Crea el driver de un instrumento identificado. Si se pasa el transporte de la prueba se
+    cierra antes: el driver abre el puerto con sus propios timeouts (20 s el ESA620, 5 s el 8845).
+    """
+    if transport is not None:
+        transport.close()
+    baudrate = PROBES[name].baudrate
+    if name == "ESA620":
+        from .ESA620 import ESA620
+        return ESA620(port, baudrate=baudrate)
+    if name == "PROSIM8":
+        from .PROSIM8 import PROSIM8
+        driver = PROSIM8(port, baudrate=baudrate)
+        driver.connect()
+        return driver
+    if name == "IMPULSE7000":
+        from .IMPULSE7000 import IMPULSE7000
+        return IMPULSE7000(port)
+    if name == "Fluke8845":
+        from .MULTIMETER8845 import Fluke8845
+        return Fluke8845(port, baudrate)
+    if name == "Fluke45":
+        from .MULTIMETER8845 import Fluke45
+        return Fluke45(port, baudrate)
+    raise ValueError(f"Instrumento desconocido: {name}")
+
+
+def _serial_number(probe, ident):
+    fields = [f.strip() for f in ident.split(",")]
+    if len(fields) > probe.serial_field and fields[probe.serial_field]:
+        return fields[probe.serial_field]
+    return ident
+
+
+def probe_port(port, names=None, timeout=0.3):
+    """
+    Prueba un puerto con la identificación de cada instrumento candidato.\n
+    :param names: instrumentos a probar (por defecto todos los de PROBES)
+    :return: (nombre, numero de serie, identificacion, transporte de la prueba abierto) o None
+    """
+    for name in names or PROBES:
+        probe = PROBES[name]
+        try:
+            transport = SerialTransport(port, baudrate=probe.baudrate, eol=probe.eol, timeout=timeout,
+                                        poll=0.02, **probe.settings)
+        except (serial.SerialException, OSError):
+            return None  #puerto ocupado o inexistente: no tiene sentido seguir probando
+        try:
+            transport.reset_input_buffer()
+            ident = ""
+            for cmd in probe.commands:
+                deadline = time.monotonic() + timeout
+                ident = transport.query(cmd)
+            #una línea vieja (el "=>" que dejó la prueba anterior en un Fluke 45) puede llegar antes
+            #que la identificación: se siguen leyendo líneas hasta el timeout de la consulta
+            while ident and not re.search(probe.match, ident, re.IGNORECASE) and time.monotonic() < deadline:
+                ident = transport.read_until(timeout=deadline - time.monotonic())
+            if ident and re.search(probe.match, ident, re.IGNORECASE):
+                for cmd in probe.setup:
+                    transport.query(cmd)
+                return name, _serial_number(probe, ident), ident, transport
+        except (serial.SerialException, OSError):
+            pass
+        transport.close()
+    return None
+
+
+def load_cache(path=DEFAULT_CACHE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(found, path=DEFAULT_CACHE):
+    cache = load_cache(path)
+    for inst in found:
+        cache[inst.serial_number] = {"instrument": inst.name, "port": inst.port, "ident": inst.ident}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+
+def candidate_ports():
+    return [p.device for p in list_ports.comports()]
+
+
+def discover(instruments=None, ports=None, cache_path=DEFAULT_CACHE, timeout=0.3, max_workers=16):
+    """
+    Descubre instrumentos y devuelve drivers listos para usar.\n
+    :param instruments: nombres esperados (p.ej. ["ESA620", "PROSIM8"]); None busca todos
+    :param ports: puertos candidatos; por defecto todos los del sistema
+    :param cache_path: archivo de cache número de serie -> puerto (None para no usar cache)
+    :return: lista de Instrument (driver None y error cargado si el driver no se pudo crear)
+    """
+    names = list(instruments or PROBES)
+    ports = list(ports if ports is not None else candidate_ports())
+    found = []
+
+    def collect(results):
+        for port, result in results:
+            if result is None:
+                continue
+            name, serial_number, ident, transport = result
+            try:
+                driver, error = build_driver(name, port, transport), None
+            except (serial.SerialException, OSError, InstrumentError) as e:
+                logger.warning("%s identificado en %s pero su driver no se pudo crear: %s", name, port, e)
+                driver, error = None, e
+            found.append(Instrument(name, serial_number, port, ident, driver, error))
+
+    #1) verificar solo los puertos cacheados de los instrumentos pedidos
+    cache = load_cache(cache_path) if cache_path else {}
+    cached = {entry["port"]: entry["instrument"] for entry in cache.values()
+              if entry["instrument"] in names and entry["port"] in ports}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        collect(zip(cached, pool.map(lambda p: probe_port(p, [cached[p]], timeout), cached)))
+
+    #2) barrer el resto de los puertos solo si falta algun instrumento pedido; sin lista, si no hay
+    #cache o algun puerto cacheado ya no responde
+    if instruments is None:
+        sweep = not cached or len(found) < len(cached)
+    else:
+        sweep = any(n not in {inst.name for inst in found} for n in names)
+    if sweep:
+        used = {inst.port for inst in found}
+        rest = [p for p in ports if p not in used]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            collect(zip(rest, pool.map(lambda p: probe_port(p, names, timeout), rest)))
+
+    if cache_path:
+        save_cache(found, cache_path)
+    return found
+
+
+def first(found, name):
+    """
+    Primer Instrument de un tipo dado, o None.
+    """
+    for inst in found:
+        if inst.name == name:
+            return inst
+    return None
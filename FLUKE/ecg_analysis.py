@@ -0,0 +1,227 @@
+"""
+ecg_analysis.py - Verificación offline del ECG registrado del DUT
+
+Analiza la salida analógica de ECG del equipo bajo ensayo, registrada con
+una DAQ, y la compara contra los setpoints del PROSIM8 que estaban activos.
+
+Los registros se abren con memory-mapping (.npy o binario crudo) y se
+procesan por bloques con NumPy vectorizado, por lo que horas de señal a
+1 kHz o más se analizan en segundos sin cargarse enteras en memoria.
+
+Ejemplo:
+    rec = load_recording("dut_ecg.bin", dtype="int16")
+    timeline = [(0.0, prosim_setpoints(ps8))]
+    checks = verify_recording(rec, fs=2000, timeline=timeline, gain=0.001)
+"""
+import numpy as np
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Tolerancias por defecto para la comparacion contra los setpoints
+TOLERANCES = {
+    "heart_rate": 0.01,     #relativa (1 %), con un minimo de 1 LPM
+    "amplitude": 0.05,      #relativa (5 %)
+    "st_deviation": 0.05,   #absoluta en mV
+}
+
+
+def load_recording(path, dtype="int16", channels=1, channel=0, offset=0):
+    """
+    Abre un registro sin cargarlo en memoria.\n
+    :param path: archivo .npy o binario crudo
+    :param dtype: tipo de muestra del archivo crudo
+    :param channels: cantidad de canales intercalados del archivo crudo
+    :param channel: canal a analizar
+    :param offset: bytes de encabezado a saltear en el archivo crudo
+    :return: vista memory-mapped 1D del canal
+    """
+    if str(path).endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+    else:
+        data = np.memmap(path, dtype=dtype, mode="r", offset=offset)
+        if channels > 1:
+            data = data[: len(data) - len(data) % channels].reshape(-1, channels)
+    if data.ndim > 1:
+        data = data[:, channel]
+    return data
+
+
+def _window_mean(csum, start, stop):
+    """
+    Media de x[start:stop] para muchos índices a la vez a partir de la suma acumulada.
+    """
+    return (csum[stop] - csum[start]) / (stop - start)
+
+
+def _r_peaks(x, fs, threshold=0.5, min_width=0.01, refractory=0.2):
+    """
+    Detecta picos R en un bloque ya escalado.
+    Se quita la línea de base con media móvil, se umbraliza y se toma el
+    máximo de cada tramo supraumbral. Los tramos más angostos que min_width
+    (espigas de marcapasos) se descartan.
+    """
+    w = max(int(0.3 * fs), 1)
+    csum = np.concatenate(([0.0], np.cumsum(x)))
+    idx = np.arange(len(x))
+    lo = np.clip(idx - w, 0, len(x) - 1)
+    hi = np.clip(idx + w, 1, len(x))
+    y = x - _window_mean(csum, lo, hi)
+
+    level = threshold * np.percentile(y, 99.5)
+    above = np.concatenate(([False], y > level, [False]))
+    edges = np.diff(above.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= max(int(min_width * fs), 1)
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) == 0:
+        return starts
+
+    #argmax de cada tramo: se ordena por (tramo, -valor) y se toma el primero
+    lengths = ends - starts
+    run = np.repeat(np.arange(len(starts)), lengths)
+    members = np.repeat(starts, lengths) + np.arange(len(run)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    order = np.lexsort((-y[members], run))
+    _, first = np.unique(run[order], return_index=True)
+    peaks = members[order][first]
+
+    gaps = np.diff(peaks)
+    keep = np.concatenate(([True], gaps >= int(refractory * fs)))
+    return peaks[keep]
+
+
+def _pacer_spikes(x, fs, min_slope=1.0, max_width=0.002):
+    """
+    Detecta espigas de marcapasos como pendientes mayores a min_slope (mV/ms)
+    agrupadas en pulsos de ancho menor a max_width segundos.
+    """
+    slope = np.abs(np.diff(x)) * (fs / 1000.0)
+    hits = np.flatnonzero(slope > min_slope)
+    if len(hits) == 0:
+        return hits
+    new = np.concatenate(([True], np.diff(hits) > max(int(max_width * fs), 1)))
+    return hits[new]
+
+
+def analyze(data, fs, gain=1.0, offset=0.0, block=60.0, **options):
+    """
+    Analiza un registro completo por bloques.\n
+    :param data: array (puede ser memory-mapped) con la señal cruda
+    :param fs: frecuencia de muestreo en Hz
+    :param gain: factor para llevar las muestras a mV
+    :param offset: offset en mV sumado luego del gain
+    :param block: duración de cada bloque en segundos
+    :param options: threshold, refractory, min_slope (ver _r_peaks y _pacer_spikes)
+    :return: dict con heart_rate, amplitude, st_deviation, baseline_drift, pacer_spikes, pacer_rate, beats
+    """
+    n = len(data)
+    size = int(block * fs)
+    overlap = int(1.0 * fs)
+    pre, iso = int(0.08 * fs), int(0.04 * fs)      #segmento PR: [R-80ms, R-40ms]
+    st_a, st_b = int(0.08 * fs), int(0.12 * fs)    #segmento ST: [R+80ms, R+120ms]
+
+    r_peaks, amplitudes, st_levels, baselines, spikes = [], [], [], [], []
+    r_opts = {k: options[k] for k in ("threshold", "refractory", "min_width") if k in options}
+    p_opts = {k: options[k] for k in ("min_slope", "max_width") if k in options}
+
+    for start in range(0, n, size):
+        lo = max(start - overlap, 0)
+        hi = min(start + size + overlap, n)
+        x = np.asarray(data[lo:hi], dtype=np.float64) * gain + offset
+
+        peaks = _r_peaks(x, fs, **r_opts)
+        valid = (peaks + lo >= start) & (peaks + lo < start + size) & (peaks >= pre) & (peaks + st_b < len(x))
+        peaks = peaks[valid]
+        csum = np.concatenate(([0.0], np.cumsum(x)))
+        base = _window_mean(csum, peaks - pre, peaks - iso)
+        amplitudes.append(x[peaks] - base)
+        st_levels.append(_window_mean(csum, peaks + st_a, peaks + st_b) - base)
+        baselines.append(base)
+        r_peaks.append(peaks + lo)
+
+        sp = _pacer_spikes(x, fs, **p_opts) + lo
+        spikes.append(sp[(sp >= start) & (sp < start + size)])
+
+    r_peaks = np.concatenate(r_peaks) if r_peaks else np.empty(0, dtype=np.int64)
+    amplitudes = np.concatenate(amplitudes) if amplitudes else np.empty(0)
+    st_levels = np.concatenate(st_levels) if st_levels else np.empty(0)
+    baselines = np.concatenate(baselines) if baselines else np.empty(0)
+    spikes = np.concatenate(spikes) if spikes else np.empty(0, dtype=np.int64)
+
+    rr = np.diff(r_peaks) / fs
+    duration = n / fs
+    return {
+        "beats": len(r_peaks),
+        "heart_rate": float(60.0 / np.median(rr)) if len(rr) else float("nan"),
+        "heart_rate_std": float(np.std(60.0 / rr)) if len(rr) else float("nan"),
+        "amplitude": float(np.median(amplitudes)) if len(amplitudes) else float("nan"),
+        "st_deviation": float(np.median(st_levels)) if len(st_levels) else float("nan"),
+        "baseline_drift": float(np.ptp(baselines)) if len(baselines) else float("nan"),
+        "pacer_spikes": len(spikes),
+        "pacer_rate": 60.0 * len(spikes) / duration if duration else 0.0,
+    }
+
+
+def prosim_setpoints(ps8):
+    """
+    Toma los setpoints de ECG activos de una instancia de PROSIM8.
+    """
+    return {
+        "heart_rate": float(ps8.HEARTRATE),
+        "amplitude": float(ps8.ECG_AMPL),
+        "st_deviation": float(ps8.DEVIATION),
+        "pacer": ps8.PACER_WAVE is not None,
+    }
+
+
+def compare(result, expected, tolerances=None):
+    """
+    Compara el resultado de analyze() contra los setpoints esperados.\n
+    :return: dict parametro -> (medido, esperado, pasa)
+    """
+    tol = dict(TOLERANCES)
+    tol.update(tolerances or {})
+    checks = {}
+    if "heart_rate" in expected:
+        exp = expected["heart_rate"]
+        ok = abs(result["heart_rate"] - exp) <= max(tol["heart_rate"] * exp, 1.0)
+        checks["heart_rate"] = (result["heart_rate"], exp, bool(ok))
+    if "amplitude" in expected:
+        exp = expected["amplitude"]
+        ok = abs(result["amplitude"] - exp) <= tol["amplitude"] * exp
+        checks["amplitude"] = (result["amplitude"], exp, bool(ok))
+    if "st_deviation" in expected:
+        exp = expected["st_deviation"]
+        ok = abs(result["st_deviation"] - exp) <= tol["st_deviation"]
+        checks["st_deviation"] = (result["st_deviation"], exp, bool(ok))
+    if "pacer" in expected:
+        exp = bool(expected["pacer"])
+        checks["pacer"] = (result["pacer_spikes"] > 0, exp, (result["pacer_spikes"] > 0) == exp)
+    return checks
+
+
+def verify_recording(data, fs, timeline, settle=2.0, gain=1.0, offset=0.0, tolerances=None, **options):
+    """
+    Verifica un registro contra la secuencia de setpoints aplicada.\n
+    :param timeline: lista de (segundo de inicio, setpoints) ordenada, p.ej. de prosim_setpoints()
+    :param settle: segundos descartados tras cada cambio de setpoint
+    :return: lista de dicts con inicio, fin, resultado y checks de cada tramo
+    """
+    report = []
+    n = len(data)
+    bounds = [t for t, _ in timeline[1:]] + [n / fs]
+    for (t0, expected), t1 in zip(timeline, bounds):
+        a = min(int((t0 + settle) * fs), n)
+        b = min(int(t1 * fs), n)
+        if b - a < 2 * fs:
+            continue
+        result = analyze(data[a:b], fs, gain=gain, offset=offset, **options)
+        report.append({
+            "start": t0,
+            "stop": t1,
+            "result": result,
+            "checks": compare(result, expected, tolerances),
+        })
+    return report
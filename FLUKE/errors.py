@@ -0,0 +1,160 @@
+"""
+errors.py - Modelo de errores común a todos los drivers FLUKE
+
+Jerarquía:
+    InstrumentError                 base; command, reply e instrument del error
+        CommunicationError          el puerto no abre o se perdió (también ConnectionError)
+        InstrumentTimeout           sin respuesta antes del deadline (también TimeoutError) - transitorio
+        ProtocolError               respuesta que no se puede interpretar - transitorio
+        CommandError                el instrumento respondió un código de error ("!02", "?>", ...)
+            RangeError              parámetro o medición fuera de rango ("!03", "!21"; también ValueError)
+
+Los errores transitorios (transient = True) se reintentan según una
+RetryPolicy con backoff acotado; el resto corta en el primer intento.
+
+Ejemplo:
+    transport.retry = RetryPolicy(attempts=3, commands={"MREAD": 1})
+    value = transport.request("READ", check=check_status)
+"""
+import re
+import time
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Códigos "!xx" de los instrumentos Fluke Biomedical (ESA620, ProSim 8, Impulse 7000)
+STATUS_CODES = {
+    "!01": "Command not valid in the present mode",
+    "!02": "Syntax error",
+    "!03": "Parameter out of range",
+    "!21": "Measurement over range",
+}
+
+RANGE_CODES = ("!03", "!21")
+
+
+class InstrumentError(Exception):
+    """
+    :param message: descripción
+    :param command: comando que falló
+    :param reply: respuesta recibida (str, Reply, ...)
+    :param instrument: instrumento o puerto
+    """
+    transient = False
+
+    def __init__(self, message, command=None, reply=None, instrument=None):
+        super().__init__(message)
+        self.command = command.strip() if isinstance(command, str) else command
+        self.reply = reply
+        self.instrument = instrument
+
+
+class CommunicationError(InstrumentError, ConnectionError):
+    pass
+
+
+class InstrumentTimeout(InstrumentError, TimeoutError):
+    transient = True
+
+
+class ProtocolError(InstrumentError):
+    transient = True
+
+
+class CommandError(InstrumentError):
+    """
+    :param code: código de error del instrumento ("!02", "?>", "-113", ...)
+    """
+
+    def __init__(self, message, code=None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.code = code
+
+
+class RangeError(CommandError, ValueError):
+    pass
+
+
+def status_error(code, command=None, reply=None, instrument=None):
+    """
+    Crea el error tipado de un código "!xx".
+    """
+    detail = STATUS_CODES.get(code, reply if isinstance(reply, str) else code)
+    message = f"{command.strip() if command else ''}: {code} {detail}".strip(": ")
+    cls = RangeError if code in RANGE_CODES else CommandError
+    return cls(message, code=code, command=command, reply=reply, instrument=instrument)
+
+
+def check_status(reply, command=None, instrument=None):
+    """
+    Verificación por defecto de una respuesta de texto: "" es timeout y "!xx" un código de error.\n
+    :return: la respuesta sin cambios
+    """
+    if reply == "":
+        raise InstrumentTimeout(f"{command.strip() if command else ''}: sin respuesta".strip(": "),
+                                command=command, reply=reply, instrument=instrument)
+    if reply.startswith("!"):
+        raise status_error(reply[:3], command, reply, instrument)
+    return reply
+
+
+def parse_float(text, command=None, instrument=None, suffix=""):
+    """
+    Convierte una medición a float ("3.2 uA" con suffix=" uA"), o lanza ProtocolError.
+    """
+    try:
+        return float(text.replace(suffix, "") if suffix else text)
+    except (ValueError, TypeError, AttributeError):
+        raise ProtocolError(f"{command.strip() if command else ''}: respuesta invalida {text!r}".strip(": "),
+                            command=command, reply=text, instrument=instrument) from None
+
+
+class RetryPolicy:
+    """
+    Reintentos con backoff exponencial acotado para errores transitorios.\n
+    :param attempts: intentos totales por defecto (1 = sin reintentos)
+    :param backoff: espera antes del primer reintento, en segundos
+    :param max_backoff: espera máxima entre reintentos
+    :param commands: dict mnemónico -> intentos, para comandos que no deben repetirse o necesitan más
+    """
+
+    def __init__(self, attempts=3, backoff=0.005, max_backoff=0.1, commands=None):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.commands = dict(commands or {})
+
+    def attempts_for(self, command):
+        if not isinstance(command, str):
+            return self.attempts
+        mnemonic = re.split(r"[=\s]", command.strip(), maxsplit=1)[0]
+        return self.commands.get(mnemonic, self.attempts)
+
+    def delay(self, attempt):
+        """
+        Espera antes del reintento número attempt (1, 2, ...).
+        """
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def run(self, fn, command=None, on_retry=None, sleep=time.sleep):
+        """
+        Ejecuta fn() reintentando los InstrumentError transitorios.\n
+        :param on_retry: callback(error, intento) antes de cada reintento (p.ej. vaciar el buffer)
+        :param sleep: función de espera del backoff (SerialTransport.sleep la contabiliza)
+        """
+        attempt = 1
+        limit = self.attempts_for(command)
+        while True:
+            try:
+                return fn()
+            except InstrumentError as e:
+                if not e.transient or attempt >= limit:
+                    raise
+                if on_retry is not None:
+                    on_retry(e, attempt)
+                sleep(self.delay(attempt))
+                attempt += 1
+
+
+NO_RETRY = RetryPolicy(attempts=1)
@@ -0,0 +1,293 @@
+"""
+health.py - Monitor de salud de los instrumentos conectados
+
+HealthMonitor sondea cada instrumento con un comando liviano (IDENT del
+ESA620, *IDN? de los multímetros, una consulta vacía al ProSim 8) solo en
+los tiempos muertos: cuando el hilo del instrumento (InstrumentWorker) no
+está ejecutando nada, su cola está vacía y pasaron interval segundos desde
+el último pedido. El sondeo entra en la cola con prioridad de monitor, así
+nunca se intercala dentro de un paso de un procedimiento. Durante
+Orchestrator.run(..., health=monitor) el monitor queda en pausa (tampoco se
+sondea un instrumento que solo espera a otro) y los sondeos encolados se
+cancelan. Un IMPULSE7000 con una CaptureSession activa no se sondea.
+
+Tras failures sondeos fallidos seguidos el instrumento pasa a "down" y se
+intenta recuperarlo enseguida (PROSIM8.reconnect(), reabrir el puerto y
+volver a REMOTE, reiniciar el proceso de un IsolatedDriver), con prioridad
+urgente para que quede listo antes del próximo paso. Orchestrator.run(...,
+health=monitor) falla de inmediato los pasos de un instrumento caído en
+lugar de esperar el timeout de la medición.
+
+Ejemplo:
+    with Orchestrator({"esa": esa, "ps8": ps8}) as orch:
+        monitor = HealthMonitor(orch, interval=5.0, on_change=print)
+        monitor.start()
+        results = orch.run(steps, health=monitor)
+        print(monitor.status())
+        monitor.stop()
+
+    with monitor.paused():      #procedimiento manual fuera del Orchestrator
+        ...
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .errors import InstrumentError
+from .server import PRIORITY_MONITOR
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN, OK, SUSPECT, DOWN, RECOVERING = "unknown", "ok", "suspect", "down", "recovering"
+
+#Sondeo liviano por driver: no cambia la configuración del instrumento
+PROBES = {
+    "ESA620": ("ident",),
+    "PROSIM8": ("ping",),
+    "Fluke8845": ("identify",),
+    "Fluke45": ("identify",),
+    "IMPULSE7000": ("remote_mode",),
+}
+
+
+def _reopen(driver):
+    """
+    Cierra y vuelve a abrir el puerto (cable USB desconectado y reconectado, equipo reiniciado).
+    """
+    driver.transport.close()
+    driver.transport.open()
+
+
+#Recuperación de un instrumento caído (nombres de métodos o funciones f(driver)), seguida del sondeo
+RECOVERY = {
+    "ESA620": (_reopen, "REMOTE"),
+    "PROSIM8": ("reconnect",),
+    "Fluke8845": (_reopen,),
+    "Fluke45": (_reopen,),
+    "IMPULSE7000": (_reopen, "remote_mode"),
+}
+
+Health = namedtuple("Health", ["state", "checked", "latency", "failures", "error"])
+
+
+def _lookup(driver, table):
+    cls = getattr(driver, "driver_class", type(driver))  #IsolatedDriver expone la clase del driver
+    for klass in cls.__mro__:
+        if klass.__name__ in table:
+            return table[klass.__name__]
+    return ()
+
+
+def _capturing(driver):
+    """
+    True si otro hilo está leyendo el puerto del driver (IMPULSE7000.capturing). Un IsolatedDriver
+    se resuelve por driver_class y capturing se lee del proceso del driver; si ese proceso no
+    contesta se sondea igual, y el sondeo detecta la falla.
+    """
+    cls = getattr(driver, "driver_class", type(driver))
+    if not isinstance(getattr(cls, "capturing", None), property):
+        return False
+    try:
+        return bool(driver.capturing)
+    except InstrumentError:
+        return False
+
+
+def _run_actions(driver, actions):
+    """
+    Corre en el hilo del instrumento. Devuelve la duración en segundos.
+    """
+    start = time.perf_counter()
+    for action in actions:
+        if callable(action):
+            action(driver)
+        else:
+            getattr(driver, action)()
+    return time.perf_counter() - start
+
+
+class HealthMonitor:
+    """
+    :param workers: dict nombre -> InstrumentWorker, o un Orchestrator/InstrumentServer (usa sus workers)
+    :param interval: segundos sin actividad antes de sondear un instrumento
+    :param failures: sondeos fallidos seguidos para darlo por caído
+    :param recover: intentar la recuperación (RECOVERY) al darlo por caído
+    :param on_change: función f(nombre, estado anterior, Health) en cada cambio de estado
+    :param probes: tabla de sondeos por driver (por defecto PROBES)
+    """
+
+    def __init__(self, workers, interval=5.0, failures=2, recover=True, on_change=None, probes=None):
+        self.workers = dict(getattr(workers, "workers", workers))
+        self.interval = interval
+        self.failures = failures
+        self.recover = recover
+        self.on_change = on_change
+        probes = PROBES if probes is None else probes
+        self.probes = {name: _lookup(w.driver, probes) for name, w in self.workers.items()}
+        self.recoveries = {name: 0 for name in self.workers}
+        self.health = {name: Health(UNKNOWN, None, None, 0, None) for name in self.workers}
+        self._pending = set()  #instrumentos con un sondeo o recuperación en curso
+        self._probing = {}     #instrumento -> Future del sondeo encolado
+        self._paused = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def status(self):
+        """
+        dict nombre -> Health
+        """
+        with self._lock:
+            return dict(self.health)
+
+    def available(self, name):
+        """
+        False si el instrumento está caído y no hay una recuperación en curso.
+        """
+        with self._lock:
+            return name not in self.health or self.health[name].state != DOWN
+
+    def pause(self):
+        """
+        Suspende los sondeos automáticos y cancela los que todavía no empezaron. Se anida con resume().
+        """
+        with self._lock:
+            self._paused += 1
+            queued = list(self._probing.values())
+        for future in queued:
+            future.cancel()
+
+    def resume(self):
+        with self._lock:
+            self._paused = max(self._paused - 1, 0)
+
+    @contextmanager
+    def paused(self):
+        self.pause()
+        try:
+            yield self
+        finally:
+            self.resume()
+
+    #*********************************************************SONDEO*********************************************************
+    def _idle(self, worker, now):
+        return not worker.busy.locked() and worker.queue.empty() and now - worker.last_active >= self.interval \
+            and not _capturing(worker.driver)
+
+    def _loop(self):
+        tick = min(self.interval / 4, 0.25)
+        while not self._stop.wait(tick):
+            now = time.monotonic()
+            for name, worker in self.workers.items():
+                if self._paused:
+                    break
+                if self.probes[name] and name not in self._pending and self._idle(worker, now):
+                    self.check(name)
+
+    def check(self, name):
+        """
+        Encola un sondeo del instrumento (con prioridad de monitor) sin esperarlo.
+        """
+        with self._lock:
+            if name in self._pending:
+                return None
+            self._pending.add(name)
+        future = self.workers[name].submit_priority(PRIORITY_MONITOR, _run_actions, (self.probes[name],))
+        with self._lock:
+            self._probing[name] = future
+        future.add_done_callback(lambda f: self._probed(name, f))
+        return future
+
+    def _update(self, name, state, failures, error=None, latency=None):
+        """
+        Guarda el nuevo Health (con self._lock tomado). Devuelve el estado anterior si cambió.
+        """
+        old = self.health[name]
+        self.health[name] = Health(state, time.time(), latency if latency is not None else old.latency,
+                                   failures, error)
+        return old.state if old.state != state else None
+
+    def _notify(self, name, old):
+        if old is None:
+            return
+        health = self.health[name]
+        log = logger.info if health.state == OK else logger.warning
+        log("%s: %s -> %s %s", name, old, health.state, health.error or "")
+        if self.on_change is not None:
+            self.on_change(name, old, health)
+
+    def _probed(self, name, future):
+        """
+        Resultado de un sondeo (corre en el hilo del instrumento, o en pause() si se canceló).
+        """
+        with self._lock:
+            if self._probing.get(name) is future:
+                del self._probing[name]
+            if future.cancelled():
+                self._pending.discard(name)
+                return
+        error = future.exception()
+        recover = False
+        with self._lock:
+            if error is None:
+                old = self._update(name, OK, 0, latency=future.result())
+            else:
+                failures = self.health[name].failures + 1
+                message = f"{type(error).__name__}: {error}"
+                if failures < self.failures:
+                    old = self._update(name, SUSPECT, failures, message)
+                else:
+                    recover = self.recover and bool(self._recovery(name))
+                    old = self._update(name, RECOVERING if recover else DOWN, failures, message)
+            if not recover:
+                self._pending.discard(name)
+        self._notify(name, old)
+        if recover:
+            self._recover(name)
+
+    #*********************************************************RECUPERACION***************************************************
+    def _recovery(self, name):
+        driver = self.workers[name].driver
+        if callable(getattr(type(driver), "restart", None)):
+            return ("restart",) + tuple(self.probes[name])
+        actions = _lookup(driver, RECOVERY)
+        return tuple(actions) + tuple(self.probes[name]) if actions else ()
+
+    def _recover(self, name):
+        self.recoveries[name] += 1
+        future = self.workers[name].submit_priority(0, _run_actions, (self._recovery(name),))
+        future.add_done_callback(lambda f: self._recovered(name, f))
+
+    def _recovered(self, name, future):
+        error = future.exception()
+        with self._lock:
+            if error is None:
+                old = self._update(name, OK, 0)
+            else:
+                old = self._update(name, DOWN, self.health[name].failures, f"{type(error).__name__}: {error}")
+            self._pending.discard(name)
+        self._notify(name, old)
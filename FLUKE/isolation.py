@@ -0,0 +1,308 @@
+"""
+isolation.py - Drivers aislados en un proceso por puerto
+
+IsolatedDriver crea el driver en un proceso propio y se usa igual que el
+driver: cada llamada a un método viaja por un Pipe y el resultado vuelve
+por el mismo camino. El hilo que llama espera en el pipe sin retener el
+GIL, así una lectura bloqueada (20 s del ESA620, la espera de una descarga
+del IMPULSE7000) no demora a los demás instrumentos, y una caída de
+pyserial o del driver termina ese proceso y no la estación.
+
+Los arreglos numpy grandes (las formas de onda del IMPULSE7000, por
+ejemplo) no se serializan por el pipe: el proceso del driver los deja en
+memoria compartida (multiprocessing.shared_memory) y el proxy arma el
+arreglo directamente sobre ese bloque, sin copiarlo.
+
+Si el proceso no responde en call_timeout segundos o termina, la llamada
+lanza InstrumentTimeout o CommunicationError y el proceso se descarta; la
+próxima llamada lo vuelve a crear (restart() lo hace explícitamente). El
+driver nuevo no conserva el estado del anterior; si tiene connect()
+(PROSIM8) se reconecta al reiniciar.
+
+Ejemplo:
+    esa = IsolatedDriver("ESA620", "COM8", call_timeout=60)
+    imp = IsolatedDriver(IMPULSE7000, "COM5")
+    with Orchestrator({"esa": esa, "imp": imp}) as orch:
+        ...
+    wave = imp.read_waveform()       #wave.samples vive en memoria compartida
+    esa.polarity = "R"               #los atributos también se leen y escriben en el proceso
+    esa.close()
+
+    station.json: {"instruments": {"esa": {"driver": "ESA620", "port": "COM8", "isolated": true}}}
+"""
+import multiprocessing
+import pickle
+import signal
+import threading
+import weakref
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+from . import _load, errors
+from .errors import CommunicationError, InstrumentTimeout
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Arreglos de al menos estos bytes vuelven por memoria compartida
+SHM_THRESHOLD = 64 * 1024
+
+#Pedidos al proceso del driver
+CALL, GET, SET, CLOSE = "call", "get", "set", "close"
+OK, ERROR = "ok", "error"
+
+#Referencia a un arreglo dejado en memoria compartida por el proceso del driver
+Shared = namedtuple("Shared", ["name", "shape", "dtype"])
+
+
+def _driver_class(driver):
+    if isinstance(driver, str):
+        return _load(driver)
+    return driver
+
+
+def _portable(error):
+    """
+    La excepción si se puede reconstruir del otro lado del pipe; si no (p.ej. un __init__
+    con argumentos obligatorios propios), la clase más cercana de errors.py con el mismo mensaje.
+    """
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        pass
+    fields = dict(command=getattr(error, "command", None), instrument=getattr(error, "instrument", None))
+    for klass in type(error).__mro__:
+        if getattr(errors, klass.__name__, None) is klass and issubclass(klass, errors.InstrumentError):
+            if issubclass(klass, errors.CommandError):
+                return klass(str(error), code=getattr(error, "code", None), **fields)
+            return klass(str(error), **fields)
+    from .server import RemoteError
+    return RemoteError(str(error), remote_type=type(error).__name__, **fields)
+
+
+#*********************************************************MEMORIA COMPARTIDA*********************************************
+def _export(value, threshold):
+    """
+    Reemplaza los arreglos grandes del resultado por referencias Shared (en el proceso del driver).
+    """
+    if hasattr(value, "__array_interface__") and getattr(value, "nbytes", 0) >= threshold:
+        import numpy as np
+        shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        np.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+        #el bloque pasa a ser del proxy: él lo libera cuando el arreglo deja de usarse
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+        return Shared(shm.name, value.shape, value.dtype.str)
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return type(value)._make(_export(v, threshold) for v in value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_export(v, threshold) for v in value)
+    if isinstance(value, dict):
+        return {k: _export(v, threshold) for k, v in value.items()}
+    return value
+
+
+def _import(value):
+    """
+    Arma los arreglos de las referencias Shared sobre la memoria compartida (en el proxy).
+    """
+    if isinstance(value, Shared):
+        import numpy as np
+        shm = shared_memory.SharedMemory(name=value.name)
+        array = np.ndarray(value.shape, np.dtype(value.dtype), buffer=shm.buf)
+        shm.unlink()  #el bloque sigue mapeado hasta que se libera el arreglo
+        weakref.finalize(array, shm.close)
+        return array
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return type(value)._make(_import(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_import(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _import(v) for k, v in value.items()}
+    return value
+
+
+#*********************************************************PROCESO DEL DRIVER*********************************************
+def _serve(conn, driver, args, kwargs, threshold):
+    """
+    Bucle del proceso del driver: atiende pedidos (operación, nombre, args, kwargs) hasta CLOSE.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  #Ctrl+C lo maneja la estación, que cierra los drivers
+    try:
+        instance = _driver_class(driver)(*args, **kwargs)
+    except BaseException as e:
+        conn.send((ERROR, _portable(e)))
+        return
+    conn.send((OK, None))
+
+    while True:
+        try:
+            op, name, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if op == CALL:
+                result = getattr(instance, name)(*args, **kwargs)
+            elif op == GET:
+                result = getattr(instance, name)
+            elif op == SET:
+                setattr(instance, name, args[0])
+                result = None
+            else:
+                getattr(instance, "close", getattr(instance, "disconnect", lambda: None))()
+                conn.send((OK, None))
+                return
+            conn.send((OK, _export(result, threshold)))
+        except BaseException as e:
+            conn.send((ERROR, _portable(e)))
+
+
+class IsolatedDriver:
+    """
+    Proxy de un driver que corre en su propio proceso.\n
+    :param driver: clase del driver o su nombre en FLUKE ("ESA620", "Fluke8845", ...)
+    :param args: argumentos del constructor del driver
+    :param call_timeout: segundos máximos de cada llamada (None: sin límite); al vencer se
+                         descarta el proceso
+    :param shm_threshold: bytes a partir de los cuales un arreglo vuelve por memoria compartida
+    :param name: nombre para los mensajes de error (por defecto el primer argumento, el puerto)
+    :param kwargs: argumentos con nombre del constructor del driver
+    """
+
+    def __init__(self, driver, *args, call_timeout=None, shm_threshold=SHM_THRESHOLD, name=None, **kwargs):
+        object.__setattr__(self, "_cls", _driver_class(driver))
+        object.__setattr__(self, "_driver", driver)
+        object.__setattr__(self, "_args", args)
+        object.__setattr__(self, "_kwargs", kwargs)
+        object.__setattr__(self, "_process", None)
+        object.__setattr__(self, "_conn", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "call_timeout", call_timeout)
+        object.__setattr__(self, "shm_threshold", shm_threshold)
+        object.__setattr__(self, "name", name or kwargs.get("port", args[0] if args else self._cls.__name__))
+        object.__setattr__(self, "restarts", 0)
+        self._start()
+
+    @property
+    def driver_class(self):
+        return self._cls
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process is not None else None
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def __repr__(self):
+        return f"IsolatedDriver({self._cls.__name__}, {self.name!r}, pid={self.pid})"
+
+    #*********************************************************PROCESO********************************************************
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        conn, child = context.Pipe()
+        process = context.Process(target=_serve, args=(child, self._driver, self._args, self._kwargs,
+                                                       self.shm_threshold),
+                                  name=f"driver-{self.name}", daemon=True)
+        process.start()
+        child.close()
+        object.__setattr__(self, "_process", process)
+        object.__setattr__(self, "_conn", conn)
+        status, value = self._receive("__init__", None)
+        if status == ERROR:
+            self._kill()
+            raise value
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(1.0)
+            self._conn.close()
+        object.__setattr__(self, "_process", None)
+
+    def _receive(self, name, timeout):
+        if not self._conn.poll(timeout):
+            self._kill()
+            raise InstrumentTimeout(f"{name}: el proceso del driver no respondió en {timeout:g} s",
+                                    command=name, instrument=self.name)
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError):
+            code = self._process.exitcode if self._process is not None else None
+            self._kill()
+            raise CommunicationError(f"{name}: el proceso del driver terminó (código {code})",
+                                     command=name, instrument=self.name) from None
+
+    def restart(self):
+        """
+        Descarta el proceso actual y crea un driver nuevo (reconectado si tiene connect()).
+        """
+        with self._lock:
+            self._restart()
+
+    def _restart(self):
+        self._kill()
+        self._start()
+        object.__setattr__(self, "restarts", self.restarts + 1)
+        if callable(getattr(self._cls, "connect", None)):
+            self._conn.send((CALL, "connect", (), {}))
+            status, value = self._receive("connect", self.call_timeout)
+            if status == ERROR:
+                raise value
+
+    def _request(self, op, name, args=(), kwargs=None):
+        with self._lock:
+            if not self.alive:
+                self._restart()
+            try:
+                self._conn.send((op, name, tuple(args), dict(kwargs or {})))
+            except (BrokenPipeError, OSError):
+                self._kill()
+                raise CommunicationError(f"{name}: el proceso del driver terminó", command=name,
+                                         instrument=self.name) from None
+            status, value = self._receive(name, self.call_timeout)
+        if status == ERROR:
+            raise value
+        return _import(value)
+
+    def close(self):
+        """
+        Cierra el driver (close() o disconnect()) y termina su proceso.
+        """
+        with self._lock:
+            if not self.alive:
+                return
+            try:
+                self._conn.send((CLOSE, None, (), {}))
+                self._receive("close", 5.0 if self.call_timeout is None else self.call_timeout)
+                self._process.join(1.0)
+            except errors.InstrumentError:
+                pass
+            self._kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #*********************************************************ACCESO AL DRIVER***********************************************
+    def __getattr__(self, attr):
+        if attr.startswith("__") or attr in ("_cls", "_process", "_conn", "_lock"):
+            raise AttributeError(attr)
+        if not callable(getattr(self._cls, attr, None)):
+            return self._request(GET, attr)
+
+        def method(*args, **kwargs):
+            return self._request(CALL, attr, args, kwargs)
+        method.__name__ = attr
+        return method
+
+    def __setattr__(self, attr, value):
+        if attr.startswith("_") or attr in ("call_timeout", "shm_threshold", "name"):
+            object.__setattr__(self, attr, value)
+        else:
+            self._request(SET, attr, (value,))
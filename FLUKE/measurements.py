@@ -0,0 +1,325 @@
+"""
+measurements.py - Registro de mediciones de la estación
+
+MeasurementStore guarda cada medición (instrumento, procedimiento,
+condición, valor, unidad, instante, serie del equipo bajo ensayo y tipo de
+ensayo) en una base SQLite en modo WAL. record() solo encola la fila: un
+hilo escritor las inserta por lotes en una sola transacción, así registrar
+no agrega latencia a la medición. Las consultas usan índices por serie del
+equipo, tipo de ensayo e instante.
+
+Ejemplo:
+    store = MeasurementStore("estacion.db")
+    esa = store.watch("esa", ESA620("COM8"), dut_serial="MON-1234", test_type="seguridad")
+    esa.patientLeakageCurrent()          #se registra solo, con unidad y condición
+    store.record("ps8", "manual", 80, "lpm", dut_serial="MON-1234")
+    ...
+    store.close()
+    print(store.summary(test_type="seguridad", since=time.time() - 365 * 86400))
+"""
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+Measurement = namedtuple("Measurement", ["timestamp", "dut_serial", "test_type", "instrument", "procedure",
+                                         "condition", "value", "unit", "raw"])
+
+#Procedimientos que devuelven una medición: driver -> método -> (unidad, atributo con el valor o None si lo devuelve)
+MEASUREMENTS = {
+    "ESA620": {
+        "protectiveEarthResistance": ("Ohm", None),
+        "voltMeasure": ("V", None),
+        "insulationResistance": ("MOhm", None),
+        "equipmentCurrent": ("A", None),
+        "leakageEarth": ("uA", None),
+        "enclosureLeakageCurrent": ("uA", None),
+        "patientLeakageCurrent": ("uA", None),
+        "mainAppliedParts": ("uA", None),
+        "patientAuxiliaryCurrent": ("uA", None),
+    },
+    "Fluke8845": {
+        "voltage_measure": ("V", "voltage"),
+        "current_measure": ("A", "current"),
+        "resistance_measure": ("Ohm", "resistance"),
+        "freq_measure": ("Hz", "frequency"),
+        "temperature_measure": ("C", "temperature"),
+        "diode_measure": ("V", "diode"),
+    },
+    "Fluke45": {
+        "voltage_measure": ("V", "voltage"),
+        "current_measure": ("A", "current"),
+        "resistance_measure": ("Ohm", "resistance"),
+        "freq_measure": ("Hz", "frequency"),
+    },
+    "IMPULSE7000": {
+        "read_energy": ("J", None),
+    },
+}
+
+#Condición del ensayo según el estado del driver
+CONDITIONS = {
+    "ESA620": lambda d: f"POL={d.polarity} NEUT={d.neutral} EARTH={d.earth}",
+    "Fluke8845": lambda d: f"{d.AC_DC} RANG{d.range}",
+    "Fluke45": lambda d: getattr(d, "AC_DC", ""),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    timestamp REAL NOT NULL,
+    dut_serial TEXT,
+    test_type TEXT,
+    instrument TEXT,
+    procedure TEXT,
+    condition TEXT,
+    value REAL,
+    unit TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_dut ON measurements (dut_serial, timestamp);
+CREATE INDEX IF NOT EXISTS measurements_test ON measurements (test_type, timestamp);
+CREATE INDEX IF NOT EXISTS measurements_time ON measurements (timestamp);
+"""
+
+
+def _value(value):
+    """
+    (valor numérico o None, texto original) de un resultado de driver.
+    """
+    if value is None:
+        return None, None
+    try:
+        return float(value), str(value)
+    except (TypeError, ValueError):
+        return None, str(value)
+
+
+class MeasurementStore:
+    """
+    :param path: archivo SQLite (se crea si no existe)
+    :param batch_size: filas máximas por transacción
+    :param flush_interval: segundos máximos que una fila espera en memoria
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.failed = 0  #filas de lotes que SQLite rechazó
+        self._queue = queue.SimpleQueue()
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._writer, name="measurement-store", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    #*********************************************************ESCRITURA******************************************************
+    def _writer(self):
+        try:
+            con = self._connect()
+            con.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            rows, markers = [], []
+            while True:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    rows.append(item)
+                if not running or len(rows) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                if rows:
+                    with con:
+                        con.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    self.written += len(rows)
+                    self.batches += 1
+            except sqlite3.Error:
+                #se reintenta fila por fila para no perder el lote entero; el hilo sigue y
+                #flush()/close() relanzan el error
+                self._insert_each(con, rows)
+            finally:
+                for marker in markers:
+                    marker.set()
+        con.close()
+
+    def _insert_each(self, con, rows):
+        for row in rows:
+            try:
+                with con:
+                    con.execute("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                self.written += 1
+            except sqlite3.Error as e:
+                self.failed += 1
+                self._error = e
+
+    def record(self, instrument, procedure, value, unit="", condition="", dut_serial="", test_type="",
+               timestamp=None):
+        """
+        Encola una medición (no bloquea).
+        """
+        number, raw = _value(value)
+        self._queue.put(Measurement(time.time() if timestamp is None else timestamp, dut_serial, test_type,
+                                    instrument, procedure, condition, number, unit, raw))
+
+    def record_many(self, measurements):
+        """
+        Encola varias Measurement de una vez.
+        """
+        for m in measurements:
+            self._queue.put(Measurement(*m))
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def flush(self, timeout=None):
+        """
+        Espera a que todo lo encolado hasta ahora esté escrito. Lanza el error de SQLite
+        si algún lote no se pudo escribir desde el último flush()/close().
+        """
+        marker = threading.Event()
+        self._queue.put(marker)
+        done = marker.wait(timeout)
+        self._raise_error()
+        return done
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def watch(self, name, driver, dut_serial="", test_type=""):
+        """
+        Devuelve el driver envuelto: cada procedimiento de MEASUREMENTS que se llame queda registrado.
+        """
+        return MeasuredDriver(self, name, driver, dut_serial, test_type)
+
+    #*********************************************************CONSULTAS******************************************************
+    @staticmethod
+    def _where(dut_serial=None, test_type=None, instrument=None, procedure=None, since=None, until=None):
+        clauses, params = [], []
+        for column, value in (("dut_serial", dut_serial), ("test_type", test_type),
+                              ("instrument", instrument), ("procedure", procedure)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit=None, **filters):
+        """
+        Mediciones que cumplen los filtros (dut_serial, test_type, instrument, procedure, since, until),
+        en orden cronológico.
+        """
+        where, params = self._where(**filters)
+        sql = f"SELECT * FROM measurements{where} ORDER BY timestamp"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            return [Measurement(*row) for row in con.execute(sql, params)]
+        finally:
+            con.close()
+
+    def summary(self, **filters):
+        """
+        Cantidad, mínimo, máximo y promedio por instrumento, procedimiento y unidad.
+        """
+        where, params = self._where(**filters)
+        sql = (f"SELECT instrument, procedure, unit, COUNT(*), COUNT(value), MIN(value), MAX(value), AVG(value) "
+               f"FROM measurements{where} GROUP BY instrument, procedure, unit ORDER BY instrument, procedure")
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            return [{"instrument": i, "procedure": p, "unit": u, "count": n, "numeric": nv,
+                     "min": lo, "max": hi, "mean": mean}
+                    for i, p, u, n, nv, lo, hi, mean in con.execute(sql, params)]
+        finally:
+            con.close()
+
+
+def _lookup(driver, table, default):
+    """
+    Entrada de table para la clase del driver o la más cercana de su MRO; un IsolatedDriver
+    expone la clase del driver en driver_class.
+    """
+    cls = getattr(driver, "driver_class", type(driver))
+    for klass in cls.__mro__:
+        if klass.__name__ in table:
+            return table[klass.__name__]
+    return default
+
+
+class MeasuredDriver:
+    """
+    Envoltorio de un driver que registra sus mediciones en un MeasurementStore.
+    Los demás métodos y atributos pasan directo al driver.
+    """
+
+    def __init__(self, store, name, driver, dut_serial="", test_type=""):
+        self._store = store
+        self._name = name
+        self._driver = driver
+        self.dut_serial = dut_serial
+        self.test_type = test_type
+        self._measurements = _lookup(driver, MEASUREMENTS, {})
+        self._condition = _lookup(driver, CONDITIONS, lambda d: "")
+
+    def __getattr__(self, attr):
+        target = getattr(self._driver, attr)
+        if attr not in self._measurements:
+            return target
+        unit, source = self._measurements[attr]
+
+        def measured(*args, **kwargs):
+            result = target(*args, **kwargs)
+            value = result if source is None else getattr(self._driver, source)
+            self._store.record(self._name, attr, value, unit, self._condition(self._driver),
+                               self.dut_serial, self.test_type)
+            return result
+        measured.__name__ = attr
+        return measured
@@ -0,0 +1,212 @@
+"""
+metrics.py - Métricas de la estación en formato de texto de Prometheus
+
+Con las métricas activas cada SerialTransport se registra al crearse y
+cada comando escrito deja su latencia (escritura -> línea de respuesta,
+salteando las intermedias de SerialTransport.interim) en un histograma por
+instrumento, puerto y mnemónico. La etiqueta instrument es la clase del
+driver ("ESA620", "Fluke8845") y port el puerto, así las series de un
+mismo modelo se agregan aunque cambie el puerto. Los contadores
+(comandos, bytes, lecturas, timeouts, reintentos, errores, tiempo en
+sleep() y esperando al puerto) son los que el transporte ya lleva y se leen
+recién al exportar, así que no agregan trabajo en el camino de la medición.
+Desactivadas (por defecto), el transporte solo compara un atributo con None.
+
+Ejemplo:
+    metrics = Metrics.enable()
+    esa = ESA620("COM8")
+    ...
+    metrics.write("/var/lib/node_exporter/fluke.prom")   #textfile collector
+    metrics.serve(9108)                                  #http://127.0.0.1:9108/metrics
+    metrics.export_every("fluke.prom", 15)
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .tracing import mnemonic
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Límites superiores de los buckets de latencia, en segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+#Contadores del transporte: clave de stats() -> (métrica, ayuda)
+COUNTERS = {
+    "writes": ("fluke_commands_total", "Comandos escritos"),
+    "reads": ("fluke_replies_total", "Líneas de respuesta leídas"),
+    "read_calls": ("fluke_read_calls_total", "Lecturas al puerto"),
+    "bytes_written": ("fluke_bytes_written_total", "Bytes escritos"),
+    "bytes_read": ("fluke_bytes_read_total", "Bytes leídos"),
+    "timeouts": ("fluke_timeouts_total", "Lecturas que vencieron sin respuesta"),
+    "retries": ("fluke_retries_total", "Reintentos de comandos"),
+    "errors": ("fluke_errors_total", "Comandos que fallaron después de los reintentos"),
+    "io_time": ("fluke_io_wait_seconds_total", "Tiempo esperando al puerto"),
+    "sleep_time": ("fluke_sleep_seconds_total", "Tiempo en esperas intencionales (sleep)"),
+}
+
+
+def command_label(cmd):
+    """
+    Mnemónico acotado para usar como etiqueta: "VOLT:DC:NPLC 10\\r\\n" -> "VOLT:DC:NPLC".
+    """
+    if isinstance(cmd, (bytes, bytearray)):
+        cmd = bytes(cmd).decode("latin-1")
+    label = mnemonic(cmd).split(" ", 1)[0]
+    return label if label.isprintable() and label else "<bin>"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(instrument, port):
+    return f'instrument="{_escape(instrument or "")}",port="{_escape(port or "")}"'
+
+
+def _sort_key(item):
+    return tuple("" if v is None else str(v) for v in item[0])
+
+
+class Metrics:
+    """
+    Registro de transportes e histogramas de latencia por (instrumento, puerto, mnemónico).
+    """
+    command_label = staticmethod(command_label)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.transports = []
+        self.histograms = {}  #(instrumento, puerto, mnemónico) -> [conteos por bucket + Inf, suma]
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def enable(cls, metrics=None):
+        """
+        Activa las métricas para todos los SerialTransport que se creen desde ahora.
+        """
+        from .transport import SerialTransport
+        SerialTransport.METRICS = metrics or cls()
+        return SerialTransport.METRICS
+
+    @staticmethod
+    def disable():
+        from .transport import SerialTransport
+        SerialTransport.METRICS = None
+
+    def register(self, transport, instrument=None):
+        """
+        Agrega un transporte (lo hace el propio SerialTransport al crearse).\n
+        :param instrument: etiqueta del instrumento; por defecto transport.instrument (clase del driver)
+        """
+        if instrument is not None:
+            transport.instrument = instrument
+        with self._lock:
+            if transport not in self.transports:
+                self.transports.append(transport)
+
+    def observe(self, instrument, command, seconds, port=None):
+        key = (instrument, port, command)
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += seconds
+
+    #*********************************************************EXPORTACION****************************************************
+    def render(self):
+        """
+        Todas las métricas en formato de texto de Prometheus.
+        """
+        with self._lock:
+            transports = list(self.transports)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self.histograms.items()}
+
+        totals = {}
+        for transport in transports:
+            stats = transport.stats()
+            label = (transport.instrument, transport.port)
+            for key in COUNTERS:
+                totals[(key, label)] = totals.get((key, label), 0) + stats.get(key, 0)
+
+        lines = []
+        for key, (name, help_text) in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter, label), value in totals.items():
+                if counter == key:
+                    lines.append(f'{name}{{{_labels(*label)}}} {value:g}')
+
+        name = "fluke_command_latency_seconds"
+        lines.append(f"# HELP {name} Latencia de cada comando hasta su línea de respuesta")
+        lines.append(f"# TYPE {name} histogram")
+        for (instrument, port, command), (counts, total) in sorted(histograms.items(), key=_sort_key):
+            labels = f'{_labels(instrument, port)},command="{_escape(command)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Escribe el archivo de forma atómica (para el textfile collector de node_exporter).
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def export_every(self, path, interval=15.0):
+        """
+        Reescribe path cada interval segundos en un hilo de fondo. Devuelve el Event que lo detiene.
+        """
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write(path)
+            self.write(path)
+
+        threading.Thread(target=loop, name="metrics-export", daemon=True).start()
+        return stop
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """
+        Atiende GET /metrics en un hilo de fondo.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server.server_address
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,206 @@
+"""
+multidut.py - Ensayos de seguridad en paralelo con varios ESA620
+
+Cada analizador ESA620 tiene su propio hilo (InstrumentWorker) y ensaya un
+equipo bajo ensayo (DUT). Todos corren el mismo procedimiento a la vez, así
+el tiempo de un banco de N analizadores es el de un solo DUT. Un analizador
+que falla o se cuelga solo afecta a su DUT: cada paso tiene un tiempo
+máximo y, si vence, ese DUT se da por perdido y los demás siguen.
+
+Ejemplo:
+    runner = MultiDUTRunner({"MON-001": ESA620("COM8"), "MON-002": ESA620("COM9")})
+    report = runner.run(leakage_matrix())
+    print(format_report(report))
+
+    python -m FLUKE.multidut --dut MON-001=COM8 --dut MON-002=COM9 --matrix
+"""
+import argparse
+import time
+from collections import namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from .errors import CommunicationError, InstrumentTimeout
+from .measurements import CONDITIONS, MEASUREMENTS
+from .orchestrator import InstrumentWorker
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Paso de un DUT: procedimiento del ESA620 y condición (None deja la configuración del driver)
+BenchStep = namedtuple("BenchStep", ["procedure", "polarity", "neutral", "earth"], defaults=(None, None, None))
+BenchResult = namedtuple("BenchResult", ["dut", "procedure", "condition", "value", "unit", "error", "elapsed"])
+
+#Condición normal y primeras condiciones de falla: (polaridad, neutro, tierra)
+LEAKAGE_CONDITIONS = (
+    ("N", "C", "C"),
+    ("R", "C", "C"),
+    ("N", "O", "C"),
+    ("R", "O", "C"),
+    ("N", "C", "O"),
+    ("R", "C", "O"),
+)
+
+#Errores que indican que el analizador dejó de responder: no se siguen enviando pasos a ese DUT
+FATAL_ERRORS = (CommunicationError, InstrumentTimeout)
+
+
+def leakage_matrix(procedures=("enclosureLeakageCurrent", "patientLeakageCurrent"), conditions=LEAKAGE_CONDITIONS):
+    """
+    Pasos de la matriz de corrientes de fuga: cada procedimiento en cada condición.
+    """
+    return [BenchStep(procedure, *condition) for condition in conditions for procedure in procedures]
+
+
+def _run_step(driver, step):
+    """
+    Corre en el hilo del analizador: configura la condición y mide.
+    """
+    if step.polarity is not None:
+        driver.setPolarity(step.polarity)
+    if step.neutral is not None:
+        driver.setNeutral(step.neutral)
+    if step.earth is not None:
+        driver.setEarth(step.earth)
+    condition = CONDITIONS["ESA620"](driver)
+    start = time.perf_counter()
+    value = getattr(driver, step.procedure)()
+    return condition, value, time.perf_counter() - start
+
+
+class MultiDUTRunner:
+    """
+    :param analyzers: dict serie del DUT -> ESA620 conectado a ese DUT
+    :param step_timeout: segundos máximos de un paso antes de dar por colgado al analizador
+    :param store: MeasurementStore opcional (measurements.py) donde registrar cada medición
+    :param test_type: tipo de ensayo registrado en el store
+    """
+
+    def __init__(self, analyzers, step_timeout=120.0, store=None, test_type="seguridad"):
+        self.analyzers = dict(analyzers)
+        self.step_timeout = step_timeout
+        self.store = store
+        self.test_type = test_type
+        self.workers = {dut: InstrumentWorker(dut, driver) for dut, driver in self.analyzers.items()}
+        self.status = {}
+        self.wall_time = 0.0
+
+    def _record(self, result):
+        if self.store is not None and result.error is None:
+            self.store.record("ESA620", result.procedure, result.value, result.unit, result.condition,
+                              result.dut, self.test_type)
+
+    def run(self, steps, remote=True):
+        """
+        Corre los pasos en todos los DUT a la vez.\n
+        :param steps: lista de BenchStep o de nombres de procedimientos
+        :param remote: poner cada analizador en modo remoto antes del primer paso
+        :return: dict serie del DUT -> lista de BenchResult; el estado de cada DUT
+                 ("ok", "error", "hung") queda en self.status
+        """
+        steps = [BenchStep(s) if isinstance(s, str) else s for s in steps]
+        if remote:
+            steps = [BenchStep("REMOTE")] + steps
+        units = MEASUREMENTS["ESA620"]
+        report = {dut: [] for dut in self.workers}
+        self.status = {dut: "ok" for dut in self.workers}
+        position = dict.fromkeys(self.workers, 0)
+        running = {}  #future -> (dut, paso, vencimiento)
+        t0 = time.perf_counter()
+
+        def submit(dut):
+            if position[dut] < len(steps) and self.status[dut] != "hung":
+                step = steps[position[dut]]
+                position[dut] += 1
+                future = self.workers[dut].submit(_run_step, step)
+                running[future] = (dut, step, time.monotonic() + self.step_timeout)
+
+        for dut in self.workers:
+            submit(dut)
+        while running:
+            now = time.monotonic()
+            timeout = max(min(deadline for _, _, deadline in running.values()) - now, 0.0)
+            finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                dut, step, _ = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    condition, value, elapsed = future.result()
+                    result = BenchResult(dut, step.procedure, condition, value, units.get(step.procedure, ("",))[0],
+                                         None, elapsed)
+                else:
+                    result = BenchResult(dut, step.procedure, "", None, "", f"{type(error).__name__}: {error}", None)
+                    self.status[dut] = "error"
+                    if isinstance(error, FATAL_ERRORS):
+                        position[dut] = len(steps)  #el analizador no responde: no se siguen mandando pasos
+                if step.procedure != "REMOTE" or result.error is not None:
+                    report[dut].append(result)
+                    self._record(result)
+                submit(dut)
+            now = time.monotonic()
+            for future, (dut, step, deadline) in list(running.items()):
+                if not future.done() and now >= deadline:
+                    #el hilo del analizador queda colgado en su puerto; el DUT se abandona
+                    del running[future]
+                    self.status[dut] = "hung"
+                    report[dut].append(BenchResult(dut, step.procedure, "", None, "",
+                                                   f"sin respuesta en {self.step_timeout:g} s", None))
+        self.wall_time = time.perf_counter() - t0
+        return report
+
+    def close(self):
+        """
+        Termina los hilos de los analizadores que no quedaron colgados.
+        """
+        for dut, worker in self.workers.items():
+            if self.status.get(dut) != "hung":
+                worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_report(report, status=None):
+    """
+    Informe de texto por DUT.
+    """
+    lines = []
+    for dut, results in report.items():
+        state = f" [{status[dut]}]" if status else ""
+        lines.append(f"{dut}{state}")
+        for r in results:
+            detail = r.error if r.error else f"{r.value} {r.unit}"
+            lines.append(f"    {r.procedure:<28} {r.condition:<24} {detail}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from .ESA620 import ESA620
+
+    parser = argparse.ArgumentParser(description="Ensayo de seguridad en paralelo con varios ESA620")
+    parser.add_argument("--dut", action="append", required=True, metavar="SERIE=PUERTO",
+                        help="DUT y puerto de su analizador (repetible)")
+    parser.add_argument("--matrix", action="store_true", help="matriz de corrientes de fuga")
+    parser.add_argument("--procedure", action="append", default=[], help="procedimiento del ESA620 (repetible)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="tiempo máximo por paso")
+    parser.add_argument("--store", help="base de mediciones (measurements.py)")
+    options = parser.parse_args()
+
+    store = None
+    if options.store:
+        from .measurements import MeasurementStore
+        store = MeasurementStore(options.store)
+    analyzers = {}
+    for item in options.dut:
+        serial_number, port = item.split("=", 1)
+        analyzers[serial_number] = ESA620(port)
+    steps = (leakage_matrix() if options.matrix else []) + options.procedure
+    with MultiDUTRunner(analyzers, options.timeout, store) as runner:
+        result = runner.run(steps)
+    print(format_report(result, runner.status))
+    print(f"{len(analyzers)} DUT en {runner.wall_time:.1f} s")
+    if store is not None:
+        store.close()
@@ -0,0 +1,397 @@
+"""
+orchestrator.py - Ejecución concurrente de una estación de ensayo multi-instrumento
+
+Cada instrumento (ESA620, PROSIM8, Fluke8845, IMPULSE7000, ...) tiene su
+propio hilo de trabajo con una cola de comandos, por lo que los accesos a
+un mismo puerto quedan serializados. Los pasos del ensayo forman un grafo
+de dependencias; los pasos independientes corren en paralelo y el tiempo
+total tiende al camino crítico en vez de a la suma de todos los pasos.
+
+Con checkpoint=ruta, run() guarda en disco los pasos completos y sus
+resultados después de cada paso. Si la corrida se interrumpe, llamar de
+nuevo a run() con el mismo archivo verifica los instrumentos que faltan
+(verify) y sigue desde el primer paso incompleto.
+
+Ejemplo:
+    steps = [
+        Step("esa_remote", "esa", "REMOTE"),
+        Step("ps8_hr", "ps8", "setHeartRate", args=(80,)),
+        Step("ps8_nsr", "ps8", "NormalRate", after=("ps8_hr",)),
+        Step("leak", "esa", "patientLeakageCurrent", after=("esa_remote", "ps8_nsr")),
+    ]
+    with Orchestrator({"esa": esa, "ps8": ps8}) as orch:
+        results = orch.run(steps)
+        print(orch.gantt())
+"""
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from .errors import CommunicationError
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+TraceEntry = namedtuple("TraceEntry", ["step", "instrument", "start", "end", "status"])
+
+
+class Step:
+    """
+    Paso de un ensayo.\n
+    :param name: nombre único del paso
+    :param instrument: nombre del instrumento que lo ejecuta (clave del dict del Orchestrator)
+    :param action: nombre de un método del driver, o función f(driver, *args, **kwargs)
+    :param args: argumentos posicionales
+    :param kwargs: argumentos con nombre
+    :param after: nombres de los pasos que deben terminar antes
+    """
+
+    def __init__(self, name, instrument, action, args=(), kwargs=None, after=()):
+        self.name = name
+        self.instrument = instrument
+        self.action = action
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.after = tuple(after)
+
+    def __repr__(self):
+        return f"Step({self.name!r}, {self.instrument!r}, {self.action!r})"
+
+
+class InstrumentWorker:
+    """
+    Hilo dueño de un driver. Ejecuta los pedidos de su cola por prioridad
+    (menor número primero; a igual prioridad, en orden de llegada) y
+    devuelve cada resultado en un Future.
+    """
+    PRIORITY = 10  #prioridad por defecto de submit()
+
+    def __init__(self, name, driver):
+        self.name = name
+        self.driver = driver
+        self.queue = queue.PriorityQueue()
+        self.busy = threading.Lock()  #tomado mientras se ejecuta un pedido
+        self.last_active = time.monotonic()  #fin del último pedido (para sondeos en tiempos muertos)
+        self._seq = itertools.count()
+        self._thread = threading.Thread(target=self._run, name=f"worker-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, action, *args, **kwargs):
+        """
+        Encola un pedido: nombre de método del driver o función f(driver, ...).
+        """
+        return self.submit_priority(self.PRIORITY, action, args, kwargs)
+
+    def submit_priority(self, priority, action, args=(), kwargs=None):
+        """
+        Encola un pedido con prioridad explícita (0 = urgente).
+        """
+        future = Future()
+        self.queue.put((priority, next(self._seq), (future, action, tuple(args), dict(kwargs or {}))))
+        return future
+
+    def call(self, action, *args, **kwargs):
+        """
+        submit() y espera el resultado.
+        """
+        return self.submit(action, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            _, _, item = self.queue.get()
+            if item is None:
+                return
+            future, action, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self.busy:
+                try:
+                    if callable(action):
+                        result = action(self.driver, *args, **kwargs)
+                    else:
+                        result = getattr(self.driver, action)(*args, **kwargs)
+                except BaseException as e:
+                    self.last_active = time.monotonic()
+                    future.set_exception(e)
+                else:
+                    self.last_active = time.monotonic()
+                    future.set_result(result)
+
+    def stop(self):
+        """
+        Termina el hilo después de los pedidos ya encolados.
+        """
+        self.queue.put((float("inf"), next(self._seq), None))
+        self._thread.join()
+
+
+class Orchestrator:
+    """
+    :param instruments: dict nombre -> driver
+    """
+
+    def __init__(self, instruments):
+        self.workers = {name: InstrumentWorker(name, driver) for name, driver in instruments.items()}
+        self.steps = []
+        self.trace = []
+        self.results = {}
+        self.errors = {}
+        self.resumed = 0
+        self.wall_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+    @staticmethod
+    def validate(steps):
+        """
+        Verifica nombres únicos, dependencias existentes y ausencia de ciclos.
+        Devuelve los pasos en un orden topológico. Lanza ValueError.
+        """
+        by_name = {}
+        for step in steps:
+            if step.name in by_name:
+                raise ValueError(f"Paso duplicado: {step.name}")
+            by_name[step.name] = step
+        for step in steps:
+            for dep in step.after:
+                if dep not in by_name:
+                    raise ValueError(f"{step.name}: dependencia desconocida {dep}")
+
+        ordered, state = [], {}
+        def visit(step):
+            if state.get(step.name) == 1:
+                raise ValueError(f"Ciclo de dependencias en {step.name}")
+            if state.get(step.name) == 2:
+                return
+            state[step.name] = 1
+            for dep in step.after:
+                visit(by_name[dep])
+            state[step.name] = 2
+            ordered.append(step)
+        for step in steps:
+            visit(step)
+        return ordered
+
+    @staticmethod
+    def load_checkpoint(path, steps):
+        """
+        Resultados de los pasos completos guardados en path ({} si el archivo no existe).
+        Lanza ValueError si el checkpoint es de otro grafo de pasos.
+        """
+        if path is None or not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        names = {step.name for step in steps}
+        unknown = [name for name in data.get("completed", {}) if name not in names]
+        if unknown or set(data.get("steps", ())) != names:
+            raise ValueError(f"{path}: el checkpoint no corresponde a estos pasos ({', '.join(unknown) or 'cambiaron'})")
+        return data["completed"]
+
+    @staticmethod
+    def _save_checkpoint(path, steps, completed):
+        """
+        Escribe el checkpoint de forma atómica. Los resultados que JSON no admite se guardan
+        como lista (arrays de numpy), dict (namedtuples) o texto.
+        """
+        def default(value):
+            if hasattr(value, "tolist"):
+                return value.tolist()
+            if hasattr(value, "_asdict"):
+                return value._asdict()
+            return str(value)
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"steps": [step.name for step in steps], "completed": completed, "saved": time.time()},
+                      f, default=default)
+        os.replace(tmp, path)
+
+    def _execute(self, step, t0):
+        """
+        Función que corre en el hilo del instrumento y registra la traza.
+        """
+        def run(driver):
+            start = time.perf_counter() - t0
+            status = "ok"
+            try:
+                if callable(step.action):
+                    return step.action(driver, *step.args, **step.kwargs)
+                return getattr(driver, step.action)(*step.args, **step.kwargs)
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                self.trace.append(TraceEntry(step.name, step.instrument, start, time.perf_counter() - t0, status))
+        return run
+
+    def run(self, steps, stop_on_error=False, checkpoint=None, verify=None, health=None):
+        """
+        Ejecuta el grafo de pasos.\n
+        :param stop_on_error: si es True no se lanzan pasos nuevos tras el primer error
+        :param checkpoint: archivo JSON de progreso; si ya existe se retoma desde él y se
+                           borra al terminar todos los pasos sin errores
+        :param verify: dict instrumento -> acción (como la de un Step) que se ejecuta antes de
+                       retomar en cada instrumento con pasos pendientes (modo remoto, IDENT, ...)
+        :param health: HealthMonitor (health.py) de estos workers; queda en pausa durante la corrida
+                       y los pasos de un instrumento caído fallan sin enviarse en vez de esperar el
+                       timeout de la medición
+        :return: dict nombre del paso -> resultado (los pasos fallidos quedan en self.errors
+                 y sus dependientes se saltean). Los resultados retomados vuelven tal como
+                 se guardaron en el JSON.
+        """
+        ordered = self.validate(steps)
+        for step in ordered:
+            if step.instrument not in self.workers:
+                raise ValueError(f"{step.name}: instrumento desconocido {step.instrument}")
+
+        completed = self.load_checkpoint(checkpoint, ordered)
+        self.steps = ordered
+        self.trace = []
+        self.results = dict(completed)
+        self.errors = {}
+        self.resumed = len(completed)
+        pending = [step for step in ordered if step.name not in completed]
+        running = {}
+        done = set(completed)
+        t0 = time.perf_counter()
+
+        if health is not None:
+            health.pause()  #sin sondeos entre pasos de la corrida, ni siquiera en un instrumento que espera a otro
+        try:
+            if completed and verify:
+                #el instrumento pudo reiniciarse o salir de remoto mientras la corrida estaba detenida
+                checks = {self.workers[name].submit(verify[name]) for name in {s.instrument for s in pending}
+                          if name in verify}
+                for future in checks:
+                    future.result()
+
+            while pending or running:
+                for step in list(pending):
+                    if any(dep in self.errors for dep in step.after) or (stop_on_error and self.errors):
+                        pending.remove(step)
+                        self.errors[step.name] = "skipped"
+                        self.trace.append(TraceEntry(step.name, step.instrument, 0.0, 0.0, "skipped"))
+                    elif all(dep in done for dep in step.after):
+                        pending.remove(step)
+                        if health is not None and not health.available(step.instrument):
+                            self.errors[step.name] = CommunicationError(f"{step.instrument}: instrumento caído",
+                                                                        instrument=step.instrument)
+                            self.trace.append(TraceEntry(step.name, step.instrument, 0.0, 0.0, "error"))
+                            continue
+                        future = self.workers[step.instrument].submit(self._execute(step, t0))
+                        running[future] = step
+                if not running:
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.results[step.name] = future.result()
+                        done.add(step.name)
+                        if checkpoint is not None:
+                            completed[step.name] = self.results[step.name]
+                            self._save_checkpoint(checkpoint, ordered, completed)
+                    else:
+                        self.errors[step.name] = error
+        finally:
+            if health is not None:
+                health.resume()
+
+        if checkpoint is not None and not self.errors and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.wall_time = time.perf_counter() - t0
+        return self.results
+
+    def critical_path(self):
+        """
+        Cadena de pasos ejecutados más larga de la última corrida según sus duraciones: cada paso
+        espera a sus dependencias (after) y al paso anterior del mismo instrumento. Su suma es el
+        menor tiempo total posible con estos pasos; lo que el wall_time la exceda es espera.\n
+        :return: (lista de nombres de pasos, segundos)
+        """
+        executed = sorted((t for t in self.trace if t.status != "skipped"), key=lambda t: t.start)
+        after = {step.name: step.after for step in self.steps}
+        finish = {}  #paso -> (fin más temprano de la cadena que termina en él, paso anterior)
+        last = {}    #instrumento -> último paso ejecutado
+        for t in executed:
+            preds = [dep for dep in after.get(t.step, ()) if dep in finish]
+            if t.instrument in last:
+                preds.append(last[t.instrument])
+            prev = max(preds, key=lambda name: finish[name][0], default=None)
+            finish[t.step] = ((finish[prev][0] if prev else 0.0) + t.end - t.start, prev)
+            last[t.instrument] = t.step
+        if not finish:
+            return [], 0.0
+        name = max(finish, key=lambda n: finish[n][0])
+        total = finish[name][0]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = finish[name][1]
+        return path[::-1], total
+
+    def summary(self):
+        """
+        Tiempo total, suma de los pasos y camino crítico (critical_path()) de la última corrida.
+        """
+        executed = [t for t in self.trace if t.status != "skipped"]
+        path, critical = self.critical_path()
+        return {
+            "wall_time": self.wall_time,
+            "sum_of_steps": sum(t.end - t.start for t in executed),
+            "critical_path": path,
+            "critical_time": critical,
+            "steps": len(executed),
+            "errors": len([e for e in self.errors.values() if e != "skipped"]),
+            "skipped": len([e for e in self.errors.values() if e == "skipped"]),
+            "resumed": self.resumed,
+        }
+
+    def gantt(self, width=60):
+        """
+        Diagrama de Gantt en texto de la última corrida.
+        """
+        if not self.trace:
+            return ""
+        total = max(t.end for t in self.trace) or 1.0
+        name_w = max(len(t.step) for t in self.trace)
+        lines = []
+        for t in sorted(self.trace, key=lambda t: (t.instrument, t.start)):
+            a = int(t.start / total * width)
+            b = max(int(t.end / total * width), a + 1)
+            mark = "#" if t.status == "ok" else ("!" if t.status == "error" else "-")
+            lines.append(f"{t.step:<{name_w}} {t.instrument:<8} |{' ' * a}{mark * (b - a)}{' ' * (width - b)}| "
+                         f"{t.start:7.3f}-{t.end:7.3f} s")
+        return "\n".join(lines)
+
+    def export_trace(self, path):
+        """
+        Exporta la traza en formato Chrome trace events (chrome://tracing, Perfetto).
+        """
+        events = [{
+            "name": t.step,
+            "cat": t.status,
+            "ph": "X",
+            "ts": t.start * 1e6,
+            "dur": (t.end - t.start) * 1e6,
+            "pid": 1,
+            "tid": t.instrument,
+        } for t in self.trace]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events}, f)
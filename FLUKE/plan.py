@@ -0,0 +1,361 @@
+"""
+plan.py - Planes de ensayo declarativos
+
+Un procedimiento se describe como datos (JSON o YAML) en lugar de una
+cadena de llamadas a los drivers, y el compilador decide cómo ejecutarlo:
+
+    {"instruments": {"esa": {"driver": "ESA620", "port": "COM8"},
+                     "ps8": {"driver": "PROSIM8", "port": "COM11"}},
+     "steps": [
+        {"name": "ritmo", "instrument": "ps8", "config": {"setHeartRate": 80}, "call": "NormalRate"},
+        {"name": "fuga_normal", "instrument": "esa", "after": ["ritmo"],
+         "config": {"setPolarity": "NORMAL", "setNeutral": "CERRADO", "setEarth": "CERRADO"},
+         "call": "patientLeakageCurrent", "limits": {"max": 100, "unit": "uA"}},
+        {"name": "fuga_invertida", "instrument": "esa",
+         "config": {"setPolarity": "INVERTIDA", "setNeutral": "C", "setEarth": "C"},
+         "call": "patientLeakageCurrent", "limits": {"max": 100, "unit": "uA"}}]}
+
+Campos de un paso: name, instrument, config (setter -> valor o lista de
+argumentos), call, args, kwargs, after y limits (min, max, unit).
+
+compile_plan():
+  - resuelve los alias con las mismas tablas que usa el driver (ESA620.TESTS,
+    PROSIM8.ECG_ARTIFACTS, ...): un alias inválido falla antes de abrir un puerto;
+  - descarta la configuración que repite el estado que dejó el paso anterior del
+    mismo instrumento (en el ejemplo, setNeutral y setEarth de fuga_invertida);
+  - encadena los pasos de cada instrumento en el orden del plan; el Orchestrator
+    corre en paralelo los pasos de instrumentos distintos.
+Los límites se evalúan todos juntos al final (evaluate).
+
+Con un checkpoint cada paso completo queda guardado en disco; al repetir la
+corrida con el mismo archivo se verifica cada instrumento (VERIFY) y se
+sigue desde el primer paso incompleto, reenviando la configuración completa
+que ese paso necesita (la que se descartó por repetida se había aplicado en
+un paso que ya no se vuelve a ejecutar).
+
+Uso:
+    python -m FLUKE.plan procedimiento.json            #ejecuta e informa
+    python -m FLUKE.plan procedimiento.yaml --check    #solo compila
+    python -m FLUKE.plan procedimiento.json --checkpoint corrida.json   #retomable
+"""
+import argparse
+import json
+from collections import namedtuple
+from functools import partial
+
+from . import _load
+from .errors import RangeError
+from .orchestrator import Orchestrator, Step
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+#Setter -> (tabla de alias del driver, estricto). Con un alias desconocido un setter
+#estricto lanza error; los demás usan un valor por defecto del driver.
+ALIASES = {
+    "ESA620": {
+        "setTest": ("TESTS", True),
+        "setPolarity": ("POLARITIES", True),
+        "setNeutral": ("SWITCH_STATES", True),
+        "setEarth": ("SWITCH_STATES", True),
+    },
+    "PROSIM8": {
+        "setArtifact": ("ECG_ARTIFACTS", False),
+        "setSide": ("SIDES", True),
+        "setPreVentricularArrhythmia": ("PRE_VENTRICULAR_ARRHYTHMIAS", False),
+        "setSupArrhythmia": ("SUPRA_VENTRICULAR_ARRHYTHMIAS", False),
+        "VentricularArrhythmia": ("VENTRICULAR_ARRHYTHMIAS", False),
+        "ConductionArrythmia": ("CONDUCTION_ARRHYTHMIAS", False),
+        "setPacerPulse": ("PACER_WAVES", True),
+        "setGranularity": ("FIB_GRANULARITIES", True),
+        "setFibrilation": ("FIBRILLATIONS", False),
+        "setRespLead": ("RESP_LEADS", False),
+        "set_SpO2_Sensor": ("SPO2_SENSORS", False),
+    },
+}
+
+#Setters que solo guardan un atributo del driver (no escriben al puerto): repetir
+#el mismo valor no cambia nada y se pueden descartar entre pasos
+STATE_SETTERS = {
+    "ESA620": ("setTest", "setPolarity", "setNeutral", "setEarth", "setLeads"),
+    "PROSIM8": ("setHeartRate", "setMode", "setSide", "setGranularity", "setPacerChamber",
+                "setPacerPolarity", "setPacerAmplitude", "setPacerWidth"),
+}
+
+#Métodos que verifican que el instrumento responde y está en remoto antes de retomar una corrida
+VERIFY = {
+    "ESA620": ("ident",),
+    "PROSIM8": ("connect", "remote"),
+    "Fluke8845": ("identify",),
+    "Fluke45": ("identify",),
+    "IMPULSE7000": ("remote_mode",),
+}
+
+Verdict = namedtuple("Verdict", ["step", "value", "low", "high", "unit", "passed", "error"])
+PlanRun = namedtuple("PlanRun", ["results", "errors", "verdicts", "summary"])
+
+
+class CompiledPlan:
+    """
+    Resultado de compile_plan().\n
+    :param steps: pasos del Orchestrator
+    :param limits: dict nombre del paso -> límites
+    :param coalesced: lista de (paso, setter) descartados por redundantes
+    :param conditions: dict nombre del paso -> configuración vigente al ejecutarlo (texto)
+    :param setup: dict nombre del paso -> configuración completa [(setter, args)] vigente al ejecutarlo
+    """
+
+    def __init__(self, steps, limits, coalesced, instruments, conditions=None, setup=None):
+        self.steps = steps
+        self.limits = limits
+        self.coalesced = coalesced
+        self.instruments = instruments
+        self.conditions = conditions or {}
+        self.setup = setup or {}
+
+    def resume_steps(self, completed):
+        """
+        Pasos para retomar una corrida: el primer paso pendiente de cada instrumento
+        vuelve a aplicar toda su configuración.\n
+        :param completed: nombres de los pasos ya completos
+        """
+        steps, first = [], set()
+        for step in self.steps:
+            if step.name not in completed and step.instrument not in first and step.name in self.setup:
+                first.add(step.instrument)
+                action = partial(_apply, config=self.setup[step.name], call=step.action.keywords["call"])
+                step = Step(step.name, step.instrument, action, step.args, step.kwargs, step.after)
+            steps.append(step)
+        return steps
+
+    def describe(self):
+        lines = []
+        for step in self.steps:
+            config = ", ".join(f"{setter}={args[0] if len(args) == 1 else list(args)}"
+                               for setter, args in step.action.keywords["config"])
+            call = step.action.keywords["call"] or "-"
+            after = f" after {','.join(step.after)}" if step.after else ""
+            lines.append(f"{step.name:<20} {step.instrument:<8} [{config}] {call}{after}")
+        if self.coalesced:
+            lines.append(f"Configuración descartada: {', '.join(f'{s}.{m}' for s, m in self.coalesced)}")
+        return "\n".join(lines)
+
+
+def load_plan(path):
+    """
+    Lee un plan JSON o YAML (.yaml/.yml, requiere PyYAML).
+    """
+    with open(path, encoding="utf-8") as f:
+        if str(path).endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _driver_class(driver):
+    if isinstance(driver, str):
+        return _load(driver)
+    return driver if isinstance(driver, type) else type(driver)
+
+
+def _rules(cls, table):
+    for klass in cls.__mro__:
+        if klass.__name__ in table:
+            return table[klass.__name__]
+    return {} if table is ALIASES else ()
+
+
+def resolve(cls, setter, args):
+    """
+    Valor que el driver va a usar para un setter, resolviendo alias sin instrumento.
+    Lanza RangeError si el alias no existe y el setter es estricto.
+    """
+    alias = _rules(cls, ALIASES).get(setter)
+    if alias is None or len(args) != 1:
+        return tuple(args)
+    table_name, strict = alias
+    table = getattr(cls, table_name)
+    if args[0] in table:
+        return (table[args[0]],)
+    if strict:
+        raise RangeError(f"{cls.__name__}.{setter}: alias desconocido {args[0]!r}", command=setter)
+    return tuple(args)
+
+
+def _apply(driver, *args, config=(), call=None, **kwargs):
+    """
+    Acción de un paso compilado: configura y llama al método del driver en el hilo del instrumento.
+    """
+    for setter, setter_args in config:
+        getattr(driver, setter)(*setter_args)
+    if call is None:
+        return None
+    return getattr(driver, call)(*args, **kwargs)
+
+
+def _verify(driver, methods=()):
+    for method in methods:
+        getattr(driver, method)()
+
+
+def verify_actions(instruments):
+    """
+    dict nombre -> acción de verificación (VERIFY) para Orchestrator.run(verify=...).
+    """
+    actions = {}
+    for name, driver in instruments.items():
+        methods = _rules(getattr(driver, "driver_class", type(driver)), VERIFY)
+        if methods:
+            actions[name] = partial(_verify, methods=methods)
+    return actions
+
+
+def compile_plan(plan, drivers=None):
+    """
+    Compila un plan (dict) a pasos del Orchestrator.\n
+    :param drivers: dict nombre -> clase o instancia del driver; por defecto se toma
+                    "driver" de plan["instruments"]
+    :return: CompiledPlan. Lanza ValueError/RangeError ante un plan inválido.
+    """
+    instruments = plan.get("instruments", {})
+    drivers = drivers or {name: spec["driver"] for name, spec in instruments.items()}
+    classes = {name: _driver_class(driver) for name, driver in drivers.items()}
+
+    steps, limits, coalesced, conditions, setup = [], {}, [], {}, {}
+    state = {name: {} for name in classes}  #instrumento -> setter -> valor resuelto
+    applied = {name: {} for name in classes}  #instrumento -> setter -> argumentos del plan
+    last = {}                               #instrumento -> último paso
+    for spec in plan["steps"]:
+        name, instrument = spec["name"], spec["instrument"]
+        if instrument not in classes:
+            raise ValueError(f"{name}: instrumento desconocido {instrument}")
+        cls = classes[instrument]
+        pure = _rules(cls, STATE_SETTERS)
+
+        config = []
+        for setter, value in spec.get("config", {}).items():
+            if not callable(getattr(cls, setter, None)):
+                raise ValueError(f"{name}: {cls.__name__} no tiene {setter}()")
+            args = tuple(value) if isinstance(value, (list, tuple)) else (value,)
+            resolved = resolve(cls, setter, args)
+            if setter in pure and state[instrument].get(setter) == resolved:
+                coalesced.append((name, setter))
+                continue
+            state[instrument][setter] = resolved
+            applied[instrument][setter] = args
+            config.append((setter, args))
+        conditions[name] = " ".join(f"{setter}={','.join(map(str, value))}"
+                                    for setter, value in state[instrument].items())
+        setup[name] = list(applied[instrument].items())
+
+        call = spec.get("call")
+        if call is not None:
+            if not callable(getattr(cls, call, None)):
+                raise ValueError(f"{name}: {cls.__name__} no tiene {call}()")
+            if call.startswith("set"):
+                state[instrument].clear()  #un setter llamado directamente puede cambiar cualquier estado
+                applied[instrument].clear()
+
+        after = list(spec.get("after", ()))
+        if instrument in last and last[instrument] not in after:
+            after.append(last[instrument])
+        last[instrument] = name
+
+        action = partial(_apply, config=config, call=call)
+        steps.append(Step(name, instrument, action, spec.get("args", ()), spec.get("kwargs"), after))
+        if "limits" in spec:
+            limits[name] = spec["limits"]
+
+    Orchestrator.validate(steps)
+    return CompiledPlan(steps, limits, coalesced, instruments, conditions, setup)
+
+
+def evaluate(limits, results, errors=None):
+    """
+    Evalúa todos los límites de una corrida de una vez.\n
+    :return: lista de Verdict en el orden de limits
+    """
+    errors = errors or {}
+    verdicts = []
+    for name, limit in limits.items():
+        low, high, unit = limit.get("min"), limit.get("max"), limit.get("unit", "")
+        if name in errors:
+            verdicts.append(Verdict(name, None, low, high, unit, False, str(errors[name])))
+            continue
+        try:
+            value = float(results.get(name))
+        except (TypeError, ValueError):
+            verdicts.append(Verdict(name, results.get(name), low, high, unit, False, "valor no numérico"))
+            continue
+        passed = (low is None or value >= low) and (high is None or value <= high)
+        verdicts.append(Verdict(name, value, low, high, unit, passed, None))
+    return verdicts
+
+
+def run_plan(compiled, instruments, stop_on_error=False, store=None, dut_serial="", test_type="",
+             checkpoint=None):
+    """
+    Ejecuta un plan compilado sobre drivers ya conectados.\n
+    :param instruments: dict nombre -> driver
+    :param store: MeasurementStore opcional (measurements.py) donde registrar los pasos con límites
+                  que se ejecutaron sin error
+    :param checkpoint: archivo de progreso; si existe se retoma la corrida (ver Orchestrator.run)
+    :return: PlanRun(results, errors, verdicts, summary)
+    """
+    completed = Orchestrator.load_checkpoint(checkpoint, compiled.steps)
+    steps = compiled.resume_steps(completed) if completed else compiled.steps
+    with Orchestrator(instruments) as orch:
+        results = orch.run(steps, stop_on_error=stop_on_error, checkpoint=checkpoint,
+                           verify=verify_actions(instruments))
+        summary = dict(orch.summary(), coalesced=len(compiled.coalesced))
+    verdicts = evaluate(compiled.limits, results, orch.errors)
+    if store is not None:
+        steps = {step.name: step for step in compiled.steps}
+        for v in verdicts:
+            if v.step in completed or v.step in orch.errors:
+                continue  #ya registrado en la corrida interrumpida, o falló/se salteó: no hay medición
+            step = steps[v.step]
+            store.record(step.instrument, step.action.keywords["call"] or v.step, results.get(v.step), v.unit,
+                         compiled.conditions.get(v.step, ""), dut_serial, test_type)
+    return PlanRun(results, orch.errors, verdicts, summary)
+
+
+def report(run):
+    lines = []
+    for v in run.verdicts:
+        status = "PASA" if v.passed else "FALLA"
+        low = "-inf" if v.low is None else v.low
+        high = "+inf" if v.high is None else v.high
+        detail = v.error if v.error else f"{v.value:g} {v.unit}"
+        lines.append(f"{v.step:<20} {status:<6} {detail:<20} [{low}, {high}]")
+    s = run.summary
+    lines.append(f"{s['steps']} pasos en {s['wall_time']:.2f} s (suma {s['sum_of_steps']:.2f} s, camino crítico {s['critical_time']:.2f} s), "
+                 f"{s['errors']} errores, {s['coalesced']} configuraciones descartadas")
+    if s.get("resumed"):
+        lines.append(f"Retomada: {s['resumed']} pasos ya completos en el checkpoint")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from .server import build_instruments
+
+    parser = argparse.ArgumentParser(description="Ejecuta un plan de ensayo declarativo")
+    parser.add_argument("plan", help="archivo .json, .yaml o .yml")
+    parser.add_argument("--check", action="store_true", help="solo compila y muestra los pasos")
+    parser.add_argument("--stop-on-error", action="store_true")
+    parser.add_argument("--checkpoint", help="archivo de progreso para retomar una corrida interrumpida")
+    options = parser.parse_args()
+
+    plan = load_plan(options.plan)
+    compiled = compile_plan(plan)
+    if options.check:
+        print(compiled.describe())
+    else:
+        instruments = build_instruments(compiled.instruments)
+        try:
+            print(report(run_plan(compiled, instruments, options.stop_on_error,
+                                  checkpoint=options.checkpoint)))
+        finally:
+            for driver in instruments.values():
+                driver.close()
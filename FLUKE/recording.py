@@ -0,0 +1,294 @@
+"""
+recording.py - Grabación y reproducción de sesiones serie
+
+Una sesión grabada guarda cada byte escrito y leído en el puerto, con su
+instante, en un log binario compacto. Se graba debajo del SerialTransport,
+así sirve para todos los drivers sin tocarlos:
+
+    SerialTransport(port="COM8", ..., record="esa620.flrec")
+    SerialTransport.RECORD_DIR = "sesiones/"    #graba todos los puertos que se abran
+
+La reproducción alimenta esos bytes al mismo driver, sin instrumento:
+
+    transport = replay_transport("esa620.flrec")             #lo más rápido posible
+    transport = replay_transport("esa620.flrec", speed=1.0)  #con los tiempos originales
+    esa = ESA620("COM8", transport=transport)
+    esa.patientLeakageCurrent()
+
+Cada respuesta grabada se entrega recién después de que el driver escribe
+lo mismo que se había escrito antes de ella. Si el driver escribe otra cosa
+se lanza ReplayError (strict=True).
+
+Formato del log:
+    MAGIC, uint32 largo + JSON de metadatos (puerto, velocidad, terminador, ...)
+    registros: tipo (1 byte: W escritura, R lectura, O apertura, C cierre),
+               uint64 ns desde el inicio, uint32 largo, datos
+
+    python -m FLUKE.recording sesion.flrec    #lista los registros
+"""
+import json
+import os
+import re
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from .errors import InstrumentError
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+MAGIC = b"FLKREC\x01\n"
+RECORD = struct.Struct("<cQI")
+WRITE, READ, OPEN, CLOSE = b"W", b"R", b"O", b"C"
+
+Record = namedtuple("Record", ["kind", "time", "data"])
+
+
+class ReplayError(InstrumentError):
+    """
+    El driver se apartó de la sesión grabada.
+    """
+
+
+class SessionLog:
+    """
+    Escritor del log de una sesión. El archivo se vacía en cada escritura al
+    puerto, así una caída del proceso no pierde más que la última respuesta.
+    Un registro después de close() (el puerto se reabrió) reabre el archivo
+    para agregar.\n
+    :param path: archivo de salida
+    :param metadata: dict guardado en la cabecera
+    """
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self._file = open(path, "wb")
+        header = json.dumps(dict(metadata or {}, started=time.time())).encode("utf-8")
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self._start = time.perf_counter_ns()
+
+    def record(self, kind, data=b""):
+        if self._file.closed:
+            self._file = open(self.path, "ab")
+        self._file.write(RECORD.pack(kind, time.perf_counter_ns() - self._start, len(data)))
+        self._file.write(data)
+        if kind != READ:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class RecordingPort:
+    """
+    Objeto tipo puerto que delega en otro y graba todo lo que pasa por él.
+    """
+
+    def __init__(self, ser, log):
+        self.ser = ser
+        self.log = log
+        log.record(OPEN)
+
+    @property
+    def is_open(self):
+        return self.ser.is_open
+
+    @property
+    def in_waiting(self):
+        return getattr(self.ser, "in_waiting", 0)
+
+    def write(self, data):
+        self.log.record(WRITE, bytes(data))
+        return self.ser.write(data)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data:
+            self.log.record(READ, bytes(data))
+        return data
+
+    def reset_input_buffer(self):
+        reset = getattr(self.ser, "reset_input_buffer", None)
+        if reset is not None:
+            reset()
+
+    def open(self):
+        self.ser.open()
+        self.log.record(OPEN)
+
+    def close(self):
+        self.log.record(CLOSE)
+        self.ser.close()
+
+
+def session_path(directory, port):
+    """
+    Nombre de archivo para una sesión nueva de un puerto en directory.
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(port)).strip("_") or "port"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"{name}-{stamp}-{os.getpid()}.flrec")
+
+
+def read_log(path):
+    """
+    Lee un log grabado.\n
+    :return: (metadatos, lista de Record con time en segundos)
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    if not content.startswith(MAGIC):
+        raise ValueError(f"{path} no es un log de sesión")
+    offset = len(MAGIC)
+    (length,) = struct.unpack_from("<I", content, offset)
+    offset += 4
+    metadata = json.loads(content[offset:offset + length])
+    offset += length
+    records = []
+    while offset + RECORD.size <= len(content):
+        kind, ns, length = RECORD.unpack_from(content, offset)
+        offset += RECORD.size
+        records.append(Record(kind, ns / 1e9, content[offset:offset + length]))
+        offset += length
+    return metadata, records
+
+
+class ReplayPort:
+    """
+    Objeto tipo puerto que reproduce un log para SerialTransport(ser=...).\n
+    :param records: lista de Record (read_log) o ruta del log
+    :param speed: None lo más rápido posible; 1.0 tiempos originales; 2.0 el doble de rápido
+    :param strict: si es True una escritura distinta de la grabada lanza ReplayError
+    :param poll: espera máxima de una lectura sin datos, como el timeout del puerto
+    """
+
+    def __init__(self, records, speed=None, strict=True, poll=0.01):
+        if isinstance(records, (str, os.PathLike)):
+            records = read_log(records)[1]
+        self.speed = speed
+        self.strict = strict
+        self.poll = poll
+        self.is_open = True
+        self.written = b""  #escrito por el driver y todavía no comparado
+
+        #cada lectura queda habilitada por la última escritura anterior a ella
+        self._writes = []   #[(tiempo grabado, bytes)]
+        self._reads = []    #[(índice de la escritura que la habilita o -1, tiempo grabado, bytes)]
+        for r in records:
+            if r.kind == WRITE:
+                self._writes.append((r.time, r.data))
+            elif r.kind == READ:
+                self._reads.append((len(self._writes) - 1, r.time, r.data))
+        self._done_at = []  #instante real en que el driver completó cada escritura grabada
+        self._pending = b""
+        self._next_read = 0
+        self._t0 = time.monotonic()
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        self.written += bytes(data)
+        while len(self._done_at) < len(self._writes):
+            expected = self._writes[len(self._done_at)][1]
+            if len(self.written) < len(expected):
+                if self.strict and not expected.startswith(self.written):
+                    raise ReplayError(f"Se escribió {self.written!r}, la sesión tenía {expected!r}",
+                                      command=self.written)
+                break
+            if self.strict and not self.written.startswith(expected):
+                raise ReplayError(f"Se escribió {self.written[:len(expected)]!r}, la sesión tenía {expected!r}",
+                                  command=self.written)
+            self.written = self.written[len(expected):]
+            self._done_at.append(time.monotonic())
+        return len(data)
+
+    def _due(self, index):
+        """
+        Instante real en que se entrega la lectura index, o None si todavía no se habilitó.
+        """
+        gate, recorded, _ = self._reads[index]
+        if gate >= len(self._done_at):
+            return None
+        if self.speed is None:
+            return 0.0
+        if gate < 0:
+            return self._t0 + recorded / self.speed
+        return self._done_at[gate] + (recorded - self._writes[gate][0]) / self.speed
+
+    def _collect(self):
+        now = time.monotonic()
+        while self._next_read < len(self._reads):
+            due = self._due(self._next_read)
+            if due is None or due > now:
+                return due
+            self._pending += self._reads[self._next_read][2]
+            self._next_read += 1
+        return None
+
+    @property
+    def in_waiting(self):
+        self._collect()
+        return len(self._pending)
+
+    @property
+    def finished(self):
+        """
+        True cuando se entregaron todas las lecturas y se consumieron todas las escrituras.
+        """
+        return self._next_read == len(self._reads) and len(self._done_at) == len(self._writes) \
+            and not self._pending
+
+    def read(self, size=1):
+        due = self._collect()
+        if not self._pending:
+            wait = self.poll if due is None else min(max(due - time.monotonic(), 0.0), self.poll)
+            time.sleep(wait)
+            self._collect()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def reset_input_buffer(self):
+        self._collect()
+        self._pending = b""
+
+
+def replay_transport(path, speed=None, strict=True, timeout=None, **kwargs):
+    """
+    SerialTransport sobre un log grabado, con el mismo terminador y eol de la sesión original.\n
+    :param timeout: deadline de lectura; por defecto el original a speed=1.0, y corto en modo
+                    rápido (las respuestas ya están disponibles: solo vence donde venció al grabar)
+    :param speed: como en ReplayPort; también escala transport.sleep()
+    """
+    from .transport import SerialTransport
+
+    metadata, records = read_log(path)
+    if timeout is None:
+        timeout = 0.05 if speed is None else metadata.get("timeout", 1.0) / speed
+    settings = dict(port=metadata.get("port"), baudrate=metadata.get("baudrate", 9600),
+                    terminator=metadata.get("terminator", "\n").encode("latin-1"),
+                    eol=metadata.get("eol", "\r"), encoding=metadata.get("encoding", "utf-8"))
+    settings.update(kwargs)
+    transport = SerialTransport(ser=ReplayPort(records, speed=speed, strict=strict), timeout=timeout, **settings)
+
+    def sleep(seconds):
+        #las esperas de asentamiento del driver también se escalan (o se saltean en modo rápido)
+        if speed is not None:
+            time.sleep(seconds / speed)
+        transport.sleep_time += seconds
+    transport.sleep = sleep
+    return transport
+
+
+if __name__ == "__main__":
+    metadata, records = read_log(sys.argv[1])
+    print(json.dumps(metadata))
+    for r in records:
+        print(f"{r.time:12.6f} {r.kind.decode()} {r.data!r}")
@@ -0,0 +1,392 @@
+"""
+server.py - Servidor local de instrumentos
+
+Un solo proceso mantiene abiertas las conexiones de la estación (ESA620,
+PROSIM8, Fluke8845, ...) y expone los métodos públicos de cada driver por
+un socket Unix o por TCP (127.0.0.1 salvo allow_remote=True, el servidor
+no autentica a los clientes). Cada instrumento tiene su hilo
+dueño (InstrumentWorker), así los pedidos de varios clientes a un mismo
+instrumento se serializan y se atienden por prioridad, mientras que
+instrumentos distintos trabajan en paralelo. La conexión y el REMOTE se
+pagan una vez por turno y no una vez por script.
+
+Protocolo: una línea JSON por mensaje.
+    pedido:    {"id": 1, "instrument": "esa", "method": "patientLeakageCurrent",
+                "args": [], "kwargs": {}, "priority": 10}
+    respuesta: {"id": 1, "result": "4.1"}  o  {"id": 1, "error": {"type": "RangeError", "message": "..."}}
+Un cliente puede enviar varios pedidos sin esperar; las respuestas llegan
+a medida que terminan, identificadas por id.
+
+Servidor:
+    python -m FLUKE.server station.json
+    station.json: {"address": "/tmp/fluke.sock",
+                   "instruments": {"esa": {"driver": "ESA620", "port": "COM8"},
+                                   "ps8": {"driver": "PROSIM8", "port": "COM11"}}}
+    con "address": ["127.0.0.1", 5025] atiende por TCP; otra interfaz requiere "allow_remote": true
+
+Cliente:
+    with InstrumentClient("/tmp/fluke.sock") as client:
+        esa = client.instrument("esa")
+        print(esa.patientLeakageCurrent())
+        client.call("ps8", "setHeartRate", 80, priority=PRIORITY_MANUAL)
+"""
+import builtins
+import ipaddress
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future
+
+from . import _load, errors
+from .orchestrator import InstrumentWorker
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+DEFAULT_ADDRESS = "/tmp/fluke.sock"
+
+#Prioridades (menor = antes)
+PRIORITY_MANUAL = 0       #intervención del operador
+PRIORITY_PROCEDURE = 10   #procedimiento de ensayo
+PRIORITY_MONITOR = 20     #tableros y sondeos
+
+
+class RemoteError(errors.InstrumentError):
+    """
+    Error del servidor sin clase equivalente en errors.py.\n
+    :param remote_type: nombre de la clase de la excepción original
+    """
+
+    def __init__(self, message, remote_type=None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.remote_type = remote_type
+
+
+def _invalid(request):
+    """
+    Motivo por el que un pedido (dict) está mal formado, o None si es válido.
+    """
+    for field in ("instrument", "method"):
+        if request.get(field) is not None and not isinstance(request[field], str):
+            return f"{field} debe ser un texto"
+    if not isinstance(request.get("args", []), list):
+        return "args debe ser una lista"
+    if not isinstance(request.get("kwargs") or {}, dict):
+        return "kwargs debe ser un objeto"
+    priority = request.get("priority", PRIORITY_PROCEDURE)
+    if isinstance(priority, bool) or not isinstance(priority, (int, float)):
+        return "priority debe ser un número"
+    return None
+
+
+def _encode(message):
+    def default(value):
+        if hasattr(value, "tolist"):  #arreglos numpy
+            return value.tolist()
+        if hasattr(value, "_asdict"):
+            return value._asdict()
+        return str(value)
+    return (json.dumps(message, default=default) + "\n").encode("utf-8")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Una conexión de cliente: lee pedidos y responde cuando terminan, sin bloquear la lectura.
+    """
+
+    def handle(self):
+        lock = threading.Lock()
+
+        def reply(message):
+            with lock:
+                try:
+                    self.wfile.write(_encode(message))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError, ValueError):
+                    pass  #el cliente se fue
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                reply({"id": None, "error": {"type": "ProtocolError", "message": str(e)}})
+                continue
+            if not isinstance(request, dict):
+                text = line.strip()[:80].decode("utf-8", "replace")
+                reply({"id": None, "error": {"type": "ProtocolError",
+                                             "message": f"el pedido debe ser un objeto JSON: {text}"}})
+                continue
+            future = self.server.dispatch(request)
+            future.add_done_callback(lambda f, rid=request.get("id"): reply(self.server.response(rid, f)))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):  #no existe en Windows
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+
+def _loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+class InstrumentServer:
+    """
+    :param instruments: dict nombre -> driver ya conectado
+    :param address: ruta de socket Unix (str) o (host, puerto) para TCP; host vacío es 127.0.0.1
+    :param allow_remote: permite atender en una interfaz que no sea loopback (cualquiera en la red
+                         podría mover los instrumentos)
+    """
+
+    def __init__(self, instruments, address=DEFAULT_ADDRESS, allow_remote=False):
+        if not isinstance(address, str):
+            host, port = address
+            address = (host or "127.0.0.1", port)
+            if not allow_remote and not _loopback(address[0]):
+                raise ValueError(f"{address[0]} no es una dirección local; usar allow_remote=True para "
+                                 f"atender desde la red")
+        self.instruments = dict(instruments)
+        self.address = address
+        self.workers = {name: InstrumentWorker(name, driver) for name, driver in self.instruments.items()}
+        self._server = None
+        self._thread = None
+
+    def describe(self):
+        """
+        Instrumentos y métodos públicos disponibles.
+        """
+        return {name: sorted(m for m in dir(driver) if not m.startswith("_") and callable(getattr(driver, m)))
+                for name, driver in self.instruments.items()}
+
+    def dispatch(self, request):
+        """
+        Encola un pedido en el hilo de su instrumento y devuelve el Future.
+        """
+        problem = _invalid(request)
+        if problem is not None:
+            future = Future()
+            future.set_exception(errors.ProtocolError(problem, command=request.get("method")))
+            return future
+        instrument = request.get("instrument")
+        method = request.get("method") or ""
+        if instrument is None and method == "describe":
+            future = Future()
+            future.set_result(self.describe())
+            return future
+        if instrument not in self.workers or method.startswith("_") or \
+                not callable(getattr(self.instruments[instrument], method, None)):
+            future = Future()
+            future.set_exception(AttributeError(f"{instrument}.{method} no existe"))
+            return future
+        priority = request.get("priority", PRIORITY_PROCEDURE)
+        return self.workers[instrument].submit_priority(priority, method, request.get("args", ()),
+                                                        request.get("kwargs"))
+
+    @staticmethod
+    def response(request_id, future):
+        error = future.exception()
+        if error is None:
+            return {"id": request_id, "result": future.result()}
+        return {"id": request_id, "error": {"type": type(error).__name__, "message": str(error),
+                                            "code": getattr(error, "code", None)}}
+
+    def start(self):
+        """
+        Empieza a atender en un hilo propio.
+        """
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.unlink(self.address)  #socket de una corrida anterior
+            server_cls = _UnixServer
+        else:
+            server_cls = _TCPServer
+        self._server = server_cls(self.address, _Handler)
+        self._server.dispatch = self.dispatch
+        self._server.response = self.response
+        self._thread = threading.Thread(target=self._server.serve_forever, name="instrument-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.start()
+        self._thread.join()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+        for worker in self.workers.values():
+            worker.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class InstrumentClient:
+    """
+    Cliente del InstrumentServer. Es seguro usarlo desde varios hilos:
+    los pedidos se envían sin esperar y cada respuesta completa su Future.\n
+    :param address: la misma dirección del servidor
+    :param timeout: segundos máximos de espera de call() (None sin límite)
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(address)
+        except OSError as e:
+            raise errors.CommunicationError(f"Servidor de instrumentos no disponible en {address}: {e}",
+                                            instrument=str(address)) from e
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._file = self.sock.makefile("rb")
+        self._reader = threading.Thread(target=self._read, name="instrument-client", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for line in self._file:
+            try:
+                message = json.loads(line)
+                request_id = message.get("id")
+            except (ValueError, AttributeError):
+                #no se sabe a qué pedido corresponde: fallan todos los pendientes y se sigue leyendo
+                self._fail(errors.ProtocolError(f"respuesta inválida del servidor: {line[:80]!r}"))
+                continue
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if "error" in message:
+                future.set_exception(self._error(message["error"]))
+            else:
+                future.set_result(message.get("result"))
+        self._fail(errors.CommunicationError("Conexión con el servidor cerrada"))
+
+    def _fail(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    @staticmethod
+    def _error(error):
+        cls = getattr(errors, error["type"], None)
+        message = error["message"]
+        if isinstance(cls, type) and issubclass(cls, errors.CommandError):
+            return cls(message, code=error.get("code"))
+        if isinstance(cls, type) and issubclass(cls, errors.InstrumentError):
+            return cls(message)
+        if error["type"] in ("AttributeError", "ValueError", "TypeError", "KeyError"):
+            return getattr(builtins, error["type"])(message)
+        return RemoteError(message, remote_type=error["type"])
+
+    def submit(self, instrument, method, *args, priority=PRIORITY_PROCEDURE, **kwargs):
+        """
+        Envía un pedido sin esperar y devuelve un Future con el resultado.
+        """
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = future
+            self.sock.sendall(_encode({"id": request_id, "instrument": instrument, "method": method,
+                                       "args": list(args), "kwargs": kwargs, "priority": priority}))
+        return future
+
+    def call(self, instrument, method, *args, priority=PRIORITY_PROCEDURE, **kwargs):
+        return self.submit(instrument, method, *args, priority=priority, **kwargs).result(self.timeout)
+
+    def describe(self):
+        return self.submit(None, "describe").result(self.timeout)
+
+    def instrument(self, name, priority=PRIORITY_PROCEDURE):
+        """
+        Proxy con los métodos del driver remoto: client.instrument("esa").REMOTE().
+        """
+        return _RemoteInstrument(self, name, priority)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _RemoteInstrument:
+    def __init__(self, client, name, priority):
+        self._client = client
+        self._name = name
+        self._priority = priority
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            return self._client.call(self._name, method, *args, priority=self._priority, **kwargs)
+        call.__name__ = method
+        return call
+
+
+def build_instruments(config):
+    """
+    Crea los drivers de un dict de configuración {"nombre": {"driver": "ESA620", "port": "COM8", ...}}.
+    Los drivers con connect() (PROSIM8) quedan conectados. Con "isolated": true el driver
+    corre en su propio proceso (isolation.IsolatedDriver).
+    """
+    instruments = {}
+    for name, settings in config.items():
+        settings = dict(settings)
+        cls = _load(settings.pop("driver"))  #drivers perezosos de FLUKE/__init__.py
+        if settings.pop("isolated", False):
+            from .isolation import IsolatedDriver
+            driver = IsolatedDriver(cls, name=name, **settings)
+        else:
+            driver = cls(**settings)
+        if hasattr(driver, "connect"):
+            driver.connect()
+        instruments[name] = driver
+    return instruments
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1] if len(sys.argv) > 1 else "station.json", encoding="utf-8") as f:
+        station = json.load(f)
+    address = station.get("address", DEFAULT_ADDRESS)
+    server = InstrumentServer(build_instruments(station["instruments"]),
+                              address if isinstance(address, str) else tuple(address),
+                              allow_remote=station.get("allow_remote", False))
+    print(f"Atendiendo en {server.address}: {', '.join(server.instruments)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
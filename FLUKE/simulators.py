@@ -0,0 +1,487 @@
+"""
+simulators.py - Instrumentos virtuales sobre pseudo-terminales (Linux)
+
+Cada simulador abre un pty y atiende en un hilo el set de comandos que usan
+los drivers de este repositorio. Los drivers sin modificar se conectan a la
+ruta del pty (simulator.port, p.ej. /dev/pts/5) igual que a un COM real.
+
+    ESA620Simulator       REMOTE/IDENT, configuración, READ, MREAD con "*" de ocupado, ESC, !01/!02/!21
+    PROSIM8Simulator      REMOTE/IDENT y comandos de configuración con "*" o !01/!02/!03
+    IMPULSE7000Simulator  REMOTE (con !01 de sesión colgada), MODE=, Dready -> descarga, DWAVE
+    Fluke8845Simulator    SCPI: *IDN?, CONF/NPLC/RANG, INIT, *OPC?, FETCh?/FETCh3?
+    Fluke45Simulator      *IDN?, funciones, VAL1?/MEAS? con prompts =>, ?>, !>
+
+Los retardos son configurables (delay por respuesta, delays por mnemónico y
+time_scale para acelerar todo) y se pueden inyectar fallas:
+
+    with ESA620Simulator(time_scale=0.1) as sim:
+        sim.inject("error", command="MREAD", arg="!21")
+        esa = ESA620(sim.port)
+        ...
+
+Tipos de falla: "drop" (no responde), "error" (responde arg en lugar de la
+respuesta), "garble" (respuesta corrupta), "delay" (arg segundos extra) y
+"disconnect" (cierra el pty, como un cable USB desenchufado).
+"""
+import abc
+import heapq
+import math
+import os
+import re
+import select
+import threading
+import time
+import tty
+from collections import namedtuple
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+Fault = namedtuple("Fault", ["kind", "command", "count", "arg"])
+
+FAULT_KINDS = ("drop", "error", "garble", "delay", "disconnect")
+
+
+class Simulator(abc.ABC):
+    """
+    Base de los simuladores: pty, hilo de atención, agenda de respuestas y fallas.\n
+    :param delay: latencia de cada respuesta en segundos
+    :param delays: dict mnemónico -> latencia, para comandos lentos
+    :param time_scale: factor aplicado a todos los tiempos (0.1 = diez veces más rápido)
+    :param serial_number: número de serie informado en la identificación
+    """
+    NAME = "SIM"
+    EOL = b"\r\n"  #terminador de las respuestas
+    EMPTY_COMMANDS = False  #atender las líneas vacías (consulta vacía del ProSim 8)
+    DEFAULT_DELAYS = {}
+
+    def __init__(self, delay=0.005, delays=None, time_scale=1.0, serial_number="0000001"):
+        self.delay = delay
+        self.delays = dict(self.DEFAULT_DELAYS)
+        self.delays.update(delays or {})
+        self.time_scale = time_scale
+        self.serial_number = serial_number
+        self.received = []  #comandos recibidos, en orden
+        self.faults = []
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._pending = []  #heap (vencimiento, orden, bytes)
+        self._seq = 0
+        self._last_due = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    #*********************************************************PTY************************************************************
+    def start(self):
+        """
+        Abre el pty y arranca el hilo. Devuelve la ruta del puerto.
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name=f"sim-{self.NAME}", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        buffer = b""
+        while not self._stop.is_set():
+            with self._lock:
+                due = self._pending[0][0] if self._pending else None
+            wait = 0.05 if due is None else min(max(due - time.monotonic(), 0), 0.05)
+            try:
+                ready, _, _ = select.select([self._master], [], [], wait)
+                if ready:
+                    data = os.read(self._master, 4096)
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\r")
+                    for line in lines:
+                        cmd = line.strip(b"\n").decode("latin-1").strip()
+                        if cmd or self.EMPTY_COMMANDS:
+                            self._receive(cmd)
+                self._flush()
+            except OSError:
+                return  #pty cerrado
+
+    def _flush(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._pending or self._pending[0][0] > now:
+                    return
+                _, _, payload = heapq.heappop(self._pending)
+            os.write(self._master, payload)
+
+    def schedule(self, text, delay=0.0, eol=True):
+        """
+        Agenda una respuesta dentro de delay segundos (ya escalados). Las respuestas
+        salen en orden, como en una línea serie.
+        """
+        payload = text if isinstance(text, bytes) else text.encode("latin-1")
+        if eol:
+            payload += self.EOL
+        with self._lock:
+            due = max(time.monotonic() + delay, self._last_due)
+            self._last_due = due
+            self._seq += 1
+            heapq.heappush(self._pending, (due, self._seq, payload))
+
+    #*********************************************************FALLAS*********************************************************
+    def inject(self, kind, command=None, count=1, arg=None):
+        """
+        Agrega una falla para los próximos count comandos que empiecen con command (None = cualquiera).
+        """
+        if kind not in FAULT_KINDS:
+            raise ValueError(f"Falla desconocida: {kind}")
+        self.faults.append(Fault(kind, command, count, arg))
+
+    def _take_fault(self, cmd):
+        for i, fault in enumerate(self.faults):
+            if fault.command is None or cmd.upper().startswith(fault.command.upper()):
+                if fault.count <= 1:
+                    del self.faults[i]
+                else:
+                    self.faults[i] = fault._replace(count=fault.count - 1)
+                return fault
+        return None
+
+    def respond(self, cmd):
+        """
+        Procesa un comando aplicando retardos y fallas, sin tocar el pty.\n
+        :return: lista de (segundos desde la recepción, ya escalados por time_scale, respuesta)
+        :raises ConnectionResetError: falla "disconnect"
+        """
+        self.received.append(cmd)
+        mnemonic = re.split(r"[=\s:?]", cmd.lstrip("*"), maxsplit=1)[0].upper() or cmd
+        delay = self.delays.get(mnemonic, self.delay)
+        fault = self._take_fault(cmd)
+        if fault is not None:
+            if fault.kind == "drop":
+                return []
+            if fault.kind == "disconnect":
+                raise ConnectionResetError("desconexion simulada")
+            if fault.kind == "error":
+                return [(delay * self.time_scale, fault.arg or "!02")]
+            if fault.kind == "delay":
+                delay += fault.arg or 1.0
+        replies = []
+        for reply in self.handle(cmd) or []:
+            if isinstance(reply, tuple):
+                reply, extra = reply
+                delay += extra  #los tiempos extra se acumulan respecto de la respuesta anterior
+            if fault is not None and fault.kind == "garble":
+                reply = reply[::-1].replace("*", "#") + "\x7f"
+            replies.append((delay * self.time_scale, reply))
+        return replies
+
+    def _receive(self, cmd):
+        try:
+            replies = self.respond(cmd)
+        except ConnectionResetError:
+            self._stop.set()
+            os.close(self._master)
+            self._master = None
+            raise
+        for delay, reply in replies:
+            self.schedule(reply, delay)
+
+    @abc.abstractmethod
+    def handle(self, cmd):
+        """
+        Procesa un comando. Devuelve una lista de respuestas: str, o (str, segundos extra).
+        """
+
+
+class ESA620Simulator(Simulator):
+    """
+    ESA620: "*" como acknowledge, !01 fuera de modo remoto, !02 comando desconocido,
+    READ según el ensayo configurado y MREAD con busy "*" antes del valor.\n
+    :param values: dict ensayo -> valor (None responde !21, fuera de rango)
+    :param busy: cantidad de "*" extra que envía MREAD antes del valor
+    """
+    NAME = "ESA620"
+    DEFAULT_DELAYS = {"MREAD": 0.0, "READ": 0.3}
+    TESTS = ("ERES", "MAINS", "MINS", "INS", "EQCURR", "EARTHL", "ENCL", "PAT", "MAP", "AUX", "INSB", "INSD", "INSE")
+    SETTINGS = ("RPTIME", "STD", "POL", "EARTH", "NEUT", "MODE", "AP", "GRP", "MDUAL", "RWIRE")
+    VALUES = {
+        "ERES": "0.112 OHMS",
+        "MAINS": "220.4 V",
+        "INS": "550.0 MOHMS",
+        "EQCURR": "0.52 A",
+        "EARTHL": "12.5 uA",
+        "ENCL": "3.2 uA",
+        "PAT": "4.1 uA",
+        "MAP": "6.7 uA",
+        "AUX": "2.9 uA",
+    }
+
+    def __init__(self, values=None, busy=3, measure_time=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.values = dict(self.VALUES)
+        self.values.update(values or {})
+        self.busy = busy
+        self.measure_time = measure_time
+        self.remote = False
+        self.test = None
+        self.settings = {}
+
+    def _value(self):
+        test = self.test
+        if test in ("MINS", "INSB", "INSD", "INSE"):
+            test = "INS"
+        value = self.values.get(test)
+        return "!21" if value is None else value
+
+    def handle(self, cmd):
+        key, _, arg = cmd.replace(" ", "").partition("=")
+        key = key.upper()
+        if key == "REMOTE":
+            self.remote = True
+            return ["*"]
+        if key == "IDENT":
+            return [f"ESA620,{self.serial_number},1.03"]
+        if not self.remote:
+            return ["!01"]
+        if key == "LOCAL":
+            self.remote = False
+            return ["*"]
+        if key == "\x1b":
+            return ["*"]
+        if key in self.TESTS or key == "MAINS":
+            if key == "MAINS" or (key == "MAP" and arg):
+                self.settings[key] = arg
+            self.test = "MAINS" if key == "MAINS" else key
+            return ["*"]
+        if key in self.SETTINGS or key == "INS":
+            self.settings[key] = arg
+            return ["*"]
+        if key == "READ":
+            return [self._value()] if self.test else ["!01"]
+        if key == "MREAD":
+            if not self.test:
+                return ["!01"]
+            step = self.measure_time / (self.busy + 1)
+            return ["*"] + [("*", step)] * self.busy + [(self._value(), step)]
+        return ["!02"]
+
+
+class PROSIM8Simulator(Simulator):
+    """
+    ProSim 8: "*" por comando aceptado, !01 fuera de modo remoto, !02 sintaxis, !03 fuera de rango.
+    """
+    NAME = "PROSIM8"
+    EMPTY_COMMANDS = True
+    RANGES = {"NSRA": (10, 360), "SAT": (0, 100), "PERF": (0.01, 20), "RESPRATE": (0, 150)}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.remote = False
+        self.state = {}
+
+    def handle(self, cmd):
+        key, _, arg = cmd.partition("=")
+        key = key.strip().upper()
+        if key == "REMOTE":
+            self.remote = True
+            return ["*"]
+        if key == "IDENT":
+            return [f"PROSIM8,{self.serial_number},2.5"]
+        if key == "":
+            return ["*"]
+        if not self.remote:
+            return ["!01"]
+        if key == "LOCAL":
+            self.remote = False
+            return ["*"]
+        if not re.fullmatch(r"[A-Z0-9]+", key):
+            return ["!02"]
+        if key in self.RANGES:
+            low, high = self.RANGES[key]
+            try:
+                if not low <= float(arg) <= high:
+                    return ["!03"]
+            except ValueError:
+                return ["!02"]
+        self.state[key] = arg
+        return ["*"]
+
+
+class IMPULSE7000Simulator(Simulator):
+    """
+    Impulse 7000. Dready contesta "*" y, pasado discharge_time, la medición de la
+    descarga según el modo: DEFIB "energía J, V, A", CHARGE "tiempo s, energía J",
+    SYNC "retardo ms, energía J". DWAVE envía "cantidad,fs,escala" y las muestras.\n
+    :param energy: energía de cada descarga (J)
+    :param stuck: si es True el primer REMOTE responde !01 (sesión anterior colgada)
+    """
+    NAME = "IMPULSE7000"
+
+    def __init__(self, energy=200.0, discharge_time=2.0, charge_time=5.2, sync_delay=32.0, samples=400,
+                 fs=20000.0, stuck=False, **kwargs):
+        super().__init__(**kwargs)
+        self.energy = energy
+        self.discharge_time = discharge_time
+        self.charge_time = charge_time
+        self.sync_delay = sync_delay
+        self.samples = samples
+        self.fs = fs
+        self.stuck = stuck
+        self.remote = False
+        self.mode = None
+        self.discharges = 0
+
+    def _waveform(self):
+        """
+        Bifásica exponencial truncada sobre 50 ohm, en cuentas de 1 V.
+        """
+        peak = math.sqrt(self.energy * 50 / 0.006)
+        half = self.samples // 2
+        counts = []
+        for n in range(self.samples):
+            t = (n % half) / self.fs
+            v = peak * math.exp(-t / 0.008)
+            counts.append(str(int(v if n < half else -0.6 * v)))
+        lines = [",".join(counts[i:i + 20]) for i in range(0, len(counts), 20)]
+        return [f"{self.samples},{self.fs:.0f},1.0"] + lines
+
+    def handle(self, cmd):
+        key, _, arg = cmd.partition("=")
+        key = key.strip().upper()
+        if key == "REMOTE":
+            if self.stuck:
+                self.stuck = False
+                return ["!01"]
+            if self.remote:
+                return ["!01"]
+            self.remote = True
+            return ["*"]
+        if key == "IDENT":
+            return [f"IMPULSE 7000,{self.serial_number},1.10"]
+        if key == "LOCAL":
+            self.remote = False
+            self.mode = None
+            return ["*"]
+        if not self.remote:
+            return ["!01"]
+        if key == "MODE":
+            if arg.strip().upper() not in ("DEFIB", "CHARGE", "SYNC"):
+                return ["!03"]
+            self.mode = arg.strip().upper()
+            return ["*"]
+        if key == "DREADY":
+            if self.mode is None:
+                return ["!01"]
+            self.discharges += 1
+            if self.mode == "CHARGE":
+                value = f"{self.charge_time:.2f} s, {self.energy:.1f} J"
+            elif self.mode == "SYNC":
+                value = f"{self.sync_delay:.1f} ms, {self.energy:.1f} J"
+            else:
+                peak = math.sqrt(self.energy * 50 / 0.006)
+                value = f"{self.energy:.1f} J, {peak:.1f} V, {peak / 50:.1f} A"
+            return ["*", (value, self.discharge_time)]
+        if key == "DWAVE":
+            return self._waveform() if self.discharges else ["!01"]
+        return ["!02"]
+
+
+class Fluke8845Simulator(Simulator):
+    """
+    Fluke 8845A/8846A por RS-232 (SCPI). Solo las consultas responden; *OPC?
+    demora según el NPLC configurado y FETCh?/FETCh3? devuelven el valor de la función.\n
+    :param values: dict función SCPI (VOLT, CURR, RES, FRES, FREQ, TEMP, DIOD) -> valor
+    :param line_frequency: frecuencia de red para el tiempo de integración
+    """
+    NAME = "Fluke8845"
+    VALUES = {"VOLT": 5.0012, "CURR": 0.01002, "RES": 1000.12, "FRES": 999.98, "FREQ": 1000.0,
+              "TEMP": 23.4, "DIOD": 0.612}
+
+    def __init__(self, values=None, line_frequency=50.0, **kwargs):
+        super().__init__(**kwargs)
+        self.values = dict(self.VALUES)
+        self.values.update(values or {})
+        self.line_frequency = line_frequency
+        self.function = "VOLT"
+        self.nplc = 10.0
+        self.errors = []
+
+    def handle(self, cmd):
+        upper = cmd.upper().strip()
+        if upper == "*IDN?":
+            return [f"FLUKE,8845A,{self.serial_number},08/02/10-11:53"]
+        if upper == "*CLS":
+            self.errors = []
+            return []
+        if upper == "*OPC?":
+            return [("1", self.nplc / self.line_frequency)]
+        if upper.startswith("FETC"):
+            return [f"{self.values[self.function]:+.8E}"]
+        if upper.startswith("SYST:ERR"):
+            return [self.errors.pop(0) if self.errors else '+0,"No error"']
+        if upper.startswith("CONF:"):
+            self.function = upper[5:].split(":")[0].split()[0]
+            return []
+        match = re.match(r"(\w+)(?::\w+)?:NPLC\s+([\d.]+)", upper)
+        if match:
+            self.nplc = float(match.group(2))
+            return []
+        if upper == "INIT" or ":RANG" in upper:
+            return []
+        self.errors.append('-113,"Undefined header"')
+        return []
+
+
+class Fluke45Simulator(Simulator):
+    """
+    Fluke 45: cada comando termina con un prompt "=>" (ok), "?>" (comando
+    desconocido) o "!>" (error de ejecución); las consultas envían antes su valor.
+    """
+    NAME = "Fluke45"
+    FUNCTIONS = ("VDC", "VAC", "ADC", "AAC", "OHMS", "FREQ", "DIODE")
+    VALUES = {"VDC": 5.0021, "VAC": 220.31, "ADC": 0.01003, "AAC": 0.0997, "OHMS": 1000.4, "FREQ": 50.002,
+              "DIODE": 0.615}
+    DEFAULT_DELAYS = {"VAL1": 0.1, "MEAS": 0.4, "AUTO": 0.05}
+
+    def __init__(self, values=None, **kwargs):
+        super().__init__(**kwargs)
+        self.values = dict(self.VALUES)
+        self.values.update(values or {})
+        self.function = "VDC"
+
+    def handle(self, cmd):
+        upper = cmd.upper().strip()
+        if upper == "*IDN?":
+            return [f"FLUKE, 45, {self.serial_number}, 1.6 D1.0", "=>"]
+        if upper in self.FUNCTIONS:
+            self.function = upper
+            return ["=>"]
+        if upper in ("*CLS", "AUTO") or upper.startswith(("TRIGGER", "RANGE", "RATE")):
+            return ["=>"]
+        if upper in ("VAL?", "VAL1?", "MEAS?", "MEAS1?"):
+            return [f"{self.values[self.function]:+.4E}", "=>"]
+        if upper.endswith("?"):
+            return ["!>"]
+        return ["?>"]
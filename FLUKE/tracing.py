@@ -0,0 +1,106 @@
+"""
+tracing.py - Trazado de latencia ida y vuelta por comando
+
+CommandTracer guarda, por cada comando enviado a un instrumento, el instante
+de escritura, la latencia hasta el acknowledge, el status recibido y los
+bytes escritos/leídos en un buffer acotado en memoria. Registrar un comando
+es un append a un deque, sin I/O de consola en el camino crítico.
+
+Ejemplo:
+    tracer = CommandTracer()
+    ps8 = PROSIM8(port="COM11", tracer=tracer)
+    ...
+    print(tracer.histogram())
+    tracer.export("prosim_trace.csv")
+"""
+import csv
+import json
+import time
+from collections import deque, namedtuple
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+TraceRecord = namedtuple("TraceRecord", ["timestamp", "mnemonic", "latency", "status", "bytes_out", "bytes_in"])
+
+
+def mnemonic(cmd):
+    """
+    Devuelve el mnemónico de un comando: "NSRA=070\\r" -> "NSRA".
+    """
+    return cmd.strip().split("=", 1)[0]
+
+
+def _percentile(ordered, q):
+    """
+    Percentil por rango más cercano sobre una lista ya ordenada.
+    """
+    i = min(int(q / 100.0 * len(ordered)), len(ordered) - 1)
+    return ordered[i]
+
+
+class CommandTracer:
+    """
+    Buffer circular de TraceRecord.\n
+    :param maxlen: cantidad máxima de registros conservados (los más viejos se descartan)
+    """
+
+    def __init__(self, maxlen=10000):
+        self.records = deque(maxlen=maxlen)
+        self.enabled = True
+
+    def record(self, cmd, latency, status, bytes_out, bytes_in, timestamp=None):
+        if not self.enabled:
+            return
+        self.records.append(TraceRecord(
+            time.time() if timestamp is None else timestamp,
+            mnemonic(cmd), latency, status, bytes_out, bytes_in))
+
+    def clear(self):
+        self.records.clear()
+
+    def histogram(self, name=None):
+        """
+        Estadísticas de latencia (segundos) por mnemónico.\n
+        :param name: limita el resultado a un mnemónico
+        :return: dict mnemonico -> {"count", "total", "p50", "p95", "p99", "max"}
+        """
+        latencies = {}
+        for r in list(self.records):
+            if name is None or r.mnemonic == name:
+                latencies.setdefault(r.mnemonic, []).append(r.latency)
+
+        stats = {}
+        for key, values in latencies.items():
+            values.sort()
+            stats[key] = {
+                "count": len(values),
+                "total": sum(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+                "max": values[-1],
+            }
+        return stats
+
+    def top(self, n=10):
+        """
+        Mnemónicos ordenados por tiempo total consumido.
+        """
+        stats = self.histogram()
+        return sorted(stats.items(), key=lambda kv: kv[1]["total"], reverse=True)[:n]
+
+    def export(self, path):
+        """
+        Exporta los registros a CSV, o a JSON lines si path termina en .jsonl.
+        """
+        records = list(self.records)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            if str(path).endswith(".jsonl"):
+                for r in records:
+                    f.write(json.dumps(r._asdict()) + "\n")
+            else:
+                writer = csv.writer(f)
+                writer.writerow(TraceRecord._fields)
+                writer.writerows(records)
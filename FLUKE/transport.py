@@ -0,0 +1,344 @@
+"""
+transport.py - Transporte serie compartido por todos los drivers FLUKE
+
+SerialTransport envuelve el puerto serie con:
+    - lectura bufferizada read_until(terminador) con deadline por llamada
+    - escrituras en lote (un solo write para varios comandos)
+    - contadores de bytes, lecturas, escrituras, latencia y tiempo de espera
+    - sleep() contabilizado para las esperas intencionales del instrumento
+    - interfaz mockeable: se le puede pasar cualquier objeto tipo puerto
+
+El puerto se abre con un timeout corto (poll) y las lecturas toman lo que
+haya en el buffer del sistema en cada llamada, así una línea se lee con
+pocas syscalls y el deadline lo controla el transporte, no el puerto.
+
+Un objeto tipo puerto (ser=...) solo necesita write(bytes), read(n),
+close(), is_open y opcionalmente open(), in_waiting y reset_input_buffer().
+open() reabre ese mismo puerto tras un close(): un puerto inyectado,
+grabado o reproducido nunca se cambia por uno serie real.
+
+request() agrega a query() la verificación de la respuesta y los
+reintentos de la RetryPolicy del transporte (errors.py).
+
+Con record=archivo (o SerialTransport.RECORD_DIR para todos los puertos) se
+graba la sesión para reproducirla después sin instrumento (recording.py).
+
+Con SerialTransport.METRICS definido (metrics.py) cada transporte se
+registra al crearse y la latencia de cada comando va a un histograma.
+Una respuesta intermedia declarada en interim (el "*" del ESA620 mientras
+mide) no cierra la latencia de su comando: se mide hasta el valor.
+"""
+import time
+from collections import deque
+
+import serial
+
+from .errors import CommunicationError, InstrumentError, check_status
+
+__company__ = "Feas Electronica"
+__author__ = "Juan Cruz Noya & Julian Font"
+__version__ = "1.0.0"
+
+
+class SerialTransport:
+    """
+    :param port: puerto serie ("COM8", "/dev/ttyUSB0", ...)
+    :param baudrate: velocidad
+    :param terminator: terminador de las respuestas (bytes)
+    :param eol: terminador agregado a los comandos de texto que no lo tengan
+    :param timeout: deadline por defecto de cada lectura, en segundos
+    :param poll: timeout del puerto; cada cuanto se revisa el deadline
+    :param ser: objeto tipo puerto ya abierto (mock, pty, replay); si se da no se abre nada
+    :param retry: RetryPolicy de request(); None no reintenta
+    :param record: archivo donde grabar la sesión (recording.py); None no graba salvo que RECORD_DIR esté definido
+    :param settings: resto de parámetros de serial.Serial (parity, rtscts, write_timeout, ...)
+    """
+    #Directorio donde grabar un log por cada transporte que se abra; None no graba
+    RECORD_DIR = None
+    #metrics.Metrics que registra todos los transportes nuevos; None desactiva las métricas
+    METRICS = None
+
+    def __init__(self, port=None, baudrate=9600, terminator=b"\n", eol="\r", timeout=1.0, poll=0.05,
+                 encoding="utf-8", ser=None, retry=None, record=None, **settings):
+        self.port = port
+        self.baudrate = baudrate
+        self.terminator = terminator
+        self.eol = eol
+        self.timeout = timeout
+        self.poll = poll
+        self.encoding = encoding
+        self.settings = settings
+        self.retry = retry
+        self.record = record
+        self._buffer = bytearray()
+        self._log = None
+
+        self.writes = 0
+        self.reads = 0
+        self.read_calls = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.errors = 0
+        self.io_time = 0.0
+        self.sleep_time = 0.0
+        self.last_latency = 0.0
+
+        self.instrument = None  #etiqueta de las métricas: clase del driver (la pone el driver)
+        self.interim = {}  #mnemónico -> respuesta intermedia ("*" de MREAD) que no cierra su latencia
+        self.metrics = self.METRICS
+        self._sent = deque()  #(mnemónico, instante de escritura) de los comandos sin respuesta todavía
+        self._replied = 0.0  #instante de la última respuesta medida
+        if self.metrics is not None:
+            self.metrics.register(self)
+
+        self.ser = ser
+        if ser is None:
+            self.open()
+        else:
+            self.ser = self._recorded(ser)
+
+    #*********************************************************PUERTO*********************************************************
+    def open(self):
+        if self.ser is not None and self.ser.is_open:
+            return
+        if self.ser is not None:
+            reopen = getattr(self.ser, "open", None)
+            if reopen is None:
+                raise CommunicationError(f"{self.port}: el puerto no se puede reabrir", instrument=self.port)
+            try:
+                reopen()
+            except (serial.SerialException, OSError) as e:
+                raise CommunicationError(f"No se pudo reabrir {self.port}: {e}", instrument=self.port) from e
+            self._buffer.clear()
+            return
+        try:
+            ser = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=self.poll, **self.settings)
+        except (serial.SerialException, OSError) as e:
+            raise CommunicationError(f"No se pudo abrir {self.port}: {e}", instrument=self.port) from e
+        self.ser = self._recorded(ser)
+        self._buffer.clear()
+
+    def _recorded(self, ser):
+        """
+        Envuelve el puerto en un RecordingPort si hay que grabar. Las reaperturas siguen en el mismo log
+        (SessionLog lo reabre para agregar).
+        """
+        if self._log is None:
+            from .recording import ReplayPort, session_path
+            path = self.record
+            if path is None and self.RECORD_DIR is not None and not isinstance(ser, ReplayPort):
+                path = session_path(self.RECORD_DIR, self.port)  #una reproducción no se vuelve a grabar
+            if path is None:
+                return ser
+            from .recording import SessionLog
+            self._log = SessionLog(path, {
+                "port": self.port, "baudrate": self.baudrate, "terminator": self.terminator.decode("latin-1"),
+                "eol": self.eol, "encoding": self.encoding, "timeout": self.timeout,
+                "settings": {key: str(value) for key, value in self.settings.items()},
+            })
+        from .recording import RecordingPort
+        return RecordingPort(ser, self._log)
+
+    def close(self):
+        """
+        Cierra el puerto y el log de la sesión (queda completo en disco; open() sigue agregando).
+        """
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+        if self._log is not None:
+            self._log.close()
+
+    def __del__(self):
+        #un transporte descartado sin close() no deja el log abierto
+        log = getattr(self, "_log", None)
+        if log is not None:
+            log.close()
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    def reset_input_buffer(self):
+        """
+        Descarta lo recibido y no leído (buffer propio y del puerto).
+        """
+        self._buffer.clear()
+        self._sent.clear()
+        reset = getattr(self.ser, "reset_input_buffer", None)
+        if reset is not None:
+            reset()
+
+    #*********************************************************ESCRITURA******************************************************
+    def _encode(self, cmd):
+        if isinstance(cmd, (bytes, bytearray)):
+            return bytes(cmd)
+        if self.eol and not cmd.endswith(self.eol):
+            cmd = cmd + self.eol
+        return cmd.encode(self.encoding)
+
+    def write(self, cmd):
+        """
+        Escribe un comando (str, se le agrega eol si falta) o bytes crudos.
+        """
+        payload = self._encode(cmd)
+        self.ser.write(payload)
+        if self.metrics is not None:
+            self._sent.append((self.metrics.command_label(cmd), time.perf_counter()))
+        self.writes += 1
+        self.bytes_written += len(payload)
+        return len(payload)
+
+    def write_batch(self, cmds):
+        """
+        Escribe varios comandos con una sola llamada al puerto.
+        """
+        payload = b"".join(self._encode(cmd) for cmd in cmds)
+        self.ser.write(payload)
+        if self.metrics is not None:
+            now = time.perf_counter()
+            self._sent.extend((self.metrics.command_label(cmd), now) for cmd in cmds)
+        self.writes += len(cmds)
+        self.bytes_written += len(payload)
+        return len(payload)
+
+    #*********************************************************LECTURA********************************************************
+    def _fill(self):
+        """
+        Una lectura del puerto: todo lo disponible, o espera hasta poll por 1 byte.
+        """
+        chunk = self.ser.read(max(getattr(self.ser, "in_waiting", 0) or 0, 1))
+        self.read_calls += 1
+        if chunk:
+            self._buffer += chunk
+            self.bytes_read += len(chunk)
+        return len(chunk)
+
+    def read_until(self, terminator=None, timeout=None):
+        """
+        Lee hasta el terminador o hasta el deadline.\n
+        :param terminator: por defecto self.terminator
+        :param timeout: segundos para esta lectura; por defecto self.timeout (None espera sin límite)
+        :return: la línea decodificada sin terminador ni espacios extremos, o "" si venció el deadline
+        """
+        terminator = self.terminator if terminator is None else terminator
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while True:
+                i = self._buffer.find(terminator)
+                if i >= 0:
+                    line = bytes(self._buffer[:i])
+                    del self._buffer[:i + len(terminator)]
+                    self.reads += 1
+                    text = line.decode(self.encoding, errors="replace").strip()
+                    if self._sent and self.interim.get(self._sent[0][0]) != text:
+                        command, sent = self._sent.popleft()
+                        now = time.perf_counter()
+                        #en un lote el comando empieza con la respuesta del anterior, no con la escritura
+                        self.metrics.observe(self.instrument, command, now - max(sent, self._replied), port=self.port)
+                        self._replied = now
+                    return text
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.timeouts += 1
+                    self._sent.clear()
+                    return ""
+                self._fill()
+        finally:
+            self.io_time += time.perf_counter() - start
+
+    def read_exact(self, count, timeout=None):
+        """
+        Lee exactamente count bytes (datos binarios) o devuelve None si vence el deadline.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = None if timeout is None else start + timeout
+        try:
+            while len(self._buffer) < count:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.timeouts += 1
+                    return None
+                self._fill()
+            data = bytes(self._buffer[:count])
+            del self._buffer[:count]
+            return data
+        finally:
+            self.io_time += time.perf_counter() - start
+
+    def query(self, cmd, timeout=None, terminator=None):
+        """
+        Escribe un comando y lee su respuesta.
+        """
+        start = time.perf_counter()
+        self.write(cmd)
+        reply = self.read_until(terminator=terminator, timeout=timeout)
+        self.last_latency = time.perf_counter() - start
+        return reply
+
+    def request(self, cmd, check=check_status, timeout=None, terminator=None, policy=None):
+        """
+        query() verificado y con reintentos.\n
+        :param check: check(respuesta, cmd, puerto) devuelve el valor o lanza un InstrumentError
+        :param policy: RetryPolicy para este comando; por defecto self.retry
+        :return: lo que devuelva check
+        """
+        def attempt():
+            return check(self.query(cmd, timeout=timeout, terminator=terminator), cmd, self.port)
+
+        return self.retrying(policy or self.retry, attempt, cmd)
+
+    def retrying(self, policy, attempt, cmd, on_retry=None):
+        """
+        Corre attempt() con los reintentos de policy (None: un solo intento). Antes de cada
+        reintento descarta lo recibido; cuenta reintentos y errores finales en stats(). El backoff
+        espera con self.sleep (queda en sleep_time y se omite al reproducir una grabación).\n
+        :param on_retry: on_retry(error, n) adicional del driver (p.ej. para loguear)
+        """
+        def retried(error, n):
+            self.retries += 1
+            self.reset_input_buffer()  #descarta una respuesta tardia del intento anterior
+            if on_retry is not None:
+                on_retry(error, n)
+
+        try:
+            if policy is None:
+                return attempt()
+            return policy.run(attempt, cmd, retried, sleep=self.sleep)
+        except InstrumentError:
+            self.errors += 1
+            raise
+
+    def query_batch(self, cmds, timeout=None):
+        """
+        Escribe todos los comandos de una vez y lee una respuesta por comando.
+        """
+        start = time.perf_counter()
+        self.write_batch(cmds)
+        replies = [self.read_until(timeout=timeout) for _ in cmds]
+        self.last_latency = time.perf_counter() - start
+        return replies
+
+    #*********************************************************ESPERAS********************************************************
+    def sleep(self, seconds):
+        """
+        Espera intencional (asentamiento del instrumento); queda contabilizada en sleep_time.
+        """
+        time.sleep(seconds)
+        self.sleep_time += seconds
+
+    def stats(self):
+        return {
+            "writes": self.writes,
+            "reads": self.reads,
+            "read_calls": self.read_calls,
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "errors": self.errors,
+            "io_time": self.io_time,
+            "sleep_time": self.sleep_time,
+        }
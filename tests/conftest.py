@@ -0,0 +1,71 @@
+"""
+Fixtures comunes de las pruebas de FLUKE.
+
+Las pruebas corren sin instrumentos: los drivers hablan con los simuladores
+de simulators.py, por un pty (igual que con un COM real) o por un
+ScriptedPort de benchmark.py con reloj virtual, que no duerme las esperas
+del instrumento. Los simuladores sobre pty necesitan Linux.
+
+    python -m pytest -q
+"""
+import pytest
+
+from FLUKE.transport import SerialTransport
+
+
+class FakePort:
+    """
+    Objeto tipo puerto que entrega data tal cual y guarda lo escrito.
+    """
+    is_open = True
+
+    def __init__(self, data=b""):
+        self.data = data
+        self.written = b""
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def write(self, data):
+        self.written += bytes(data)
+        return len(data)
+
+    def read(self, size=1):
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+    def reset_input_buffer(self):
+        pass
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+@pytest.fixture
+def fake_transport():
+    """
+    fake_transport(data) -> SerialTransport sobre un FakePort con data como respuesta.
+    """
+    def build(data, timeout=0.1):
+        return SerialTransport(ser=FakePort(data), terminator=b"\n", eol="\r", timeout=timeout, poll=0.01)
+    return build
+
+
+@pytest.fixture
+def scripted():
+    """
+    scripted(simulador, eol="\\r", timeout=2.0) -> SerialTransport contra el simulador sobre un ScriptedPort con
+    reloj virtual: las esperas (sleep, retardos del simulador) no cuestan tiempo real.
+    """
+    from FLUKE.benchmark import ScriptedPort, VirtualClock, _virtualize
+
+    def build(simulator, eol="\r", timeout=2.0):
+        clock = VirtualClock()
+        transport = SerialTransport(ser=ScriptedPort(simulator, clock), terminator=b"\n", eol=eol, timeout=timeout)
+        _virtualize(transport, clock)
+        return transport
+    return build
@@ -0,0 +1,111 @@
+"""
+Checkpoint y reanudación de Orchestrator.run() y de run_plan().
+"""
+import json
+
+import pytest
+
+from FLUKE.orchestrator import Orchestrator, Step
+
+
+class Recorder:
+    """
+    Driver falso: registra las llamadas y falla en los pasos de fail.
+    """
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def work(self, name):
+        self.calls.append(name)
+        if name in self.fail:
+            raise OSError(f"{name}: puerto caído")
+        return name.upper()
+
+    def remote(self):
+        self.calls.append("remote")
+
+
+def _steps():
+    return [
+        Step("a", "x", "work", ("a",)),
+        Step("b", "y", "work", ("b",)),
+        Step("c", "y", "work", ("c",), after=("a",)),
+        Step("d", "x", "work", ("d",), after=("c",)),
+    ]
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "run.json")
+    x, y = Recorder(), Recorder(fail={"c"})
+    with Orchestrator({"x": x, "y": y}) as orch:
+        results = orch.run(_steps(), checkpoint=checkpoint)
+        assert isinstance(orch.errors["c"], OSError)
+        assert orch.errors["d"] == "skipped"
+    assert results == {"a": "A", "b": "B"}
+    with open(checkpoint, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["completed"] == {"a": "A", "b": "B"}
+    assert sorted(saved["steps"]) == ["a", "b", "c", "d"]
+
+    x, y = Recorder(), Recorder()
+    verify = {"x": "remote", "y": "remote"}
+    with Orchestrator({"x": x, "y": y}) as orch:
+        results = orch.run(_steps(), checkpoint=checkpoint, verify=verify)
+        assert orch.resumed == 2
+        assert not orch.errors
+    assert results == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert x.calls == ["remote", "d"] and y.calls == ["remote", "c"]  #solo lo pendiente, tras verificar
+    assert not (tmp_path / "run.json").exists()  #corrida completa: el checkpoint se borra
+
+
+def test_checkpoint_of_other_steps_is_rejected(tmp_path):
+    checkpoint = tmp_path / "run.json"
+    checkpoint.write_text(json.dumps({"steps": ["a", "z"], "completed": {"a": "A"}}), encoding="utf-8")
+    with Orchestrator({"x": Recorder(), "y": Recorder()}) as orch:
+        with pytest.raises(ValueError, match="checkpoint"):
+            orch.run(_steps(), checkpoint=str(checkpoint))
+
+
+def test_plan_resume_does_not_repeat_measurements(scripted, tmp_path):
+    from FLUKE import ESA620, PROSIM8
+    from FLUKE.measurements import MeasurementStore
+    from FLUKE.plan import compile_plan, run_plan
+    from FLUKE.simulators import ESA620Simulator, PROSIM8Simulator
+
+    plan = {"steps": [
+        {"name": "ritmo", "instrument": "ps8", "config": {"setHeartRate": 80}, "call": "NormalRate"},
+        {"name": "tension", "instrument": "esa", "call": "voltMeasure", "limits": {"min": 200, "unit": "V"}},
+        {"name": "fuga", "instrument": "esa", "after": ["ritmo"], "config": {"setLeads": 3},
+         "call": "enclosureLeakageCurrent", "limits": {"max": 100, "unit": "uA"}},
+    ]}
+
+    class Flaky(ESA620):
+        fail = True
+
+        def enclosureLeakageCurrent(self):
+            if Flaky.fail:
+                raise OSError("puerto caído")
+            return super().enclosureLeakageCurrent()
+
+    def instruments():
+        ps8 = PROSIM8("SIM", transport=scripted(PROSIM8Simulator()))
+        ps8.connect()
+        return {"esa": Flaky("SIM", transport=scripted(ESA620Simulator())), "ps8": ps8}
+
+    compiled = compile_plan(plan, {"esa": ESA620, "ps8": PROSIM8})
+    checkpoint = str(tmp_path / "plan.json")
+    with MeasurementStore(str(tmp_path / "medidas.db")) as store:
+        first = run_plan(compiled, instruments(), store=store, checkpoint=checkpoint)
+        assert set(first.errors) == {"fuga"}
+        assert {v.step: v.passed for v in first.verdicts}["tension"]
+
+        Flaky.fail = False
+        second = run_plan(compiled, instruments(), store=store, checkpoint=checkpoint)
+        assert not second.errors
+        assert second.summary["resumed"] == 2
+        assert all(v.passed for v in second.verdicts)
+        store.flush()
+        rows = store.query()
+    assert sorted(row.procedure for row in rows) == ["enclosureLeakageCurrent", "voltMeasure"]
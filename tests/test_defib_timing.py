@@ -0,0 +1,23 @@
+"""
+Series de tiempo de carga del Impulse 7000 (defib_timing.py) contra el simulador.
+"""
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import IMPULSE7000
+from FLUKE.defib_timing import charge_time_series
+
+
+def test_charge_time_series_stamps_the_dready_acknowledge(scripted):
+    simulator = simulators.IMPULSE7000Simulator(charge_time=5.2, energy=200.0)
+    analyzer = IMPULSE7000("SIM", transport=scripted(simulator))
+    series = charge_time_series(analyzer, trials=2, timeout=10.0)
+    assert series["measured"].tolist() == [5.2, 5.2]  #el tiempo de carga lo mide el analizador
+    assert series["energy"].tolist() == [200.0, 200.0]
+    for trial in series["trials"]:
+        assert not math.isnan(trial.acknowledged)
+        assert trial.armed <= trial.acknowledged <= trial.discharge
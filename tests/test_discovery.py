@@ -0,0 +1,116 @@
+"""
+Descubrimiento de instrumentos (discovery.py) contra los simuladores sobre pty.
+"""
+import json
+
+import pytest
+
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import discovery
+from FLUKE.discovery import discover, first, probe_port
+from FLUKE.errors import CommunicationError
+
+
+def _close(found):
+    for inst in found:
+        if inst.driver is not None:
+            inst.driver.close()
+
+
+@pytest.fixture
+def station():
+    with simulators.ESA620Simulator(serial_number="1234567", time_scale=0.02) as esa, \
+            simulators.Fluke45Simulator(serial_number="4500001") as f45, \
+            simulators.Fluke8845Simulator(serial_number="8845001") as f88:
+        yield {"ESA620": esa, "Fluke45": f45, "Fluke8845": f88}
+
+
+def test_discover_identifies_every_simulator(station, tmp_path):
+    cache = tmp_path / "ports.json"
+    found = discover(ports=[sim.port for sim in station.values()], cache_path=str(cache))
+    try:
+        assert {(inst.name, inst.port) for inst in found} == {(name, sim.port) for name, sim in station.items()}
+        assert first(found, "ESA620").serial_number == "1234567"
+        assert first(found, "PROSIM8") is None
+
+        saved = json.loads(cache.read_text(encoding="utf-8"))
+        assert saved["1234567"]["port"] == station["ESA620"].port
+        assert saved["8845001"]["instrument"] == "Fluke8845"
+    finally:
+        _close(found)
+
+
+def test_discovered_drivers_use_their_own_transport(station):
+    found = discover(ports=[sim.port for sim in station.values()], cache_path=None)
+    try:
+        esa = first(found, "ESA620").driver
+        assert esa.transport.timeout == 20  #no el timeout corto de la prueba de identificación
+        assert esa.transport.instrument == "ESA620"
+        assert esa.voltMeasure() == "220.4"
+
+        fluke45 = first(found, "Fluke45").driver
+        fluke45.voltage_measure()
+        assert fluke45.voltage == pytest.approx(5.0021)
+
+        fluke8845 = first(found, "Fluke8845").driver
+        fluke8845.voltage_measure()
+        assert fluke8845.voltage == pytest.approx(5.0012)
+    finally:
+        _close(found)
+
+
+def test_cached_instrument_skips_the_sweep(station, tmp_path):
+    cache = str(tmp_path / "ports.json")
+    ports = [sim.port for sim in station.values()]
+    _close(discover(instruments=["ESA620"], ports=ports, cache_path=cache))
+    for sim in station.values():
+        sim.received.clear()
+
+    found = discover(instruments=["ESA620"], ports=ports, cache_path=cache)
+    try:
+        assert [inst.name for inst in found] == ["ESA620"]
+        assert station["Fluke45"].received == [] and station["Fluke8845"].received == []
+    finally:
+        _close(found)
+
+
+def test_full_cache_skips_the_default_sweep(station, tmp_path):
+    cache = str(tmp_path / "ports.json")
+    ports = [sim.port for sim in station.values()]
+    _close(discover(ports=ports, cache_path=cache))
+
+    with simulators.PROSIM8Simulator() as newcomer:
+        found = discover(ports=ports + [newcomer.port], cache_path=cache)
+        try:
+            assert {inst.name for inst in found} == set(station)
+            assert newcomer.received == []  #todo lo cacheado respondió: no se barre
+        finally:
+            _close(found)
+
+
+def test_probe_ignores_other_instruments(station):
+    assert probe_port(station["Fluke45"].port, ["ESA620"], timeout=0.2) is None
+    assert "REMOTE" not in station["Fluke45"].received  #REMOTE solo después de reconocer un ESA620
+
+
+def test_driver_error_is_reported_per_instrument(station, tmp_path, monkeypatch):
+    build = discovery.build_driver
+
+    def failing(name, port, transport=None):
+        if name == "Fluke45":
+            transport.close()
+            raise CommunicationError("puerto tomado", instrument=port)
+        return build(name, port, transport)
+
+    monkeypatch.setattr(discovery, "build_driver", failing)
+    cache = tmp_path / "ports.json"
+    found = discover(ports=[sim.port for sim in station.values()], cache_path=str(cache))
+    try:
+        assert {inst.name for inst in found} == set(station)
+        fluke45 = first(found, "Fluke45")
+        assert fluke45.driver is None and isinstance(fluke45.error, CommunicationError)
+        assert first(found, "ESA620").error is None
+        assert "4500001" in json.loads(cache.read_text(encoding="utf-8"))
+    finally:
+        _close(found)
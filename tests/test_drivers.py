@@ -0,0 +1,124 @@
+"""
+Drivers contra los simuladores por ScriptedPort (reloj virtual): errores, reintentos y mediciones.
+"""
+import pickle
+import time
+
+import pytest
+
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import ESA620, PROSIM8
+from FLUKE.IMPULSE7000 import IMPULSE7000, ImpulseRangeError, ImpulseTimeout, Reply, Status, impulse_error, parse_reply
+from FLUKE.errors import CommunicationError, InstrumentTimeout, RangeError
+from FLUKE.simulators import ESA620Simulator, PROSIM8Simulator
+
+
+class ElectrodeSimulator(ESA620Simulator):
+    """
+    ESA620 cuya fuga a paciente depende del electrodo medido (AP=).
+    """
+    CURRENTS = {"RA": "1.5 uA", "LL": "7.25 uA", "LA": "3.0 uA"}
+
+    def _value(self):
+        if self.test == "PAT":
+            return self.CURRENTS[self.settings["AP"].strip("/")]
+        return super()._value()
+
+
+def test_patient_leakage_is_the_maximum_over_electrodes(scripted):
+    esa = ESA620("SIM", transport=scripted(ElectrodeSimulator()))
+    esa.setLeads(3)
+    assert esa.patientLeakageCurrent() == "7.25"
+
+
+def test_retry_backoff_counts_as_sleep(scripted):
+    simulator = PROSIM8Simulator()
+    transport = scripted(simulator, timeout=0.1)  #una respuesta perdida vence en tiempo real
+    ps8 = PROSIM8("SIM", transport=transport)
+    ps8.connect()
+    simulator.inject("drop", command="NSRA")
+    assert ps8.sendCommand("NSRA=080") == "*"
+    assert transport.retries == 1
+    assert transport.sleep_time == pytest.approx(PROSIM8.RETRY.delay(1))
+
+
+def test_esa620_setup_commands_use_the_ack_timeout(scripted):
+    simulator = ESA620Simulator()
+    esa = ESA620("SIM", transport=scripted(simulator))
+    simulator.inject("drop", command="POL", count=ESA620.RETRY.attempts)
+    with pytest.raises(InstrumentTimeout):
+        esa._query("POL=N")
+    assert esa.transport.timeouts == ESA620.RETRY.attempts
+
+
+def test_reconnect_reopens_the_same_port_and_restores_the_state(scripted):
+    simulator = PROSIM8Simulator()
+    transport = scripted(simulator)
+    port = transport.ser
+    ps8 = PROSIM8("SIM", transport=transport)
+    ps8.connect()
+    ps8.sendBatch(["NSRA=080", "SAT=090"])
+    transport.close()
+    simulator.state.clear()
+    ps8.reconnect()
+    assert ps8.con.ser is port and port.is_open  #no se reemplaza por un serial.Serial
+    assert simulator.state == {"NSRA": "080", "SAT": "090"}
+
+
+def test_incomplete_resumption_raises(scripted):
+    simulator = PROSIM8Simulator()
+    ps8 = PROSIM8("SIM", transport=scripted(simulator))
+    ps8.connect()
+    ps8.sendBatch(["NSRA=080", "SAT=090"])
+    simulator.inject("error", command="SAT", arg="!03")
+    with pytest.raises(CommunicationError, match="1 de 2"):
+        ps8.reconnect()
+
+
+def test_spo2_rate_does_not_replace_an_active_arrhythmia(scripted):
+    ps8 = PROSIM8("SIM", transport=scripted(PROSIM8Simulator()))
+    ps8.connect()
+    ps8.sendCommand("VFIB=COARSE")
+    with pytest.raises(RangeError, match="VFIB"):
+        ps8.setSpO2Profile(saturation=90, rate=80)
+    ps8.setSpO2Profile(saturation=90)
+    assert ps8.state["WAVE"] == "VFIB=COARSE"
+
+
+def test_partial_batch_keeps_the_acknowledged_commands(scripted):
+    simulator = PROSIM8Simulator()
+    ps8 = PROSIM8("SIM", transport=scripted(simulator))
+    ps8.connect()
+    with pytest.raises(RangeError):
+        ps8.sendBatch(["PERF=05.00", "SAT=101", "NSRA=080"])
+    assert list(ps8.state.values()) == ["PERF=05.00", "NSRA=080"]
+
+
+def test_batch_timeout_reconnects(scripted):
+    simulator = PROSIM8Simulator()
+    ps8 = PROSIM8("SIM", transport=scripted(simulator, timeout=0.1), resilient=True)
+    ps8.connect()
+    simulator.inject("drop", command="SAT")
+    assert ps8.sendBatch(["NSRA=080", "SAT=090"]) == ["*", "*"]
+    assert simulator.received.count("REMOTE") == 2
+    assert simulator.state == {"NSRA": "080", "SAT": "090"}
+
+
+def test_impulse_errors_are_typed_and_picklable():
+    error = impulse_error("MODE=DEFIB", parse_reply("!03"))
+    assert type(error) is ImpulseRangeError and isinstance(error, RangeError) and error.code == "!03"
+    timeout = impulse_error("Dready", Reply(Status.TIMEOUT, None, "", [], 1.0))
+    assert type(timeout) is ImpulseTimeout and isinstance(timeout, InstrumentTimeout)
+    copy = pickle.loads(pickle.dumps(error))
+    assert type(copy) is ImpulseRangeError and str(copy) == str(error) and copy.code == "!03"
+
+
+def test_read_energy_deadline_survives_chatter(fake_transport):
+    transport = fake_transport(b"")
+    transport.ser.read = lambda size=1: b"*\n"  #acknowledge sin fin, nunca una descarga
+    imp = IMPULSE7000("SIM", transport=transport)
+    start = time.monotonic()
+    with pytest.raises(ImpulseTimeout):
+        imp.read_energy(timeout=0.3)
+    assert time.monotonic() - start < 1.0
@@ -0,0 +1,29 @@
+"""
+Monitor de salud (health.py): no se sondea un IMPULSE7000 que está capturando.
+"""
+from FLUKE import IMPULSE7000
+from FLUKE.errors import CommunicationError
+from FLUKE.health import _capturing
+
+
+class IsolatedImpulse:
+    """
+    Como un IsolatedDriver de IMPULSE7000: expone driver_class y capturing llega por el proxy.
+    """
+    driver_class = IMPULSE7000
+
+    def __init__(self, capturing):
+        self._capturing = capturing
+
+    @property
+    def capturing(self):
+        if isinstance(self._capturing, Exception):
+            raise self._capturing
+        return self._capturing
+
+
+def test_isolated_impulse_capture_is_detected():
+    assert _capturing(IsolatedImpulse(True))
+    assert not _capturing(IsolatedImpulse(False))
+    assert not _capturing(IsolatedImpulse(CommunicationError("proceso terminado")))  #el sondeo lo detecta
+    assert not _capturing(object())
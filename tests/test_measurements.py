@@ -0,0 +1,26 @@
+"""
+Registro de mediciones de MeasuredDriver en un MeasurementStore.
+"""
+import pytest
+
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import ESA620
+from FLUKE.measurements import MeasuredDriver, MeasurementStore
+from FLUKE.simulators import ESA620Simulator
+
+
+class StationESA620(ESA620):
+    """
+    Subclase de un banco de ensayo: hereda las mediciones del ESA620.
+    """
+
+
+def test_driver_subclasses_are_measured(scripted, tmp_path):
+    with MeasurementStore(str(tmp_path / "medidas.db")) as store:
+        esa = MeasuredDriver(store, "esa", StationESA620("SIM", transport=scripted(ESA620Simulator())))
+        assert esa.voltMeasure() == "220.4"
+        store.flush()
+        rows = store.query()
+    assert [(row.instrument, row.procedure, row.unit) for row in rows] == [("esa", "voltMeasure", "V")]
+    assert rows[0].condition.startswith("POL=")
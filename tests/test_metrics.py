@@ -0,0 +1,49 @@
+"""
+Métricas por instrumento y puerto (metrics.py) y trazas de comandos (tracing.py) sobre un pty.
+"""
+import pytest
+
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import ESA620, PROSIM8
+from FLUKE.metrics import Metrics
+from FLUKE.simulators import ESA620Simulator, PROSIM8Simulator
+from FLUKE.tracing import CommandTracer
+
+
+def test_metrics_label_driver_and_port_and_time_mread_to_value():
+    metrics = Metrics.enable()
+    try:
+        #la latencia se mide en tiempo real: simulador sobre pty y no ScriptedPort
+        with ESA620Simulator(busy=3, measure_time=0.4) as simulator:
+            esa = ESA620(simulator.port)
+            esa._query("REMOTE")
+            esa._query("ENCL")
+            esa._mread()
+            esa.close()
+    finally:
+        Metrics.disable()
+    counts, total = metrics.histograms[("ESA620", simulator.port, "MREAD")]
+    assert sum(counts) == 1
+    assert total >= 0.4  #hasta el valor, no hasta el "*" de ocupado
+    assert f'fluke_commands_total{{instrument="ESA620",port="{simulator.port}"}} 4' in metrics.render()
+
+
+def test_batch_latency_is_per_command():
+    tracer = CommandTracer()
+    metrics = Metrics.enable()
+    try:
+        #NSRA responde a 0.1 s, SAT a 0.3 s y PERF junto con SAT
+        with PROSIM8Simulator(delay=0.1, delays={"SAT": 0.3}) as simulator:
+            ps8 = PROSIM8(simulator.port, tracer=tracer)
+            ps8.connect()
+            ps8.sendBatch(["NSRA=080", "SAT=090", "PERF=05.00"])
+            ps8.disconnect()
+    finally:
+        Metrics.disable()
+    nsra, sat, perf = list(tracer.records)[-3:]
+    #cada uno desde el acknowledge anterior, no el acumulado desde la escritura del lote
+    assert 0.08 <= nsra.latency < 0.15 and 0.15 <= sat.latency < 0.25 and perf.latency < 0.05
+    assert nsra.timestamp < sat.timestamp < perf.timestamp
+    counts, total = metrics.histograms[("PROSIM8", simulator.port, "SAT")]
+    assert sum(counts) == 1 and 0.15 <= total < 0.25
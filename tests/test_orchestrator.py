@@ -0,0 +1,40 @@
+"""
+Ejecución concurrente del Orchestrator: resultados, errores y camino crítico.
+"""
+import time
+
+import pytest
+
+from FLUKE.orchestrator import Orchestrator, Step
+
+
+def test_critical_path_follows_dependencies_and_instruments():
+    class Sleeper:
+        def work(self, seconds):
+            time.sleep(seconds)
+
+    steps = [Step("a", "x", "work", (0.2,)), Step("b", "y", "work", (0.05,)),
+             Step("c", "y", "work", (0.1,), after=("a",))]
+    with Orchestrator({"x": Sleeper(), "y": Sleeper()}) as orch:
+        orch.run(steps)
+        summary = orch.summary()
+    assert summary["critical_path"] == ["a", "c"]
+    assert summary["critical_time"] == pytest.approx(0.3, abs=0.05)
+    assert summary["critical_time"] <= summary["wall_time"] + 1e-6
+
+
+def test_independent_steps_overlap_and_dependents_of_a_failure_are_skipped():
+    class Worker:
+        def work(self, seconds, fail=False):
+            time.sleep(seconds)
+            if fail:
+                raise OSError("sin respuesta")
+            return seconds
+
+    steps = [Step("a", "x", "work", (0.2,)), Step("b", "y", "work", (0.2,), {"fail": True}),
+             Step("c", "x", "work", (0.0,), after=("b",))]
+    with Orchestrator({"x": Worker(), "y": Worker()}) as orch:
+        results = orch.run(steps)
+        assert results == {"a": 0.2}
+        assert isinstance(orch.errors["b"], OSError) and orch.errors["c"] == "skipped"
+        assert orch.wall_time < 0.35  #a y b corren a la vez en hilos distintos
@@ -0,0 +1,24 @@
+"""
+Carga perezosa del paquete: los nombres públicos de drivers son siempre las clases.
+"""
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("submodule", ["ESA620", "PROSIM8", "IMPULSE7000", "defib_timing", "discovery"])
+def test_driver_names_stay_classes_after_importing_submodules(submodule):
+    #proceso nuevo: el paquete sin nada importado todavía
+    code = (f"import FLUKE.{submodule}\n"
+            "import FLUKE\n"
+            "from FLUKE import ESA620, IMPULSE7000, PROSIM8\n"
+            "for driver in (ESA620, PROSIM8, IMPULSE7000, FLUKE.ESA620, FLUKE.IMPULSE7000):\n"
+            "    assert isinstance(driver, type), driver\n")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+@pytest.mark.parametrize("name", ["ESA620", "PROSIM8", "IMPULSE7000", "Fluke8845", "Fluke45"])
+def test_every_driver_closes_with_close(name):
+    from FLUKE import _load
+    assert callable(getattr(_load(name), "close", None))
@@ -0,0 +1,99 @@
+"""
+Grabación de sesiones serie y su reproducción sin instrumento (recording.py).
+"""
+import os
+
+import pytest
+
+simulators = pytest.importorskip("FLUKE.simulators")  #pty: solo Linux
+
+from FLUKE import ESA620, PROSIM8
+from FLUKE.recording import CLOSE, OPEN, READ, WRITE, ReplayError, read_log, replay_transport
+from FLUKE.transport import SerialTransport
+
+
+def _record_prosim(path):
+    with simulators.PROSIM8Simulator() as sim:
+        transport = SerialTransport(port=sim.port, baudrate=115200, terminator=b"\n", eol="\r", timeout=1.0,
+                                    record=path)
+        ps8 = PROSIM8(sim.port, transport=transport)
+        ps8.connect()
+        statuses = [ps8.sendCommand("NSRA=080"), ps8.sendCommand("NSRA=075")]
+        ps8.disconnect()
+    return statuses
+
+
+def test_recorded_session_log(tmp_path):
+    path = str(tmp_path / "ps8.flrec")
+    _record_prosim(path)
+    metadata, records = read_log(path)
+    assert metadata["baudrate"] == 115200 and metadata["eol"] == "\r"
+    assert records[0].kind == OPEN and records[-1].kind == CLOSE
+    assert [r.data for r in records if r.kind == WRITE] == [b"REMOTE\r", b"NSRA=080\r", b"NSRA=075\r"]
+    assert b"".join(r.data for r in records if r.kind == READ).count(b"*") == 3
+
+
+def test_replay_reproduces_the_session(tmp_path):
+    path = str(tmp_path / "ps8.flrec")
+    recorded = _record_prosim(path)
+
+    transport = replay_transport(path)
+    ps8 = PROSIM8("REPLAY", transport=transport)
+    ps8.connect()
+    assert [ps8.sendCommand("NSRA=080"), ps8.sendCommand("NSRA=075")] == recorded
+    assert transport.ser.finished
+
+
+def test_replay_rejects_a_different_command(tmp_path):
+    path = str(tmp_path / "ps8.flrec")
+    _record_prosim(path)
+
+    ps8 = PROSIM8("REPLAY", transport=replay_transport(path))
+    ps8.connect()
+    with pytest.raises(ReplayError, match="NSRA=080"):
+        ps8.sendCommand("NSRA=090")
+
+
+def test_replay_with_original_timing(tmp_path):
+    path = str(tmp_path / "esa.flrec")
+    with simulators.ESA620Simulator(delays={"IDENT": 0.3}) as sim:
+        transport = SerialTransport(port=sim.port, baudrate=115200, terminator=b"\n", eol="\r", timeout=2.0,
+                                    record=path)
+        esa = ESA620(sim.port, transport=transport)
+        esa.ident()
+        transport.close()
+
+    fast = ESA620("REPLAY", transport=replay_transport(path))
+    slow = ESA620("REPLAY", transport=replay_transport(path, speed=1.0))
+    for esa, minimum in ((fast, 0.0), (slow, 0.25)):
+        esa.ident()
+        assert esa._ident.startswith("ESA620")
+        assert esa.transport.stats()["io_time"] >= minimum
+
+
+def test_close_finishes_the_log_and_reopen_appends(tmp_path):
+    path = str(tmp_path / "esa.flrec")
+    with simulators.ESA620Simulator() as sim:
+        transport = SerialTransport(port=sim.port, baudrate=115200, terminator=b"\n", eol="\r", timeout=2.0,
+                                    record=path)
+        transport.query("REMOTE")
+        transport.close()
+        assert transport._log._file.closed
+        transport.open()
+        transport.query("IDENT")
+        transport.close()
+    kinds = [r.kind for r in read_log(path)[1]]
+    assert kinds.count(OPEN) == 2 and kinds.count(CLOSE) == 2 and kinds[-1] == CLOSE
+
+
+def test_record_dir_does_not_record_replays(tmp_path, monkeypatch):
+    path = str(tmp_path / "ps8.flrec")
+    _record_prosim(path)
+    sessions = tmp_path / "sesiones"
+    sessions.mkdir()
+    monkeypatch.setattr(SerialTransport, "RECORD_DIR", str(sessions))
+
+    ps8 = PROSIM8("REPLAY", transport=replay_transport(path))
+    ps8.connect()
+    ps8.sendCommand("NSRA=080")
+    assert os.listdir(sessions) == []
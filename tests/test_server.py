@@ -0,0 +1,42 @@
+"""
+Servidor y cliente de instrumentos (server.py).
+"""
+import socket
+import threading
+
+import pytest
+
+from FLUKE.errors import ProtocolError
+from FLUKE.server import InstrumentClient, InstrumentServer
+
+
+def test_tcp_server_binds_loopback_unless_allowed():
+    assert InstrumentServer({}, ("", 0)).address == ("127.0.0.1", 0)
+    assert InstrumentServer({}, ("localhost", 0)).address == ("localhost", 0)
+    with pytest.raises(ValueError, match="allow_remote"):
+        InstrumentServer({}, ("0.0.0.0", 0))
+    assert InstrumentServer({}, ("0.0.0.0", 0), allow_remote=True).address == ("0.0.0.0", 0)
+
+
+def test_malformed_reply_fails_pending_calls_and_keeps_the_client(tmp_path):
+    path = str(tmp_path / "fluke.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def server():
+        conn, _ = listener.accept()
+        with conn, conn.makefile("rb") as requests:
+            requests.readline()
+            conn.sendall(b"{respuesta cortada\n")
+            requests.readline()
+            conn.sendall(b'{"id": 2, "result": "220.4"}\n')
+
+    thread = threading.Thread(target=server, daemon=True)
+    thread.start()
+    with InstrumentClient(path, timeout=2.0) as client:
+        with pytest.raises(ProtocolError):
+            client.call("esa", "voltMeasure")
+        assert client.call("esa", "voltMeasure") == "220.4"
+    thread.join(2.0)
+    listener.close()
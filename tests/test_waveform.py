@@ -0,0 +1,64 @@
+"""
+Descarga y decodificación de formas de onda del IMPULSE7000 (read_waveform / decode_waveform).
+"""
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from FLUKE.IMPULSE7000 import IMPULSE7000, ImpulseCommandError, ImpulseError, ImpulseTimeout
+from FLUKE.defib_waveform import decode_waveform
+
+
+def _analyzer(transport, binary=False):
+    imp = IMPULSE7000("SIM", transport=transport)
+    imp.WAVEFORM_BINARY = binary
+    return imp
+
+
+def test_decode_ascii_and_binary():
+    ascii_wave = decode_waveform("1,2,\r\n3,4\r\n", 4, 1000, scale=0.5)
+    assert ascii_wave.samples.tolist() == [0.5, 1.0, 1.5, 2.0]
+    assert ascii_wave.fs == 1000.0
+
+    binary_wave = decode_waveform(struct.pack("<3h", 100, -200, 300), 3, 2000, scale=0.01, binary=True)
+    assert binary_wave.samples == pytest.approx([1.0, -2.0, 3.0])
+
+
+def test_read_waveform_ascii(fake_transport):
+    imp = _analyzer(fake_transport(b"3,1000,0.5\n1,2\n3\n"))
+    wave = imp.read_waveform(timeout=0.5)
+    assert wave.samples.tolist() == [0.5, 1.0, 1.5]
+    assert imp.transport.ser.written == b"DWAVE\r"
+
+
+def test_read_waveform_binary(fake_transport):
+    imp = _analyzer(fake_transport(b"2,1000\n" + struct.pack("<2h", 7, -7)), binary=True)
+    assert imp.read_waveform(timeout=0.5).samples.tolist() == [7.0, -7.0]
+
+
+@pytest.mark.parametrize("data, binary, error, detail", [
+    (b"abc,1000\n", False, ImpulseCommandError, "invalid header"),
+    (b"3,1000\n1,x,3\n", False, ImpulseCommandError, "invalid samples"),
+    (b"5,1000\n1,2,3\n", False, ImpulseTimeout, "3 of 5 samples"),
+    (b"4,1000\n\x01\x00\x02\x00", True, ImpulseTimeout, "of 4 samples"),
+    (b"", False, ImpulseTimeout, "timeout"),
+])
+def test_read_waveform_errors(fake_transport, data, binary, error, detail):
+    imp = _analyzer(fake_transport(data), binary=binary)
+    with pytest.raises(error, match=detail) as info:
+        imp.read_waveform(timeout=0.3)
+    assert isinstance(info.value, ImpulseError)
+
+
+def test_read_waveform_after_discharge(scripted):
+    from FLUKE.simulators import IMPULSE7000Simulator
+
+    simulator = IMPULSE7000Simulator(energy=200.0, samples=400, fs=20000.0)
+    imp = _analyzer(scripted(simulator))
+    imp.read_energy()
+    wave = imp.read_waveform()
+    assert len(wave.samples) == 400
+    assert wave.fs == 20000.0
+    assert wave.samples[0] > 0 > wave.samples[-1]  #bifásica